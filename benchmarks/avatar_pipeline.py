@@ -0,0 +1,99 @@
+import argparse
+import asyncio
+import io
+import math
+from pathlib import Path
+import statistics
+import tempfile
+import time
+
+from PIL import Image
+
+from src.services.avatars import AVATAR_CONTENT_TYPE, avatar_executor, process_avatar
+from src.services.storage import LocalAvatarStorage
+
+
+# Uploads a burst of photos through the avatar pipeline into a temporary
+# directory and measures how late an unrelated coroutine is scheduled, first
+# with the image processing inline on the event loop, then on the executor.
+
+
+async def probe(latencies: list, stop: asyncio.Event, interval: float) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        latencies.append(time.perf_counter() - started - interval)
+
+
+def make_photo(width: int, height: int) -> bytes:
+    image = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=90)
+    return output.getvalue()
+
+
+async def inline_upload(storage, name: str, data: bytes) -> None:
+    await storage.save(name, process_avatar(data), AVATAR_CONTENT_TYPE)
+
+
+async def pooled_upload(storage, name: str, data: bytes) -> None:
+    avatar = await avatar_executor.run(process_avatar, data)
+    await storage.save(name, avatar, AVATAR_CONTENT_TYPE)
+
+
+async def burst(upload, storage, uploads: int, concurrency: int, data: bytes) -> tuple:
+    latencies, stop = [], asyncio.Event()
+    probe_task = asyncio.create_task(probe(latencies, stop, 0.005))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index: int) -> None:
+        async with semaphore:
+            await upload(storage, f"user{index}", data)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(uploads)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe_task
+    return latencies, elapsed
+
+
+def percentile(values: list, fraction: float) -> float:
+    return values[min(len(values) - 1, math.ceil(len(values) * fraction) - 1)]
+
+
+def report(name: str, latencies: list, elapsed: float, uploads: int) -> None:
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p99 = percentile(latencies, 0.99) * 1000
+    print(
+        f"{name:<7} uploads/s: {uploads / elapsed:>7.1f}  "
+        f"unrelated ({len(latencies)} samples) "
+        f"p50: {p50:>8.2f} ms  p99: {p99:>8.2f} ms"
+    )
+
+
+async def run(uploads: int, concurrency: int, width: int, height: int) -> None:
+    data = make_photo(width, height)
+    print(f"{uploads} uploads of a {width}x{height} JPEG, {len(data)} bytes")
+    with tempfile.TemporaryDirectory() as directory:
+        storage = LocalAvatarStorage(Path(directory), "http://localhost/avatars")
+        for name, upload in (("inline", inline_upload), ("pooled", pooled_upload)):
+            latencies, elapsed = await burst(
+                upload, storage, uploads, concurrency, data
+            )
+            report(name, latencies, elapsed, uploads)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    args = parser.parse_args()
+    asyncio.run(run(args.uploads, args.concurrency, args.width, args.height))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import argparse
+import asyncio
+from datetime import datetime, timezone
+import time
+from typing import List
+import uuid
+
+import faker
+import orjson
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import create_engine, insert, select, text
+from sqlalchemy.orm import Session
+
+from src.database.models import Contact
+from src.repository.contacts import RESPONSE_COLUMNS
+from src.schemas.contacts import ContactResponse
+from src.utils.responses import ORJSONResponse
+
+
+# Per-row cost of a contacts page, the ORM instances validated through
+# response_model and rendered by the stdlib encoder against the Core rows
+# rendered by orjson. The rows come from an in-memory SQLite table shaped
+# like contacts, the driver's share is the same for both paths, so the
+# difference is the ORM and serialisation overhead.
+#
+#   python -m benchmarks.contacts_serialization --rows 1000
+
+CREATE_TABLE = """
+CREATE TABLE contacts (
+    id CHAR(32) PRIMARY KEY,
+    first_name VARCHAR(254) NOT NULL,
+    last_name VARCHAR(254) NOT NULL,
+    email VARCHAR(254),
+    phone VARCHAR(38),
+    birthday DATE,
+    birthday_key INTEGER,
+    address VARCHAR(254),
+    search_text TEXT,
+    created_at DATETIME,
+    updated_at DATETIME,
+    user_id CHAR(32)
+)
+"""
+
+
+def create_database(rows: int):
+    engine = create_engine("sqlite://")
+    fake = faker.Faker("uk_UA")
+    fake.seed_instance(42)
+    user_id = uuid.uuid4()
+    now = datetime.now(timezone.utc)
+    with engine.begin() as connection:
+        connection.execute(text(CREATE_TABLE))
+        connection.execute(
+            insert(Contact.__table__),
+            [
+                {
+                    "id": uuid.uuid4(),
+                    "first_name": fake.first_name(),
+                    "last_name": fake.last_name(),
+                    "email": fake.email(),
+                    "phone": fake.phone_number(),
+                    "birthday": fake.date_of_birth(),
+                    "address": fake.address(),
+                    "created_at": now,
+                    "updated_at": now,
+                    "user_id": user_id,
+                }
+                for _ in range(rows)
+            ],
+        )
+    return engine
+
+
+def measure(function, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = create_database(args.rows)
+    field = create_response_field(name="contacts", type_=List[ContactResponse])
+    loop = asyncio.new_event_loop()
+    stmt_orm = select(Contact).order_by(Contact.last_name, Contact.id)
+    stmt_core = select(*RESPONSE_COLUMNS).order_by(Contact.last_name, Contact.id)
+
+    def fetch_orm() -> list:
+        with Session(engine) as session:
+            return session.execute(stmt_orm).scalars().all()
+
+    def fetch_core() -> list:
+        with Session(engine) as session:
+            return [contact._asdict() for contact in session.execute(stmt_core)]
+
+    def render_orm(contacts: list) -> bytes:
+        content = loop.run_until_complete(
+            serialize_response(field=field, response_content=contacts)
+        )
+        return JSONResponse(content).body
+
+    def render_core(contacts: list) -> bytes:
+        return ORJSONResponse(contacts).body
+
+    orm_rows, core_rows = fetch_orm(), fetch_core()
+    # Both paths must render the same document, or the timings compare
+    # different work.
+    assert orjson.loads(render_orm(orm_rows)) == orjson.loads(render_core(core_rows))
+    print(f"{'path':<20} {'fetch us/row':>13} {'render us/row':>14} {'total':>9}")
+    for name, fetch, render, rows in (
+        ("orm + response_model", fetch_orm, render_orm, orm_rows),
+        ("core + orjson", fetch_core, render_core, core_rows),
+    ):
+        fetch_us = measure(fetch, args.repeat) / args.rows * 1e6
+        render_us = measure(lambda: render(rows), args.repeat) / args.rows * 1e6
+        print(
+            f"{name:<20} {fetch_us:>13.2f} {render_us:>14.2f} "
+            f"{fetch_us + render_us:>9.2f}"
+        )
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,558 @@
+import argparse
+import asyncio
+from datetime import datetime, timezone
+import json
+import math
+import os
+from pathlib import Path
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import aiohttp
+import faker
+
+from src.conf.config import settings
+from src.database.connect_db import AsyncDBSession
+from src.repository import users as repository_users
+from src.schemas.users import UserModel
+from src.services.auth import auth_service
+
+
+# End-to-end load test: creates confirmed users straight through the
+# repository, logs them in and seeds their contacts through the API, then
+# drives a weighted mix of requests from concurrent clients and reports
+# throughput and latency percentiles per endpoint.
+#
+#   python -m benchmarks.load run --start-server --duration 60
+#   python -m benchmarks.load compare before.json after.json
+
+PASSWORD = "load-test-password"
+RESULTS_DIR = Path(__file__).parent / "results"
+WORKLOAD = {
+    "login": 2,
+    "me": 15,
+    "list": 20,
+    "filter": 10,
+    "search": 5,
+    "birthdays": 15,
+    "read": 10,
+    "create": 10,
+    "update": 8,
+    "delete": 5,
+}
+
+
+class VirtualUser:
+    def __init__(self, index: int):
+        self.email = f"load-test-{index}@example.com"
+        self.username = f"load-test-{index}"
+        self.access_token = None
+        self.contact_ids = []
+        self.seeded = 0
+        self.first_names = []
+        self.last_names = []
+        self.fake = faker.Faker("uk_UA")
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.access_token}"}
+
+    def fake_contact(self) -> dict:
+        return {
+            "first_name": self.fake.first_name(),
+            "last_name": self.fake.last_name(),
+            "email": self.fake.unique.email(),
+            "phone": self.fake.unique.phone_number(),
+            "birthday": self.fake.date_of_birth().isoformat(),
+            "address": self.fake.address()[:254],
+        }
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.statuses: dict[str, dict[int, int]] = {}
+        # Requests that got no response, by error, they have no latency.
+        self.failures: dict[str, dict[str, int]] = {}
+
+    def record(self, name: str, status: int, latency: float) -> None:
+        self.latencies.setdefault(name, []).append(latency)
+        statuses = self.statuses.setdefault(name, {})
+        statuses[status] = statuses.get(status, 0) + 1
+
+    def record_failure(self, name: str, error: str) -> None:
+        failures = self.failures.setdefault(name, {})
+        failures[error] = failures.get(error, 0) + 1
+
+
+async def call(
+    client: aiohttp.ClientSession,
+    recorder: Recorder | None,
+    name: str,
+    method: str,
+    path: str,
+    **kwargs,
+) -> tuple[int, object]:
+    started = time.perf_counter()
+    async with client.request(method, path, **kwargs) as response:
+        body = await response.read()
+    if recorder is not None:
+        recorder.record(name, response.status, time.perf_counter() - started)
+    if body and response.content_type == "application/json":
+        return response.status, json.loads(body)
+    return response.status, None
+
+
+async def login(client, recorder, user: VirtualUser) -> int:
+    status, body = await call(
+        client,
+        recorder,
+        "login",
+        "POST",
+        "/api/auth/login",
+        data={"username": user.email, "password": PASSWORD},
+    )
+    if status == 200:
+        user.access_token = body["access_token"]
+    return status
+
+
+async def op_login(client, recorder, user: VirtualUser, rng: random.Random) -> None:
+    await login(client, recorder, user)
+
+
+async def op_me(client, recorder, user: VirtualUser, rng: random.Random) -> None:
+    await call(client, recorder, "me", "GET", "/api/users/me", headers=user.headers)
+
+
+async def op_list(client, recorder, user: VirtualUser, rng: random.Random) -> None:
+    params = {
+        "offset": rng.randrange(0, max(len(user.contact_ids) - 20, 1)),
+        "limit": 20,
+        "sort": rng.choice(["last_name", "first_name", "created_at"]),
+    }
+    await call(
+        client,
+        recorder,
+        "list",
+        "GET",
+        "/api/contacts/",
+        params=params,
+        headers=user.headers,
+    )
+
+
+async def op_filter(client, recorder, user: VirtualUser, rng: random.Random) -> None:
+    params = {"first_name": rng.choice(user.first_names)[:3], "limit": 20}
+    await call(
+        client,
+        recorder,
+        "filter",
+        "GET",
+        "/api/contacts/",
+        params=params,
+        headers=user.headers,
+    )
+
+
+async def op_search(client, recorder, user: VirtualUser, rng: random.Random) -> None:
+    params = {"q": rng.choice(user.last_names)[:4], "limit": 20}
+    await call(
+        client,
+        recorder,
+        "search",
+        "GET",
+        "/api/contacts/",
+        params=params,
+        headers=user.headers,
+    )
+
+
+async def op_birthdays(client, recorder, user: VirtualUser, rng: random.Random) -> None:
+    await call(
+        client,
+        recorder,
+        "birthdays",
+        "GET",
+        f"/api/contacts/birthdays_in_{rng.randint(1, 31)}_days",
+        params={"limit": 20},
+        headers=user.headers,
+    )
+
+
+async def op_read(client, recorder, user: VirtualUser, rng: random.Random) -> None:
+    if user.contact_ids:
+        await call(
+            client,
+            recorder,
+            "read",
+            "GET",
+            f"/api/contacts/{rng.choice(user.contact_ids)}",
+            headers=user.headers,
+        )
+
+
+async def op_create(client, recorder, user: VirtualUser, rng: random.Random) -> None:
+    status, body = await call(
+        client,
+        recorder,
+        "create",
+        "POST",
+        "/api/contacts/",
+        json=user.fake_contact(),
+        headers=user.headers,
+    )
+    if status == 201:
+        user.contact_ids.append(body["id"])
+
+
+async def op_update(client, recorder, user: VirtualUser, rng: random.Random) -> None:
+    if user.contact_ids:
+        await call(
+            client,
+            recorder,
+            "update",
+            "PUT",
+            f"/api/contacts/{rng.choice(user.contact_ids)}",
+            json=user.fake_contact(),
+            headers=user.headers,
+        )
+
+
+async def op_delete(client, recorder, user: VirtualUser, rng: random.Random) -> None:
+    # Keeps the seeded contacts so that the data set doesn't shrink run to run.
+    if len(user.contact_ids) > user.seeded:
+        contact_id = user.contact_ids.pop()
+        await call(
+            client,
+            recorder,
+            "delete",
+            "DELETE",
+            f"/api/contacts/{contact_id}",
+            headers=user.headers,
+        )
+
+
+OPERATIONS = {
+    "login": op_login,
+    "me": op_me,
+    "list": op_list,
+    "filter": op_filter,
+    "search": op_search,
+    "birthdays": op_birthdays,
+    "read": op_read,
+    "create": op_create,
+    "update": op_update,
+    "delete": op_delete,
+}
+
+
+async def create_users(count: int) -> list[VirtualUser]:
+    users = [VirtualUser(index) for index in range(count)]
+    hashed = await auth_service.get_password_hash(PASSWORD)
+    async with AsyncDBSession() as session:
+        for user in users:
+            body = UserModel(
+                username=user.username, email=user.email, password=PASSWORD
+            )
+            body.password = hashed
+            if not await repository_users.create_user(body, session):
+                # Left over from an earlier run, the password is reset.
+                await repository_users.reset_password(user.email, hashed, session)
+            await repository_users.confirm_email(user.email, session)
+    return users
+
+
+async def seed_contacts(
+    client: aiohttp.ClientSession, user: VirtualUser, contacts: int, seed: int
+) -> None:
+    user.fake.seed_instance(seed)
+    batch = [user.fake_contact() for _ in range(contacts)]
+    user.first_names = [contact["first_name"] for contact in batch]
+    user.last_names = [contact["last_name"] for contact in batch]
+    # Re-runs hit the unique constraints, the ids are then read back.
+    await call(
+        client,
+        None,
+        "bulk",
+        "POST",
+        "/api/contacts/bulk",
+        json=batch,
+        headers=user.headers,
+    )
+    status, body = await call(
+        client,
+        None,
+        "list",
+        "GET",
+        "/api/contacts/",
+        params={"limit": 1000},
+        headers=user.headers,
+    )
+    user.contact_ids = [contact["id"] for contact in body] if status == 200 else []
+    user.seeded = len(user.contact_ids)
+
+
+async def worker(
+    client: aiohttp.ClientSession,
+    recorder: Recorder,
+    users: list[VirtualUser],
+    workload: dict[str, int],
+    rng: random.Random,
+    deadline: float,
+) -> None:
+    names, weights = list(workload), list(workload.values())
+    while time.perf_counter() < deadline:
+        user = rng.choice(users)
+        name = rng.choices(names, weights)[0]
+        try:
+            await OPERATIONS[name](client, recorder, user, rng)
+        except asyncio.TimeoutError:
+            recorder.record_failure(name, "timeout")
+        except aiohttp.ClientError as error:
+            recorder.record_failure(name, type(error).__name__)
+
+
+def percentile(values: list, fraction: float) -> float:
+    return values[min(len(values) - 1, math.ceil(len(values) * fraction) - 1)]
+
+
+def to_ms(seconds: float | None) -> float | None:
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def summarize(
+    latencies: list[float], statuses: dict, failures: dict, elapsed: float
+) -> dict:
+    # The latencies are of the responses only, the failures count as errors.
+    latencies = sorted(latencies)
+    failed = sum(failures.values())
+    errors = sum(count for status, count in statuses.items() if not 200 <= status < 400)
+    return {
+        "requests": len(latencies) + failed,
+        "errors": errors + failed,
+        "rps": round((len(latencies) + failed) / elapsed, 2),
+        "mean_ms": to_ms(statistics.fmean(latencies) if latencies else None),
+        "p50_ms": to_ms(percentile(latencies, 0.50) if latencies else None),
+        "p95_ms": to_ms(percentile(latencies, 0.95) if latencies else None),
+        "p99_ms": to_ms(percentile(latencies, 0.99) if latencies else None),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "failures": dict(sorted(failures.items())),
+    }
+
+
+def format_ms(value: float | None) -> str:
+    return f"{value:>9.2f}" if value is not None else f"{'-':>9}"
+
+
+def report(results: dict) -> None:
+    print(
+        f"{'endpoint':<10} {'requests':>9} {'errors':>7} {'rps':>9} "
+        f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    )
+    rows = list(results["endpoints"].items()) + [("total", results["total"])]
+    for name, row in rows:
+        print(
+            f"{name:<10} {row['requests']:>9} {row['errors']:>7} {row['rps']:>9.1f} "
+            f"{format_ms(row['p50_ms'])} {format_ms(row['p95_ms'])} "
+            f"{format_ms(row['p99_ms'])}"
+        )
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_server(port: int, workers: int) -> subprocess.Popen:
+    # The rate limiter would turn most of the load into 429s.
+    env = {**os.environ, "RATE_LIMITER_TIMES": "1000000000"}
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "main:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ],
+        env=env,
+    )
+
+
+async def wait_until_ready(base_url: str, timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    async with aiohttp.ClientSession(base_url) as client:
+        while time.perf_counter() < deadline:
+            try:
+                async with client.get("/api/health/ready") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"{base_url} is not ready after {timeout} s")
+
+
+def parse_workload(value: str | None) -> dict[str, int]:
+    if not value:
+        return WORKLOAD
+    workload = {}
+    for item in value.split(","):
+        name, weight = item.split("=")
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation {name}")
+        workload[name] = int(weight)
+    return workload
+
+
+async def run(args: argparse.Namespace) -> dict:
+    base_url = args.base_url or f"http://127.0.0.1:{args.port}"
+    await wait_until_ready(base_url, 60)
+    users = await create_users(args.users)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(
+        base_url, connector=connector, timeout=timeout
+    ) as client:
+        for index, user in enumerate(users):
+            await login(client, None, user)
+            await seed_contacts(client, user, args.contacts, args.seed + index)
+        recorder = Recorder()
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(
+            *(
+                worker(
+                    client,
+                    recorder,
+                    users,
+                    args.workload,
+                    random.Random(args.seed * 1000 + index),
+                    deadline,
+                )
+                for index in range(args.concurrency)
+            )
+        )
+        elapsed = time.perf_counter() - started
+    all_statuses, all_failures = {}, {}
+    for statuses in recorder.statuses.values():
+        for status, count in statuses.items():
+            all_statuses[status] = all_statuses.get(status, 0) + count
+    for failures in recorder.failures.values():
+        for error, count in failures.items():
+            all_failures[error] = all_failures.get(error, 0) + count
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "base_url": base_url,
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "timeout": args.timeout,
+            "users": args.users,
+            "contacts_per_user": args.contacts,
+            "seed": args.seed,
+            "workload": args.workload,
+        },
+        "endpoints": {
+            name: summarize(
+                recorder.latencies.get(name, []),
+                recorder.statuses.get(name, {}),
+                recorder.failures.get(name, {}),
+                elapsed,
+            )
+            for name in sorted(set(recorder.latencies) | set(recorder.failures))
+        },
+        "total": summarize(
+            [value for values in recorder.latencies.values() for value in values],
+            all_statuses,
+            all_failures,
+            elapsed,
+        ),
+    }
+
+
+def compare(before_path: str, after_path: str) -> None:
+    before = json.loads(Path(before_path).read_text())
+    after = json.loads(Path(after_path).read_text())
+    print(
+        f"before: {before['meta']['git_revision']} {before['meta']['timestamp']}\n"
+        f"after:  {after['meta']['git_revision']} {after['meta']['timestamp']}"
+    )
+    print(f"{'endpoint':<10} {'rps':>18} {'p50 ms':>20} {'p95 ms':>20} {'p99 ms':>20}")
+    names = sorted(set(before["endpoints"]) | set(after["endpoints"]))
+    for name in names + ["total"]:
+        old = before["total"] if name == "total" else before["endpoints"].get(name)
+        new = after["total"] if name == "total" else after["endpoints"].get(name)
+        if old is None or new is None:
+            print(f"{name:<10} only in {'after' if old is None else 'before'}")
+            continue
+        cells = []
+        for key in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+            if old[key] is None or new[key] is None:
+                cells.append(format_ms(new[key]))
+                continue
+            change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            cells.append(f"{new[key]:>10.2f} {change:>+7.1f}%")
+        print(f"{name:<10} " + " ".join(f"{cell:>20}" for cell in cells))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run")
+    run_parser.add_argument("--base-url")
+    run_parser.add_argument("--start-server", action="store_true")
+    run_parser.add_argument("--port", type=int, default=settings.api_port + 1)
+    run_parser.add_argument("--workers", type=int, default=1)
+    run_parser.add_argument("--duration", type=float, default=30)
+    run_parser.add_argument("--concurrency", type=int, default=32)
+    run_parser.add_argument("--timeout", type=float, default=30)
+    run_parser.add_argument("--users", type=int, default=20)
+    run_parser.add_argument("--contacts", type=int, default=200)
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--workload", type=parse_workload, default=WORKLOAD)
+    run_parser.add_argument("--output")
+    compare_parser = commands.add_parser("compare")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        compare(args.before, args.after)
+        return
+    server = start_server(args.port, args.workers) if args.start_server else None
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    report(results)
+    output = args.output or RESULTS_DIR / (
+        f"{datetime.now():%Y%m%d-%H%M%S}-{results['meta']['git_revision']}.json"
+    )
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    Path(output).write_text(json.dumps(results, indent=2))
+    print(f"Saved {output}")
+
+
+if __name__ == "__main__":
+    main()
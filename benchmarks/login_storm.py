@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import math
+import statistics
+import time
+
+from src.services.auth import auth_service
+
+
+# Measures how late an unrelated coroutine (a stand-in for any other request
+# on the same worker) is scheduled while a burst of logins verifies passwords,
+# first with bcrypt called inline on the event loop, then through the pool.
+
+
+async def probe(latencies: list, stop: asyncio.Event, interval: float) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        latencies.append(time.perf_counter() - started - interval)
+
+
+async def inline_login(password: str, hashed: str) -> None:
+    auth_service.pwd_context.verify(password, hashed)
+    await asyncio.sleep(0)
+
+
+async def pooled_login(password: str, hashed: str) -> None:
+    await auth_service.verify_password(password, hashed)
+
+
+async def storm(login, logins: int, concurrency: int, hashed: str) -> list:
+    latencies, stop = [], asyncio.Event()
+    probe_task = asyncio.create_task(probe(latencies, stop, 0.005))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one() -> None:
+        async with semaphore:
+            await login("benchmark-password", hashed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe_task
+    return latencies, elapsed
+
+
+def percentile(values: list, fraction: float) -> float:
+    return values[min(len(values) - 1, math.ceil(len(values) * fraction) - 1)]
+
+
+def report(name: str, latencies: list, elapsed: float, logins: int) -> None:
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p99 = percentile(latencies, 0.99) * 1000
+    print(
+        f"{name:<7} logins/s: {logins / elapsed:>7.1f}  "
+        f"unrelated ({len(latencies)} samples) "
+        f"p50: {p50:>8.2f} ms  p99: {p99:>8.2f} ms"
+    )
+
+
+async def main(logins: int, concurrency: int) -> None:
+    hashed = await auth_service.get_password_hash("benchmark-password")
+    latencies, elapsed = await storm(inline_login, logins, concurrency, hashed)
+    report("inline", latencies, elapsed, logins)
+    latencies, elapsed = await storm(pooled_login, logins, concurrency, hashed)
+    report("pooled", latencies, elapsed, logins)
+    print(auth_service.hashing_executor.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.concurrency))
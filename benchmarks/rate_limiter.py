@@ -0,0 +1,99 @@
+import argparse
+import asyncio
+import math
+import statistics
+import time
+
+from fastapi import HTTPException
+from fastapi_limiter import FastAPILimiter
+from fastapi_limiter.depends import RateLimiter
+from starlette.requests import Request
+from starlette.responses import Response
+
+from main import app
+from src.conf.config import settings
+from src.database.connect_db import redis_db0
+from src.services.rate_limiter import LocalRateLimiter
+
+
+# Times the rate limiter dependency alone for the same stream of requests:
+# fastapi_limiter does a Lua round trip to Redis per request, the local
+# limiter takes tokens in process and syncs with Redis in the background.
+# Needs the Redis from .env.
+
+
+def make_request(path: str, client: str) -> Request:
+    route = next(route for route in app.routes if route.path == path)
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": path,
+            "query_string": b"",
+            "headers": [],
+            "client": (client, 50000),
+            "route": route,
+            "app": app,
+        }
+    )
+
+
+async def measure(limiter, requests: list) -> list:
+    latencies = []
+    for request in requests:
+        started = time.perf_counter()
+        try:
+            await limiter(request, Response())
+        except HTTPException:
+            pass
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def percentile(values: list, fraction: float) -> float:
+    return values[min(len(values) - 1, math.ceil(len(values) * fraction) - 1)]
+
+
+def report(name: str, latencies: list) -> None:
+    latencies = sorted(latencies)
+    print(
+        f"{name:<15} p50: {statistics.median(latencies) * 1e6:>8.1f} us  "
+        f"p99: {percentile(latencies, 0.99) * 1e6:>8.1f} us"
+    )
+
+
+async def run(requests_count: int, clients: int) -> None:
+    requests = [
+        make_request("/api/contacts/", f"10.0.{index % clients // 256}.{index % 256}")
+        for index in range(requests_count)
+    ]
+    await FastAPILimiter.init(redis_db0, prefix="benchmark-fastapi-limiter")
+    fastapi_limiter = RateLimiter(
+        times=settings.rate_limiter_times, seconds=settings.rate_limiter_seconds
+    )
+    report("fastapi_limiter", await measure(fastapi_limiter, requests))
+
+    local_limiter = LocalRateLimiter(
+        redis_db0,
+        settings.rate_limiter_times,
+        settings.rate_limiter_seconds,
+        prefix="benchmark-rate-limiter",
+        sync_interval=settings.rate_limiter_sync_interval,
+    )
+    sync_task = asyncio.create_task(local_limiter.run_sync())
+    report("local", await measure(local_limiter, requests))
+    sync_task.cancel()
+    await local_limiter.close()
+    await FastAPILimiter.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--clients", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.clients))
+
+
+if __name__ == "__main__":
+    main()
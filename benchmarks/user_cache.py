@@ -0,0 +1,47 @@
+import pickle
+import timeit
+import uuid
+from datetime import datetime, timezone
+
+from src.database.models import User
+from src.repository.users import encode_user, decode_user
+
+
+NUMBER = 20000
+
+
+def make_user() -> User:
+    now = datetime.now(timezone.utc)
+    return User(
+        id=uuid.uuid4(),
+        username="benchmark",
+        email="benchmark@example.com",
+        password="$2b$12$" + "x" * 53,
+        created_at=now,
+        updated_at=now,
+        avatar="https://www.gravatar.com/avatar/00000000000000000000000000000000",
+        refresh_token="x" * 200,
+        is_email_confirmed=True,
+        is_password_valid=True,
+    )
+
+
+def report(name: str, data: bytes, encode, decode) -> None:
+    encode_us = timeit.timeit(encode, number=NUMBER) / NUMBER * 1e6
+    decode_us = timeit.timeit(decode, number=NUMBER) / NUMBER * 1e6
+    print(
+        f"{name:<8} size: {len(data):>5} B  "
+        f"encode: {encode_us:>7.2f} us  decode: {decode_us:>7.2f} us"
+    )
+
+
+def main() -> None:
+    user = make_user()
+    pickled = pickle.dumps(user)
+    encoded = encode_user(user)
+    report("pickle", pickled, lambda: pickle.dumps(user), lambda: pickle.loads(pickled))
+    report("orjson", encoded, lambda: encode_user(user), lambda: decode_user(encoded))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,68 +1,70 @@
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Depends, HTTPException, status, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi_limiter import FastAPILimiter
-from fastapi_limiter.depends import RateLimiter
 
-from sqlalchemy import select, text
 import uvicorn
 
 from src.conf.config import settings
-from src.database.connect_db import AsyncDBSession, get_session, redis_db0
+from src.repository import users as repository_users
 from src.routes import auth, contacts, users
+from src.services import collectors  # noqa: F401 registers the metrics collectors
+from src.services.birthdays import birthday_digests
+from src.services.email import email_outbox
+from src.services.health import health_monitor
+from src.services.metrics import MetricsMiddleware, registry
+from src.services.rate_limiter import rate_limiter
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await startup()
     yield
+    await shutdown()
 
 
 app = FastAPI(lifespan=lifespan)
+background_tasks = set()
 
 
 async def startup():
-    await FastAPILimiter.init(redis_db0)
+    background_tasks.add(
+        asyncio.create_task(repository_users.listen_for_user_cache_invalidations())
+    )
+    background_tasks.add(asyncio.create_task(rate_limiter.run_sync()))
+    background_tasks.add(asyncio.create_task(health_monitor.run()))
+    if settings.mail_worker_enabled:
+        background_tasks.add(asyncio.create_task(email_outbox.run()))
+    if settings.birthday_digest_enabled:
+        background_tasks.add(asyncio.create_task(birthday_digests.run_daily()))
+
+
+async def shutdown():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    await rate_limiter.close()
+    await email_outbox.close()
 
 
 app.include_router(
     auth.router,
     prefix="/api",
-    dependencies=[
-        Depends(
-            RateLimiter(
-                times=settings.rate_limiter_times,
-                seconds=settings.rate_limiter_seconds,
-            )
-        )
-    ],
+    dependencies=[Depends(rate_limiter)],
 )
 app.include_router(
     contacts.router,
     prefix="/api",
-    dependencies=[
-        Depends(
-            RateLimiter(
-                times=settings.rate_limiter_times,
-                seconds=settings.rate_limiter_seconds,
-            )
-        )
-    ],
+    dependencies=[Depends(rate_limiter)],
 )
 app.include_router(
     users.router,
     prefix="/api",
-    dependencies=[
-        Depends(
-            RateLimiter(
-                times=settings.rate_limiter_times,
-                seconds=settings.rate_limiter_seconds,
-            )
-        )
-    ],
+    dependencies=[Depends(rate_limiter)],
 )
 
 origins = [f"http://{settings.api_host}:{settings.api_port}"]
@@ -73,7 +75,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-DB-Queries"],
 )
+app.add_middleware(MetricsMiddleware)
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -83,48 +87,52 @@ async def favicon():
     return FileResponse("static/images/favicon.ico")
 
 
-@app.get(
-    "/",
-    dependencies=[
-        Depends(
-            RateLimiter(
-                times=settings.rate_limiter_times,
-                seconds=settings.rate_limiter_seconds,
-            )
-        )
-    ],
-)
+@app.get("/")
 async def read_root():
     return {"message": f"{settings.api_name}"}
 
 
-@app.get(
-    "/api/healthchecker",
-    dependencies=[
-        Depends(
-            RateLimiter(
-                times=settings.rate_limiter_times,
-                seconds=settings.rate_limiter_seconds,
-            )
-        )
-    ],
-)
-async def healthchecker(session: AsyncDBSession = Depends(get_session)):
-    try:
-        stmt = select(text("0"))
-        result = await session.execute(stmt)
-        result = result.scalar()
-        if result is None:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Database is not configured correctly",
-            )
-        return {"message": "OK"}
-    except Exception:
+# Health probes are not rate limited and are answered from the results of
+# the background probes.
+@app.get("/api/healthchecker")
+async def healthchecker():
+    ready, result = health_monitor.readiness()
+    if not ready:
+        failed = [name for name, check in result["checks"].items() if not check["ok"]]
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error connecting to the database",
+            detail=f"Unhealthy: {', '.join(failed) or result['status']}",
         )
+    return {"message": "OK"}
+
+
+@app.get("/api/health/live")
+async def liveness():
+    alive, result = health_monitor.liveness()
+    return JSONResponse(
+        result,
+        status_code=status.HTTP_200_OK
+        if alive
+        else status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+
+
+@app.get("/api/health/ready")
+async def readiness():
+    ready, result = health_monitor.readiness()
+    return JSONResponse(
+        result,
+        status_code=status.HTTP_200_OK
+        if ready
+        else status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 
 if __name__ == "__main__":
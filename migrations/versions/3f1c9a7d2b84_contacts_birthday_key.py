@@ -0,0 +1,30 @@
+"""Contacts birthday key
+
+Revision ID: 3f1c9a7d2b84
+Revises: 92af168b3a36
+Create Date: 2026-10-18 10:12:41.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c9a7d2b84'
+down_revision: Union[str, None] = '92af168b3a36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # A stored generated column is computed for the existing rows when it is
+    # added, so this also backfills the key.
+    op.add_column('contacts', sa.Column('birthday_key', sa.SmallInteger(), sa.Computed('(EXTRACT(MONTH FROM birthday) * 100 + EXTRACT(DAY FROM birthday))::smallint', persisted=True), nullable=True))
+    op.create_index('ix_contacts_user_id_birthday_key', 'contacts', ['user_id', 'birthday_key'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_birthday_key', table_name='contacts')
+    op.drop_column('contacts', 'birthday_key')
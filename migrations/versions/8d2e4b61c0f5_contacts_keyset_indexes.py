@@ -0,0 +1,30 @@
+"""Contacts keyset indexes
+
+Revision ID: 8d2e4b61c0f5
+Revises: 3f1c9a7d2b84
+Create Date: 2026-10-18 11:03:15.204716
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2e4b61c0f5'
+down_revision: Union[str, None] = '3f1c9a7d2b84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_contacts_user_id_last_name_id', 'contacts', ['user_id', 'last_name', 'id'], unique=False)
+    op.create_index('ix_contacts_user_id_first_name_id', 'contacts', ['user_id', 'first_name', 'id'], unique=False)
+    op.create_index('ix_contacts_user_id_created_at_id', 'contacts', ['user_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_created_at_id', table_name='contacts')
+    op.drop_index('ix_contacts_user_id_first_name_id', table_name='contacts')
+    op.drop_index('ix_contacts_user_id_last_name_id', table_name='contacts')
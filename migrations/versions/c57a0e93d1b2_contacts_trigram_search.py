@@ -0,0 +1,41 @@
+"""Contacts trigram search
+
+Revision ID: c57a0e93d1b2
+Revises: 8d2e4b61c0f5
+Create Date: 2026-10-18 12:26:07.731952
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c57a0e93d1b2'
+down_revision: Union[str, None] = '8d2e4b61c0f5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('search_text', sa.Text(), sa.Computed("lower(first_name || ' ' || last_name || ' ' || coalesce(email, '') || ' ' || coalesce(phone, '') || ' ' || coalesce(address, ''))", persisted=True), nullable=True))
+    # The trigram indexes are only created where pg_trgm can be installed,
+    # otherwise the search falls back to a plain substring match.
+    bind = op.get_bind()
+    is_available = bind.execute(sa.text("SELECT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm')")).scalar()
+    if not is_available:
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_contacts_first_name_trgm', 'contacts', ['first_name'], unique=False, postgresql_using='gin', postgresql_ops={'first_name': 'gin_trgm_ops'})
+    op.create_index('ix_contacts_last_name_trgm', 'contacts', ['last_name'], unique=False, postgresql_using='gin', postgresql_ops={'last_name': 'gin_trgm_ops'})
+    op.create_index('ix_contacts_email_trgm', 'contacts', ['email'], unique=False, postgresql_using='gin', postgresql_ops={'email': 'gin_trgm_ops'})
+    op.create_index('ix_contacts_search_text_trgm', 'contacts', ['search_text'], unique=False, postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    op.execute('DROP INDEX IF EXISTS ix_contacts_search_text_trgm')
+    op.execute('DROP INDEX IF EXISTS ix_contacts_email_trgm')
+    op.execute('DROP INDEX IF EXISTS ix_contacts_last_name_trgm')
+    op.execute('DROP INDEX IF EXISTS ix_contacts_first_name_trgm')
+    op.drop_column('contacts', 'search_text')
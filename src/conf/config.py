@@ -9,20 +9,74 @@ class Settings(BaseSettings):
     algorithm: str
     sqlalchemy_database_url_sync: str
     sqlalchemy_database_url_async: str
+    sqlalchemy_database_url_async_replicas: list[str] = []
+    replica_read_your_writes_seconds: int = 5
+    replica_retry_seconds: int = 30
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = -1
+    db_pool_pre_ping: bool = False
+    db_statement_cache_size: int = 100
+    db_prepared_statement_cache_size: int = 100
+    slow_query_ms: float = 100
+    query_repeat_threshold: int = 3
+    query_debug_header: bool = False
     redis_host: str
     redis_port: int
     redis_password: str
+    bcrypt_rounds: int = 12
+    password_hashing_workers: int = 4
+    password_hashing_max_queue: int = 64
+    token_cache_maxsize: int = 10000
+    max_sessions_per_user: int = 10
+    refresh_token_legacy_fallback: bool = True
+    user_cache_l1_maxsize: int = 10000
+    user_cache_l1_ttl: float = 30
     rate_limiter_times: int
     rate_limiter_seconds: int
+    rate_limiter_sync_interval: float = 0.5
+    rate_limiter_max_buckets: int = 100000
+    rate_limiter_trusted_proxies: list[str] = []
+    health_probe_interval: float = 5
+    health_probe_timeout: float = 2
+    health_pool_saturation: float = 0.9
+    contacts_bulk_max_items: int = 10000
+    contacts_bulk_batch_size: int = 1000
+    contacts_export_batch_size: int = 1000
+    contacts_cache_enabled: bool = True
+    contacts_cache_ttl: int = 60
+    contacts_cache_birthdays_ttl: int = 600
+    contacts_cache_max_page_bytes: int = 1048576
+    birthday_digest_enabled: bool = True
+    birthday_digest_batch_size: int = 500
     mail_server: str
     mail_port: int
     mail_username: str
     mail_password: str
     mail_from: str
     mail_from_name: str
+    mail_ssl_tls: bool = True
+    mail_starttls: bool = False
+    mail_use_credentials: bool = True
+    mail_validate_certs: bool = True
+    mail_timeout: float = 30
+    mail_pool_size: int = 2
+    mail_batch_size: int = 50
+    mail_max_attempts: int = 5
+    mail_retry_base_seconds: float = 5
+    mail_retry_max_seconds: float = 600
+    mail_worker_enabled: bool = True
     cloudinary_cloud_name: str
     cloudinary_api_key: str
     cloudinary_api_secret: str
+    avatar_storage: str = "cloudinary"
+    avatar_local_dir: str = "static/avatars"
+    avatar_local_base_url: str = ""
+    avatar_max_bytes: int = 5242880
+    avatar_max_pixels: int = 40000000
+    avatar_workers: int = 2
+    avatar_max_queue: int = 16
 
     class Config:
         env_file = ".env"
@@ -1,6 +1,13 @@
+import asyncio
+from contextlib import asynccontextmanager
+import itertools
+import time
+from typing import AsyncIterator
+from uuid import UUID
+
 from fastapi import HTTPException, status
-import redis.asyncio as redis
-from sqlalchemy.exc import SQLAlchemyError
+from redis.exceptions import RedisError
+from sqlalchemy.exc import DBAPIError, SQLAlchemyError
 from sqlalchemy.ext.asyncio import (
     create_async_engine,
     AsyncSession,
@@ -9,18 +16,115 @@ from sqlalchemy.ext.asyncio import (
 )
 
 from src.conf.config import settings
+from src.database.pool_metrics import InstrumentedAsyncQueuePool
+from src.services.metrics import InstrumentedRedis, instrument_engine
 
 
-engine: AsyncEngine = create_async_engine(
-    settings.sqlalchemy_database_url_async,
-    echo=False,
-)
+def create_engine(url: str) -> AsyncEngine:
+    return create_async_engine(
+        url,
+        echo=False,
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        connect_args={
+            "statement_cache_size": settings.db_statement_cache_size,
+            "prepared_statement_cache_size": settings.db_prepared_statement_cache_size,
+        },
+    )
+
+
+engine: AsyncEngine = create_engine(settings.sqlalchemy_database_url_async)
+instrument_engine(engine, "primary")
 
 AsyncDBSession = async_sessionmaker(
     engine, autoflush=False, expire_on_commit=False, class_=AsyncSession
 )
 
 
+# A statement that loses its replica connection runs once more on a primary
+# session, which serves the rest of the request. Only the start of a stream
+# is retried, rows already sent to the client can't be replayed.
+class ReplicaSession(AsyncSession):
+    replica_index: int = 0
+    primary: AsyncSession | None = None
+
+    async def execute(self, statement, *args, **kwargs):
+        return await self.run_with_failover("execute", statement, *args, **kwargs)
+
+    async def stream(self, statement, *args, **kwargs):
+        return await self.run_with_failover("stream", statement, *args, **kwargs)
+
+    async def run_with_failover(self, method: str, *args, **kwargs):
+        if self.primary is None:
+            try:
+                return await getattr(super(), method)(*args, **kwargs)
+            except Exception as error_message:
+                if not is_disconnect(error_message):
+                    raise
+                mark_replica_unhealthy(self.replica_index)
+                self.primary = AsyncDBSession()
+        return await getattr(self.primary, method)(*args, **kwargs)
+
+    async def rollback(self) -> None:
+        if self.primary is not None:
+            await self.primary.rollback()
+        await super().rollback()
+
+    async def close(self) -> None:
+        if self.primary is not None:
+            await self.primary.close()
+        await super().close()
+
+
+replica_engines: list[AsyncEngine] = [
+    create_engine(url) for url in settings.sqlalchemy_database_url_async_replicas
+]
+
+AsyncDBReplicaSessions = [
+    async_sessionmaker(
+        replica_engine,
+        autoflush=False,
+        expire_on_commit=False,
+        class_=ReplicaSession,
+    )
+    for replica_engine in replica_engines
+]
+
+for index, replica_engine in enumerate(replica_engines):
+    instrument_engine(replica_engine, f"replica{index}")
+
+replica_unhealthy_until = [0.0] * len(replica_engines)
+replica_counter = itertools.count()
+
+
+def get_pool_stats() -> dict:
+    return engine.sync_engine.pool.stats()
+
+
+def mark_replica_unhealthy(index: int) -> None:
+    replica_unhealthy_until[index] = time.monotonic() + settings.replica_retry_seconds
+
+
+def mark_replica_healthy(index: int) -> None:
+    replica_unhealthy_until[index] = 0.0
+
+
+def pick_replica() -> int | None:
+    now = time.monotonic()
+    healthy = [
+        index
+        for index, unhealthy_until in enumerate(replica_unhealthy_until)
+        if unhealthy_until <= now
+    ]
+    if not healthy:
+        return None
+    return healthy[next(replica_counter) % len(healthy)]
+
+
 # Dependency
 async def get_session():
     session = AsyncDBSession()
@@ -36,7 +140,7 @@ async def get_session():
         await session.close()
 
 
-redis_db0 = redis.Redis(
+redis_db0 = InstrumentedRedis(
     host=settings.redis_host,
     port=settings.redis_port,
     db=0,
@@ -45,7 +149,7 @@ redis_db0 = redis.Redis(
     decode_responses=True,
 )
 
-redis_db1 = redis.Redis(
+redis_db1 = InstrumentedRedis(
     host=settings.redis_host,
     port=settings.redis_port,
     db=1,
@@ -53,3 +157,67 @@ redis_db1 = redis.Redis(
     encoding="utf-8",
     decode_responses=False,
 )
+
+
+# After a user's own write their reads go to the primary for a while, so that
+# replication lag never hides the change from them.
+async def mark_user_write(user_id: UUID) -> None:
+    if not replica_engines:
+        return
+    try:
+        await redis_db0.set(
+            f"last_write:{user_id}", 1, ex=settings.replica_read_your_writes_seconds
+        )
+    except RedisError:
+        pass
+
+
+async def has_recent_write(user_id: UUID) -> bool:
+    try:
+        return bool(await redis_db0.exists(f"last_write:{user_id}"))
+    except RedisError:
+        return True
+
+
+def is_disconnect(error: Exception) -> bool:
+    if isinstance(error, DBAPIError):
+        return error.connection_invalidated
+    return isinstance(error, (OSError, asyncio.TimeoutError))
+
+
+@asynccontextmanager
+async def read_session(user_id: UUID) -> AsyncIterator[AsyncSession]:
+    index = None
+    if replica_engines and not await has_recent_write(user_id):
+        index = pick_replica()
+    if index is None:
+        session = AsyncDBSession()
+    else:
+        session = AsyncDBReplicaSessions[index]()
+        session.replica_index = index
+    try:
+        yield session
+    except Exception as error_message:
+        # The replica is skipped until replica_retry_seconds pass, the
+        # following reads go to the other replicas or to the primary. A
+        # statement is retried on the primary, so this is a stream cut off
+        # by the replica.
+        if (
+            index is not None
+            and session.primary is None
+            and is_disconnect(error_message)
+        ):
+            mark_replica_unhealthy(index)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Database replica is unavailable",
+            )
+        if isinstance(error_message, SQLAlchemyError):
+            await session.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Database error: {str(error_message)}",
+            )
+        raise
+    finally:
+        await session.close()
@@ -8,6 +8,8 @@ sys.path.append(os.path.dirname(SCRIPT_DIR))
 
 import asyncio
 
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import (
     create_async_engine,
     AsyncEngine,
@@ -25,6 +27,19 @@ engine: AsyncEngine = create_async_engine(
 
 async def async_main(engine) -> None:
     async with engine.begin() as conn:
+        # Without pg_trgm the trigram indexes are skipped, see trgm_index.
+        is_available = await conn.scalar(
+            text(
+                "SELECT EXISTS (SELECT 1 FROM pg_available_extensions "
+                "WHERE name = 'pg_trgm')"
+            )
+        )
+        if is_available:
+            try:
+                async with conn.begin_nested():
+                    await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            except DBAPIError as error_message:
+                print(f"pg_trgm is not installed: {error_message}")
         await conn.run_sync(Base.metadata.create_all)
     await engine.dispose()
 
@@ -4,25 +4,62 @@ from sqlalchemy import (
     UUID,
     ForeignKey,
     String,
+    Text,
     DateTime,
     Date,
     Boolean,
+    SmallInteger,
+    Computed,
+    Index,
     UniqueConstraint,
     func,
     text,
 )
+from sqlalchemy.engine import Connection
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import Mapped, declarative_base, mapped_column, relationship
 
 
 Base = declarative_base()
 
+PG_TRGM_INSTALLED = text(
+    "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')"
+)
+TRGM_COLUMNS = ("first_name", "last_name", "email", "search_text")
+
+
+# The trigram indexes are only created where pg_trgm is installed, the search
+# then falls back to a plain substring match. DDL rendered without a database
+# (a mock connection) includes them.
+def is_pg_trgm_installed(ddl, target, bind, **kw) -> bool:
+    if not isinstance(bind, Connection):
+        return True
+    return bool(bind.execute(PG_TRGM_INSTALLED).scalar())
+
+
+def trgm_index(column: str) -> Index:
+    return Index(
+        f"ix_contacts_{column}_trgm",
+        column,
+        postgresql_using="gin",
+        postgresql_ops={column: "gin_trgm_ops"},
+    ).ddl_if(callable_=is_pg_trgm_installed)
+
+
+def is_trgm_index(index: Index) -> bool:
+    return "gin_trgm_ops" in index.dialect_options["postgresql"]["ops"].values()
+
 
 class Contact(Base):
     __tablename__ = "contacts"
     __table_args__ = (
         UniqueConstraint("user_id", "email", name="uix_email"),
         UniqueConstraint("user_id", "phone", name="uix_phone"),
+        Index("ix_contacts_user_id_birthday_key", "user_id", "birthday_key"),
+        Index("ix_contacts_user_id_last_name_id", "user_id", "last_name", "id"),
+        Index("ix_contacts_user_id_first_name_id", "user_id", "first_name", "id"),
+        Index("ix_contacts_user_id_created_at_id", "user_id", "created_at", "id"),
+        *(trgm_index(column) for column in TRGM_COLUMNS),
     )
     id: Mapped[UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=text("gen_random_uuid()")
@@ -32,7 +69,23 @@ class Contact(Base):
     email: Mapped[str] = mapped_column(String(254), nullable=True)
     phone: Mapped[str] = mapped_column(String(38), nullable=True)
     birthday: Mapped[date] = mapped_column(Date())
+    birthday_key: Mapped[int] = mapped_column(
+        SmallInteger,
+        Computed(
+            "(EXTRACT(MONTH FROM birthday) * 100 + EXTRACT(DAY FROM birthday))::smallint",
+            persisted=True,
+        ),
+    )
     address: Mapped[str] = mapped_column(String(254), nullable=True)
+    search_text: Mapped[str] = mapped_column(
+        Text,
+        Computed(
+            "lower(first_name || ' ' || last_name || ' ' || coalesce(email, '') || ' ' "
+            "|| coalesce(phone, '') || ' ' || coalesce(address, ''))",
+            persisted=True,
+        ),
+        deferred=True,
+    )
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now()
     )
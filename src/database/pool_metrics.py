@@ -0,0 +1,70 @@
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, PoolProxiedConnection
+
+
+CHECKOUT_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.checkouts = 0
+        self.checkout_wait_seconds = 0.0
+        self.max_checkout_wait_seconds = 0.0
+        self.checkout_wait_buckets = [0] * len(CHECKOUT_WAIT_BUCKETS)
+        self.timeouts = 0
+        self.connects = 0
+        self.overflow_connects = 0
+
+    def record_checkout(self, wait: float) -> None:
+        self.checkouts += 1
+        self.checkout_wait_seconds += wait
+        self.max_checkout_wait_seconds = max(self.max_checkout_wait_seconds, wait)
+        for index, bucket in enumerate(CHECKOUT_WAIT_BUCKETS):
+            if wait <= bucket:
+                self.checkout_wait_buckets[index] += 1
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    def __init__(self, *args, max_overflow: int = 10, **kwargs):
+        super().__init__(*args, max_overflow=max_overflow, **kwargs)
+        self.max_overflow = max_overflow
+        self.metrics = PoolMetrics()
+        event.listen(self, "connect", self.on_connect)
+
+    def connect(self) -> PoolProxiedConnection:
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.metrics.timeouts += 1
+            raise
+        self.metrics.record_checkout(time.perf_counter() - started)
+        return connection
+
+    def on_connect(self, dbapi_connection, connection_record) -> None:
+        # The pool counts a connection opened beyond its size as overflow
+        # before opening it.
+        self.metrics.connects += 1
+        if self.overflow() > 0:
+            self.metrics.overflow_connects += 1
+
+    def stats(self) -> dict:
+        metrics = self.metrics
+        return {
+            "size": self.size(),
+            "max_overflow": self.max_overflow,
+            "in_use": self.checkedout(),
+            "idle": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "checkouts": metrics.checkouts,
+            "checkout_wait_seconds": metrics.checkout_wait_seconds,
+            "max_checkout_wait_seconds": metrics.max_checkout_wait_seconds,
+            "checkout_wait_buckets": dict(
+                zip(CHECKOUT_WAIT_BUCKETS, metrics.checkout_wait_buckets)
+            ),
+            "timeouts": metrics.timeouts,
+            "connects": metrics.connects,
+            "overflow_connects": metrics.overflow_connects,
+        }
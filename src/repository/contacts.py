@@ -1,34 +1,214 @@
-from collections import defaultdict
-from datetime import datetime, date, timedelta, timezone
-from typing import List
+from datetime import datetime, date, timezone
+from typing import AsyncIterator, List
+from uuid import UUID
 
-from sqlalchemy import select, and_
+from sqlalchemy import (
+    Row,
+    Select,
+    select,
+    update,
+    delete,
+    and_,
+    or_,
+    case,
+    func,
+    tuple_,
+)
+from redis.exceptions import RedisError
+from sqlalchemy.dialects.postgresql import insert
 
-from src.database.connect_db import AsyncDBSession
-from src.database.models import Contact, User
+from src.conf.config import settings
+from src.database.connect_db import AsyncDBSession, mark_user_write
+from src.database.models import PG_TRGM_INSTALLED, Contact, User
 from src.schemas.contacts import ContactModel
-from src.utils.is_leap_year import is_leap_year
+from src.services.birthdays import birthday_digests
+from src.services.cache import contacts_cache
+from src.utils.birthday_window import birthday_window, LEAP_DAY_KEY
 
 
-async def read_contacts(
-    offset: int,
-    limit: int,
+# asyncpg (the Postgres protocol) allows at most 32767 bind parameters in a
+# statement.
+MAX_BIND_PARAMETERS = 32767
+
+pg_trgm_available: bool | None = None
+
+
+async def is_pg_trgm_available(session: AsyncDBSession) -> bool:
+    global pg_trgm_available
+    if pg_trgm_available is None:
+        result = await session.execute(PG_TRGM_INSTALLED)
+        pg_trgm_available = bool(result.scalar())
+    return pg_trgm_available
+
+
+# The cached pages come back from JSON, the typed fields are parsed again so
+# that a row is the same whether it came from the cache or the database.
+CACHED_ROW_PARSERS = {
+    "id": UUID,
+    "birthday": date.fromisoformat,
+    "created_at": datetime.fromisoformat,
+    "updated_at": datetime.fromisoformat,
+    "user_id": UUID,
+}
+
+
+def parse_cached_row(row: dict) -> dict:
+    for name, parse in CACHED_ROW_PARSERS.items():
+        if row.get(name) is not None:
+            row[name] = parse(row[name])
+    return row
+
+
+async def get_cached(user_id: UUID, kind: str, params: dict) -> tuple:
+    version, value = await contacts_cache.get(user_id, kind, params)
+    if isinstance(value, list):
+        value = [parse_cached_row(row) for row in value]
+    elif value is not None:
+        value = parse_cached_row(value)
+    return version, value
+
+
+SORT_COLUMNS = {
+    "last_name": Contact.last_name,
+    "first_name": Contact.first_name,
+    "created_at": Contact.created_at,
+}
+
+
+EXPORT_COLUMNS = (
+    Contact.id,
+    Contact.first_name,
+    Contact.last_name,
+    Contact.email,
+    Contact.phone,
+    Contact.birthday,
+    Contact.address,
+    Contact.created_at,
+    Contact.updated_at,
+)
+
+# The fields of ContactResponse in its order. The reads select plain rows,
+# without building ORM instances, and return them as dicts.
+RESPONSE_COLUMNS = (
+    Contact.first_name,
+    Contact.last_name,
+    Contact.email,
+    Contact.phone,
+    Contact.birthday,
+    Contact.address,
+    Contact.id,
+    Contact.created_at,
+    Contact.updated_at,
+    Contact.user_id,
+)
+
+
+# fields is a sparse fieldset, the names of the ContactResponse fields to
+# select, or None for all of them. The id is always selected.
+def response_columns(fields: tuple[str, ...] | None) -> tuple:
+    if fields is None:
+        return RESPONSE_COLUMNS
+    return tuple(
+        column
+        for column in RESPONSE_COLUMNS
+        if column.key in fields or column is Contact.id
+    )
+
+
+async def filter_contacts(
+    stmt: Select,
     first_name: str,
     last_name: str,
     email: str,
-    user: User,
+    q: str | None,
     session: AsyncDBSession,
-) -> List[Contact] | None:
-    stmt = select(Contact).filter(Contact.user_id == user.id)
+) -> Select:
     if first_name:
         stmt = stmt.filter(Contact.first_name.like(f"%{first_name}%"))
     if last_name:
         stmt = stmt.filter(Contact.last_name.like(f"%{last_name}%"))
     if email:
         stmt = stmt.filter(Contact.email.like(f"%{email}%"))
-    stmt = stmt.offset(offset).limit(limit)
+    if q:
+        # Ranked search across the name, email, phone and address. Without
+        # pg_trgm it falls back to a plain substring match.
+        q = q.lower()
+        if await is_pg_trgm_available(session):
+            rank = func.word_similarity(q, Contact.search_text)
+            stmt = stmt.filter(
+                or_(
+                    Contact.search_text.op("%>")(q),
+                    Contact.search_text.contains(q, autoescape=True),
+                )
+            ).order_by(rank.desc())
+        else:
+            stmt = stmt.filter(
+                Contact.search_text.contains(q, autoescape=True)
+            ).order_by(func.strpos(Contact.search_text, q))
+    return stmt
+
+
+async def read_contacts(
+    offset: int,
+    limit: int,
+    first_name: str,
+    last_name: str,
+    email: str,
+    user: User,
+    session: AsyncDBSession,
+    sort: str = "last_name",
+    after: tuple | None = None,
+    q: str | None = None,
+    fields: tuple[str, ...] | None = None,
+) -> List[dict]:
+    params = {
+        "offset": offset,
+        "limit": limit,
+        "first_name": first_name,
+        "last_name": last_name,
+        "email": email,
+        "sort": sort,
+        "after": after,
+        "q": q,
+        "fields": fields,
+    }
+    version, contacts = await get_cached(user.id, "list", params)
+    if contacts is not None:
+        return contacts
+    sort_column = SORT_COLUMNS[sort]
+    stmt = select(*response_columns(fields)).filter(Contact.user_id == user.id)
+    stmt = await filter_contacts(stmt, first_name, last_name, email, q, session)
+    if after is None:
+        stmt = stmt.offset(offset)
+    else:
+        stmt = stmt.filter(tuple_(sort_column, Contact.id) > after)
+    stmt = stmt.order_by(sort_column, Contact.id).limit(limit)
     contacts = await session.execute(stmt)
-    return contacts.scalars()
+    contacts = [contact._asdict() for contact in contacts]
+    await contacts_cache.set(
+        user.id, version, "list", params, contacts, settings.contacts_cache_ttl
+    )
+    return contacts
+
+
+async def export_contacts(
+    first_name: str,
+    last_name: str,
+    email: str,
+    q: str | None,
+    user: User,
+    session: AsyncDBSession,
+) -> AsyncIterator[List[Row]]:
+    # Rows are fetched through a server-side cursor in partitions of
+    # yield_per rows, so memory does not grow with the number of contacts.
+    stmt = select(*EXPORT_COLUMNS).filter(Contact.user_id == user.id)
+    stmt = await filter_contacts(stmt, first_name, last_name, email, q, session)
+    stmt = stmt.order_by(Contact.last_name, Contact.id).execution_options(
+        yield_per=settings.contacts_export_batch_size
+    )
+    result = await session.stream(stmt)
+    async for partition in result.partitions():
+        yield partition
 
 
 async def read_contacts_with_birthdays_in_n_days(
@@ -37,97 +217,274 @@ async def read_contacts_with_birthdays_in_n_days(
     limit: int,
     user: User,
     session: AsyncDBSession,
-) -> List[Contact] | None:
-    stmt = select(Contact).filter(Contact.user_id == user.id)
+    today: date | None = None,
+    after: tuple | None = None,
+    fields: tuple[str, ...] | None = None,
+) -> List[dict]:
+    today = today or date.today()
+    params = {
+        "n": n,
+        "offset": offset,
+        "limit": limit,
+        "today": today,
+        "after": after,
+        "fields": fields,
+    }
+    version, contacts = await get_cached(user.id, "birthdays", params)
+    if contacts is not None:
+        return contacts
+    contacts = await read_contacts_from_birthday_digest(
+        n, offset, limit, user, session, today, after, fields
+    )
+    if contacts is None:
+        contacts = await query_contacts_with_birthdays_in_n_days(
+            n, offset, limit, user, session, today, after, fields
+        )
+    await contacts_cache.set(
+        user.id,
+        version,
+        "birthdays",
+        params,
+        contacts,
+        settings.contacts_cache_birthdays_ttl,
+    )
+    return contacts
+
+
+# Slices the user's precomputed digest and loads the contacts by id. Returns
+# None when there is no digest for the day and it can't be built, the caller
+# then runs the live query.
+async def read_contacts_from_birthday_digest(
+    n: int,
+    offset: int,
+    limit: int,
+    user: User,
+    session: AsyncDBSession,
+    today: date,
+    after: tuple | None = None,
+    fields: tuple[str, ...] | None = None,
+) -> List[dict] | None:
+    # Writes only patch today's digest, a cursor pinned to an earlier day
+    # runs the live query.
+    if not settings.birthday_digest_enabled or today != date.today():
+        return None
+    try:
+        ids = await birthday_digests.slice(user.id, today, n, offset, limit, after)
+        if ids is None:
+            await birthday_digests.build([user.id], session, today)
+            ids = await birthday_digests.slice(user.id, today, n, offset, limit, after)
+    except RedisError:
+        return None
+    if ids is None:
+        return None
+    if not ids:
+        return []
+    stmt = select(*response_columns(fields)).filter(
+        and_(Contact.user_id == user.id, Contact.id.in_(ids))
+    )
     contacts = await session.execute(stmt)
-    contacts = contacts.scalars()
-    tmp = defaultdict(list)
-    tmp_leap_day = defaultdict(list)
-    today_date = date.today()
-    is_leap_year_flag = is_leap_year(today_date.year)
-    number_of_days_in_the_year = 365 + is_leap_year_flag
-    last_date = today_date + timedelta(days=n - 1)
-    is_includes_next_year_flag = bool(last_date.year - today_date.year)
-    for contact in contacts:
-        birthday = contact.birthday
-        if not is_leap_year_flag and birthday.month == 2 and birthday.day == 29:
-            date_delta = date(year=today_date.year, month=3, day=1) - today_date
-            is_leap_day = True
-        else:
-            date_delta = birthday.replace(year=today_date.year) - today_date
-            is_leap_day = False
-        delta_days = date_delta.days
-        if is_includes_next_year_flag and delta_days < n - number_of_days_in_the_year:
-            delta_days += number_of_days_in_the_year
-        if 0 <= delta_days < n:
-            if is_leap_day:
-                tmp_leap_day[delta_days].append(contact)
-            else:
-                tmp[delta_days].append(contact)
-    if tmp_leap_day and tmp:
-        for delta_days in range(n):
-            if tmp_leap_day.get(delta_days):
-                tmp[delta_days] = tmp_leap_day[delta_days] + tmp[delta_days]
-    result = []
-    if tmp:
-        for delta_days in range(n):
-            if tmp.get(delta_days):
-                result = result + tmp[delta_days]
-    return result[offset : offset + limit]
+    contacts = {contact.id: contact._asdict() for contact in contacts}
+    return [contacts[contact_id] for contact_id in ids if contact_id in contacts]
+
+
+async def query_contacts_with_birthdays_in_n_days(
+    n: int,
+    offset: int,
+    limit: int,
+    user: User,
+    session: AsyncDBSession,
+    today: date,
+    after: tuple | None = None,
+    fields: tuple[str, ...] | None = None,
+) -> List[dict]:
+    days_until_birthday = birthday_window(n, today)
+    days = case(days_until_birthday, value=Contact.birthday_key)
+    is_not_leap_day = Contact.birthday_key != LEAP_DAY_KEY
+    stmt = select(*response_columns(fields)).filter(
+        and_(
+            Contact.user_id == user.id,
+            Contact.birthday_key.in_(days_until_birthday),
+        )
+    )
+    if after is None:
+        stmt = stmt.offset(offset)
+    else:
+        key, contact_id = after
+        if key not in days_until_birthday:
+            return []
+        stmt = stmt.filter(
+            tuple_(days, is_not_leap_day, Contact.id)
+            > (days_until_birthday[key], key != LEAP_DAY_KEY, contact_id)
+        )
+    stmt = stmt.order_by(days, is_not_leap_day, Contact.id).limit(limit)
+    contacts = await session.execute(stmt)
+    return [contact._asdict() for contact in contacts]
 
 
 async def read_contact(
-    contact_id: int, user: User, session: AsyncDBSession
-) -> Contact | None:
-    stmt = select(Contact).filter(
+    contact_id: int,
+    user: User,
+    session: AsyncDBSession,
+    fields: tuple[str, ...] | None = None,
+) -> dict | None:
+    params = {"id": contact_id, "fields": fields}
+    version, contact = await get_cached(user.id, "contact", params)
+    if contact is not None:
+        return contact
+    stmt = select(*response_columns(fields)).filter(
         and_(Contact.id == contact_id, Contact.user_id == user.id)
     )
     contact = await session.execute(stmt)
-    return contact.scalar()
+    contact = contact.first()
+    if contact:
+        contact = contact._asdict()
+        await contacts_cache.set(
+            user.id, version, "contact", params, contact, settings.contacts_cache_ttl
+        )
+    return contact
+
+
+# Runs after a committed write of the user's contacts. The first version bump
+# fences off the digest builds that read the contacts before the write, the
+# last one the pages read from the digest before the patch or from a lagging
+# replica, so none of them is cached under the final version.
+async def contacts_changed(
+    user_id: UUID, changes: List[tuple[UUID, int | None]]
+) -> None:
+    await contacts_cache.invalidate(user_id)
+    await birthday_digests.patch(user_id, changes)
+    await mark_user_write(user_id)
+    await contacts_cache.invalidate(user_id)
 
 
 async def create_contact(
     body: ContactModel, user: User, session: AsyncDBSession
-) -> Contact:
-    try:
-        contact = Contact(**body.model_dump(), user_id=user.id)
-        session.add(contact)
-        await session.commit()
-        await session.refresh(contact)
-    except Exception:
-        return None
+) -> Contact | None:
+    stmt = (
+        insert(Contact)
+        .values(**body.model_dump(), user_id=user.id)
+        .on_conflict_do_nothing()
+        .returning(Contact)
+    )
+    contact = await session.execute(stmt)
+    contact = contact.scalar()
+    await session.commit()
+    if contact:
+        await contacts_changed(user.id, [(contact.id, contact.birthday_key)])
     return contact
 
 
+async def create_contacts(
+    body: List[ContactModel], user: User, session: AsyncDBSession
+) -> List[dict]:
+    results = [None] * len(body)
+    rows = []
+    seen_emails, seen_phones = set(), set()
+    for index, contact in enumerate(body):
+        conflicts = []
+        if contact.email in seen_emails:
+            conflicts.append("uix_email")
+        if contact.phone in seen_phones:
+            conflicts.append("uix_phone")
+        seen_emails.add(contact.email)
+        seen_phones.add(contact.phone)
+        if conflicts:
+            results[index] = {
+                "index": index,
+                "status": "conflict",
+                "conflicts": conflicts,
+            }
+        else:
+            rows.append((index, {**contact.model_dump(), "user_id": user.id}))
+    rejected, digest_changes = [], []
+    # Every row binds one parameter per column, the batch is capped so that a
+    # statement stays under the driver's limit whatever the setting.
+    columns = len(rows[0][1]) if rows else 1
+    batch_size = min(settings.contacts_bulk_batch_size, MAX_BIND_PARAMETERS // columns)
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start : start + batch_size]
+        stmt = (
+            insert(Contact)
+            .values([row for _, row in batch])
+            .on_conflict_do_nothing()
+            .returning(Contact.id, Contact.email, Contact.birthday_key)
+        )
+        created = await session.execute(stmt)
+        created = created.all()
+        digest_changes += [(contact_id, key) for contact_id, _, key in created]
+        created = {email: contact_id for contact_id, email, _ in created}
+        for index, row in batch:
+            if row["email"] in created:
+                results[index] = {
+                    "index": index,
+                    "status": "created",
+                    "id": created[row["email"]],
+                }
+            else:
+                rejected.append((index, row))
+    await session.commit()
+    # Rows skipped by ON CONFLICT DO NOTHING are matched against the existing
+    # contacts to report which of the unique constraints they hit.
+    if rejected:
+        stmt = select(Contact.email, Contact.phone).filter(
+            and_(
+                Contact.user_id == user.id,
+                or_(
+                    Contact.email.in_([row["email"] for _, row in rejected]),
+                    Contact.phone.in_([row["phone"] for _, row in rejected]),
+                ),
+            )
+        )
+        existing = await session.execute(stmt)
+        existing = existing.all()
+        existing_emails = {email for email, _ in existing}
+        existing_phones = {phone for _, phone in existing}
+        for index, row in rejected:
+            conflicts = []
+            if row["email"] in existing_emails:
+                conflicts.append("uix_email")
+            if row["phone"] in existing_phones:
+                conflicts.append("uix_phone")
+            results[index] = {
+                "index": index,
+                "status": "conflict",
+                "conflicts": conflicts,
+            }
+    if digest_changes:
+        await contacts_changed(user.id, digest_changes)
+    return results
+
+
 async def update_contact(
     contact_id: int, body: ContactModel, user: User, session: AsyncDBSession
 ) -> Contact | None:
-    stmt = select(Contact).filter(
-        and_(Contact.id == contact_id, Contact.user_id == user.id)
+    stmt = (
+        update(Contact)
+        .where(and_(Contact.id == contact_id, Contact.user_id == user.id))
+        .values(**body.model_dump(), updated_at=datetime.now(timezone.utc))
+        .returning(Contact)
+        .execution_options(synchronize_session=False, populate_existing=True)
     )
     contact = await session.execute(stmt)
     contact = contact.scalar()
+    await session.commit()
     if contact:
-        contact.first_name = body.first_name
-        contact.last_name = body.last_name
-        contact.email = body.email
-        contact.phone = body.phone
-        contact.birthday = body.birthday
-        contact.address = body.address
-        contact.updated_at = datetime.now(timezone.utc)
-        await session.commit()
+        await contacts_changed(user.id, [(contact.id, contact.birthday_key)])
     return contact
 
 
 async def delete_contact(
     contact_id: int, user: User, session: AsyncDBSession
 ) -> Contact | None:
-    stmt = select(Contact).filter(
-        and_(Contact.id == contact_id, Contact.user_id == user.id)
+    stmt = (
+        delete(Contact)
+        .where(and_(Contact.id == contact_id, Contact.user_id == user.id))
+        .returning(Contact)
+        .execution_options(synchronize_session=False)
     )
     contact = await session.execute(stmt)
     contact = contact.scalar()
+    await session.commit()
     if contact:
-        await session.delete(contact)
-        await session.commit()
+        await contacts_changed(user.id, [(contact.id, None)])
     return contact
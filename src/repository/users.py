@@ -1,23 +1,132 @@
+import asyncio
+from dataclasses import dataclass
 from datetime import datetime, timezone
-import pickle
+from uuid import UUID
 
 from libgravatar import Gravatar
-from sqlalchemy import select
+import orjson
+from sqlalchemy import select, update
+from redis.exceptions import RedisError
+from sqlalchemy.dialects.postgresql import insert
 
+from src.conf.config import settings
 from src.database.connect_db import AsyncDBSession, redis_db1
 from src.database.models import User
 from src.schemas.users import UserModel
+from src.utils.ttl_cache import TTLCache
+
+
+# Bump the version whenever the cached fields change, so that entries written
+# by another deploy are never decoded with the wrong layout.
+USER_CACHE_VERSION = 1
+USER_CACHE_FIELDS = (
+    "id",
+    "username",
+    "email",
+    "created_at",
+    "updated_at",
+    "avatar",
+    "is_email_confirmed",
+    "is_password_valid",
+)
+
+
+def user_cache_key(email: str) -> str:
+    return f"user:v{USER_CACHE_VERSION}:{email}"
+
+
+def encode_user(user: User) -> bytes:
+    return orjson.dumps(
+        [USER_CACHE_VERSION, *(getattr(user, field) for field in USER_CACHE_FIELDS)]
+    )
+
+
+# Cached users are plain frozen objects rather than detached ORM instances,
+# building a User through the mapper costs more than the JSON decode itself.
+# They have only the cached fields, so reading the password or refresh token
+# from one is an AttributeError instead of a silent None.
+@dataclass(frozen=True, slots=True)
+class CachedUser:
+    id: UUID
+    username: str
+    email: str
+    created_at: datetime
+    updated_at: datetime
+    avatar: str | None
+    is_email_confirmed: bool
+    is_password_valid: bool
+
+
+def decode_user(data: bytes) -> CachedUser | None:
+    version, *values = orjson.loads(data)
+    if version != USER_CACHE_VERSION:
+        return None
+    user_id, username, email, created_at, updated_at, *flags = values
+    return CachedUser(
+        UUID(user_id),
+        username,
+        email,
+        datetime.fromisoformat(created_at),
+        datetime.fromisoformat(updated_at),
+        *flags,
+    )
+
+
+# Every worker keeps the users it has seen in an in-process L1 cache in front
+# of Redis. Writes publish the email on USER_CACHE_CHANNEL, and each worker's
+# listener evicts it, so the L1 entries never outlive an update by more than
+# the pub/sub delivery time (or the L1 TTL if a message is lost).
+USER_CACHE_CHANNEL = "user_cache:invalidate"
+user_l1_cache = TTLCache(settings.user_cache_l1_maxsize, settings.user_cache_l1_ttl)
+user_l1_invalidations = 0
+
+
+def invalidate_user_in_l1_cache(email: str | None = None) -> None:
+    global user_l1_invalidations
+    user_l1_invalidations += 1
+    if email is None:
+        user_l1_cache.clear()
+    else:
+        user_l1_cache.pop(email)
 
 
 async def set_user_in_cache(user) -> None:
-    await redis_db1.set(f"user: {user.email}", pickle.dumps(user))
-    await redis_db1.expire(f"user: {user.email}", 3600)
-
-
-async def get_user_by_email_from_cache(email: str) -> User | None:
-    user = await redis_db1.get(f"user: {email}")
+    async with redis_db1.pipeline(transaction=False) as pipe:
+        pipe.set(user_cache_key(user.email), encode_user(user), ex=3600)
+        pipe.publish(USER_CACHE_CHANNEL, user.email)
+        await pipe.execute()
+    invalidate_user_in_l1_cache(user.email)
+
+
+async def get_user_by_email_from_cache(email: str) -> CachedUser | None:
+    user = user_l1_cache.get(email)
+    if user is not None:
+        return user
+    invalidations = user_l1_invalidations
+    user = await redis_db1.get(user_cache_key(email))
     if user:
-        return pickle.loads(user)
+        user = decode_user(user)
+        # Skip the L1 if an invalidation arrived while Redis was being read,
+        # the value may already be stale.
+        if user is not None and invalidations == user_l1_invalidations:
+            user_l1_cache.set(email, user)
+        return user
+
+
+async def listen_for_user_cache_invalidations() -> None:
+    while True:
+        pubsub = redis_db1.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(USER_CACHE_CHANNEL)
+            # Messages published while unsubscribed are lost, so start empty.
+            invalidate_user_in_l1_cache()
+            async for message in pubsub.listen():
+                invalidate_user_in_l1_cache(message["data"].decode())
+        except (RedisError, OSError):
+            invalidate_user_in_l1_cache()
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.reset()
 
 
 async def get_user_by_email(email: str, session: AsyncDBSession) -> User | None:
@@ -26,57 +135,58 @@ async def get_user_by_email(email: str, session: AsyncDBSession) -> User | None:
     return user.scalar()
 
 
-async def create_user(body: UserModel, session: AsyncDBSession) -> User:
+async def update_user(email: str, session: AsyncDBSession, **values) -> User | None:
+    stmt = (
+        update(User)
+        .where(User.email == email)
+        .values(**values, updated_at=datetime.now(timezone.utc))
+        .returning(User)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    user = await session.execute(stmt)
+    user = user.scalar()
+    await session.commit()
+    if user:
+        await set_user_in_cache(user)
+    return user
+
+
+async def create_user(body: UserModel, session: AsyncDBSession) -> User | None:
     avatar = None
     try:
         g = Gravatar(body.email)
         avatar = g.get_image()
     except Exception:
         pass
-    user = User(**body.model_dump(), avatar=avatar)
-    session.add(user)
+    stmt = (
+        insert(User)
+        .values(**body.model_dump(), avatar=avatar)
+        .on_conflict_do_nothing()
+        .returning(User)
+    )
+    user = await session.execute(stmt)
+    user = user.scalar()
     await session.commit()
-    await session.refresh(user)
-    await set_user_in_cache(user)
+    if user:
+        await set_user_in_cache(user)
     return user
 
 
 async def update_token(user: User, token: str | None, session: AsyncDBSession) -> None:
-    user.refresh_token = token
-    user.updated_at = datetime.now(timezone.utc)
-    await session.commit()
-    await set_user_in_cache(user)
+    await update_user(user.email, session, refresh_token=token)
 
 
 async def confirm_email(email: str, session: AsyncDBSession) -> None:
-    user = await get_user_by_email(email, session)
-    user.is_email_confirmed = True
-    user.updated_at = datetime.now(timezone.utc)
-    await session.commit()
-    await set_user_in_cache(user)
+    await update_user(email, session, is_email_confirmed=True)
 
 
 async def invalidate_password(email, session: AsyncDBSession) -> None:
-    user = await get_user_by_email(email, session)
-    user.is_password_valid = False
-    user.updated_at = datetime.now(timezone.utc)
-    await session.commit()
-    await set_user_in_cache(user)
+    await update_user(email, session, is_password_valid=False, refresh_token=None)
 
 
 async def reset_password(email, password, session: AsyncDBSession) -> None:
-    user = await get_user_by_email(email, session)
-    user.password = password
-    user.is_password_valid = True
-    user.updated_at = datetime.now(timezone.utc)
-    await session.commit()
-    await set_user_in_cache(user)
+    await update_user(email, session, password=password, is_password_valid=True)
 
 
 async def update_avatar(email, url: str, session: AsyncDBSession) -> User:
-    user = await get_user_by_email(email, session)
-    user.avatar = url
-    user.updated_at = datetime.now(timezone.utc)
-    await session.commit()
-    await set_user_in_cache(user)
-    return user
+    return await update_user(email, session, avatar=url)
@@ -1,9 +1,11 @@
+from uuid import uuid4
+
 from fastapi import (
     APIRouter,
     HTTPException,
     Depends,
+    Header,
     Security,
-    BackgroundTasks,
     Request,
     status,
 )
@@ -13,20 +15,27 @@ from fastapi.security import (
     HTTPBearer,
 )
 
+from src.conf.config import settings
 from src.database.connect_db import AsyncDBSession, get_session
+from src.database.models import User
 from src.schemas.users import (
     UserModel,
     UserRequestEmail,
     UserPasswordResetConfirmationModel,
     UserResponse,
 )
-from src.schemas.tokens import TokenModel, TokenPasswordResetConfirmationModel
+from src.schemas.tokens import (
+    SessionResponse,
+    TokenModel,
+    TokenPasswordResetConfirmationModel,
+)
 from src.repository import users as repository_users
 from src.services.auth import auth_service
 from src.services.email import (
     send_email_for_verification,
     send_email_for_password_reset,
 )
+from src.services.sessions import session_store
 
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -38,20 +47,16 @@ security = HTTPBearer()
 )
 async def signup(
     body: UserModel,
-    background_tasks: BackgroundTasks,
     request: Request,
     session: AsyncDBSession = Depends(get_session),
 ):
-    user = await repository_users.get_user_by_email(body.email, session)
-    if user:
+    body.password = await auth_service.get_password_hash(body.password)
+    user = await repository_users.create_user(body, session)
+    if user is None:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT, detail="The account already exists"
         )
-    body.password = auth_service.get_password_hash(body.password)
-    user = await repository_users.create_user(body, session)
-    background_tasks.add_task(
-        send_email_for_verification, user.email, user.username, request.base_url
-    )
+    await send_email_for_verification(user.email, user.username, request.base_url)
     return {
         "user": user,
         "detail": "The user successfully created. Check your email for confirmation",
@@ -61,6 +66,7 @@ async def signup(
 @router.post("/login", response_model=TokenModel)
 async def login(
     body: OAuth2PasswordRequestForm = Depends(),
+    x_device_id: str | None = Header(default=None, max_length=64),
     session: AsyncDBSession = Depends(get_session),
 ):
     user = await repository_users.get_user_by_email(body.username, session)
@@ -78,14 +84,20 @@ async def login(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Password reset is not confirmed",
         )
-    if not auth_service.verify_password(body.password, user.password):
+    if not await auth_service.verify_password(body.password, user.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password"
         )
     # Generate JWTs
     access_token = await auth_service.create_access_token(data={"sub": user.email})
     refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
-    await repository_users.update_token(user, refresh_token, session)
+    # A new login from the same device replaces that device's session.
+    await session_store.create(
+        user.email,
+        refresh_token,
+        x_device_id or uuid4().hex,
+        auth_service.get_token_expiry(refresh_token),
+    )
     return {
         "access_token": access_token,
         "refresh_token": refresh_token,
@@ -100,19 +112,26 @@ async def refresh_token(
 ):
     token = credentials.credentials
     email = await auth_service.decode_refresh_token(token)
-    user = await repository_users.get_user_by_email(email, session)
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email"
-        )
-    if user.refresh_token != token:
-        await repository_users.update_token(user, None, session)
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token"
-        )
     access_token = await auth_service.create_access_token(data={"sub": email})
     refresh_token = await auth_service.create_refresh_token(data={"sub": email})
-    await repository_users.update_token(user, refresh_token, session)
+    expires_at = auth_service.get_token_expiry(refresh_token)
+    device_id = await session_store.rotate(email, token, refresh_token, expires_at)
+    if device_id is None:
+        # Sessions issued before the store existed are kept in
+        # users.refresh_token and move to the store on their first refresh.
+        user = None
+        if settings.refresh_token_legacy_fallback:
+            user = await repository_users.get_user_by_email(email, session)
+        if user is None or user.refresh_token != token:
+            # A valid refresh token without a session was already used or
+            # revoked, it may be stolen, so every session of the user ends.
+            await session_store.revoke_all(email)
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid refresh token",
+            )
+        await repository_users.update_token(user, None, session)
+        await session_store.create(email, refresh_token, uuid4().hex, expires_at)
     return {
         "access_token": access_token,
         "refresh_token": refresh_token,
@@ -120,10 +139,41 @@ async def refresh_token(
     }
 
 
+@router.post("/logout")
+async def logout(
+    credentials: HTTPAuthorizationCredentials = Security(security),
+    session: AsyncDBSession = Depends(get_session),
+):
+    token = credentials.credentials
+    email = await auth_service.decode_refresh_token(token)
+    revoked = await session_store.revoke(token)
+    if not revoked and settings.refresh_token_legacy_fallback:
+        # A legacy session would otherwise still refresh from users.refresh_token.
+        user = await repository_users.get_user_by_email(email, session)
+        if user is not None and user.refresh_token == token:
+            await repository_users.update_token(user, None, session)
+    return {"message": "Logged out"}
+
+
+@router.post("/logout_all")
+async def logout_all(
+    current_user: User = Depends(auth_service.get_current_user),
+    session: AsyncDBSession = Depends(get_session),
+):
+    revoked = await session_store.revoke_all(current_user.email)
+    if settings.refresh_token_legacy_fallback:
+        await repository_users.update_token(current_user, None, session)
+    return {"message": f"{revoked} sessions revoked"}
+
+
+@router.get("/sessions", response_model=list[SessionResponse])
+async def read_sessions(current_user: User = Depends(auth_service.get_current_user)):
+    return await session_store.list(current_user.email)
+
+
 @router.post("/verification_email")
 async def request_verification_email(
     body: UserRequestEmail,
-    background_tasks: BackgroundTasks,
     request: Request,
     session: AsyncDBSession = Depends(get_session),
 ):
@@ -132,8 +182,8 @@ async def request_verification_email(
         if user.is_email_confirmed:
             return {"message": "The email is already confirmed"}
         if user.is_password_valid:
-            background_tasks.add_task(
-                send_email_for_verification, user.email, user.username, request.base_url
+            await send_email_for_verification(
+                user.email, user.username, request.base_url
             )
     return {"message": "Check your email for confirmation"}
 
@@ -155,18 +205,12 @@ async def confirm_email(token: str, session: AsyncDBSession = Depends(get_sessio
 @router.post("/password_reset_email")
 async def request_password_reset_email(
     body: UserRequestEmail,
-    background_tasks: BackgroundTasks,
     request: Request,
     session: AsyncDBSession = Depends(get_session),
 ):
     user = await repository_users.get_user_by_email(body.email, session)
     if user and user.is_email_confirmed:
-        background_tasks.add_task(
-            send_email_for_password_reset,
-            user.email,
-            user.username,
-            request.base_url,
-        )
+        await send_email_for_password_reset(user.email, user.username, request.base_url)
     return {"message": "Check your email for a password reset"}
 
 
@@ -185,6 +229,7 @@ async def reset_password(
         )
     if user.is_password_valid:
         await repository_users.invalidate_password(email, session)
+        await session_store.revoke_all(email)
     password_reset_confirmation_token = (
         await auth_service.create_password_reset_confirmation_token(data={"sub": email})
     )
@@ -204,6 +249,6 @@ async def reset_password_confirmation(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Password reset confirmation error",
         )
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await auth_service.get_password_hash(body.password)
     await repository_users.reset_password(email, body.password, session)
     return {"message": "The password has been reset"}
@@ -1,58 +1,217 @@
+from datetime import date
 from pydantic import UUID4
-from typing import List
+from typing import List, Literal
 
-from fastapi import APIRouter, HTTPException, Depends, Query, Path, status
+from fastapi import (
+    APIRouter,
+    HTTPException,
+    Depends,
+    Body,
+    Query,
+    Path,
+    status,
+)
+from fastapi.responses import StreamingResponse
 
-from src.database.connect_db import AsyncDBSession, get_session
+from src.database.connect_db import AsyncDBSession, get_session, read_session
 from src.database.models import User
 from src.repository import contacts as repository_contacts
-from src.schemas.contacts import ContactModel, ContactResponse
+from src.conf.config import settings
+from src.schemas.contacts import (
+    ContactModel,
+    ContactResponse,
+    ContactFieldsResponse,
+    ContactBulkResponse,
+)
 from src.services.auth import auth_service
+from src.utils.birthday_window import birthday_key
+from src.utils.export import to_ndjson, to_csv
+from src.utils.responses import ORJSONResponse
+from src.utils.cursor import (
+    encode_cursor,
+    decode_contacts_cursor,
+    decode_birthdays_cursor,
+)
 
 
 router = APIRouter(prefix="/contacts", tags=["contacts"])
 
 
-@router.get("/", response_model=List[ContactResponse])
+# Dependency
+async def get_read_session(user: User = Depends(auth_service.get_current_user)):
+    async with read_session(user.id) as session:
+        yield session
+
+
+# Parses the fields= sparse fieldset into ContactResponse field names in their
+# order, the id and the fields required for the cursor are always included.
+def parse_fields(fields: str | None, *required: str) -> tuple[str, ...] | None:
+    if fields is None:
+        return None
+    names = {name.strip() for name in fields.split(",") if name.strip()}
+    if not names:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="The fieldset is empty",
+        )
+    unknown = names - ContactResponse.model_fields.keys()
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+        )
+    names.update(("id", *required))
+    return tuple(name for name in ContactResponse.model_fields if name in names)
+
+
+FIELDS_QUERY = Query(
+    default=None,
+    description=(
+        "Comma-separated contact fields to return, the id is always included. "
+        "All the fields are returned without it."
+    ),
+)
+
+
+@router.get(
+    "/", response_model=List[ContactFieldsResponse], response_class=ORJSONResponse
+)
 async def read_contacts(
     offset: int = Query(default=0, ge=0),
     limit: int = Query(default=10, ge=1, le=1000),
+    sort: Literal["last_name", "first_name", "created_at"] = Query(default="last_name"),
+    cursor: str = Query(default=None),
     first_name: str = Query(default=None),
     last_name: str = Query(default=None),
     email: str = Query(default=None),
+    q: str = Query(default=None, min_length=1, max_length=254),
+    fields: str = FIELDS_QUERY,
     user: User = Depends(auth_service.get_current_user),
-    session: AsyncDBSession = Depends(get_session),
+    session: AsyncDBSession = Depends(get_read_session),
 ):
-    return await repository_contacts.read_contacts(
-        offset, limit, first_name, last_name, email, user, session
+    fields = parse_fields(fields, sort)
+    after = None
+    if cursor and q:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="The cursor pagination is not supported for the ranked search",
+        )
+    if cursor:
+        try:
+            after = decode_contacts_cursor(cursor, sort)
+        except ValueError as error_message:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail=str(error_message)
+            )
+    contacts = await repository_contacts.read_contacts(
+        offset,
+        limit,
+        first_name,
+        last_name,
+        email,
+        user,
+        session,
+        sort,
+        after,
+        q,
+        fields,
     )
+    headers = {}
+    if len(contacts) == limit and not q:
+        last = contacts[-1]
+        headers["X-Next-Cursor"] = encode_cursor(sort, last[sort], last["id"])
+    return ORJSONResponse(contacts, headers=headers)
 
 
-@router.get("/birthdays_in_{n}_days", response_model=List[ContactResponse])
+@router.get(
+    "/birthdays_in_{n}_days",
+    response_model=List[ContactFieldsResponse],
+    response_class=ORJSONResponse,
+)
 async def read_contacts_with_birthdays_in_n_days(
     n: int = Path(ge=1, le=31),
     offset: int = Query(default=0, ge=0),
     limit: int = Query(default=10, ge=1, le=1000),
+    cursor: str = Query(default=None),
+    fields: str = FIELDS_QUERY,
+    user: User = Depends(auth_service.get_current_user),
+    session: AsyncDBSession = Depends(get_read_session),
+):
+    fields = parse_fields(fields, "birthday")
+    # The cursor pins the date the window was computed for, so that the pages
+    # stay consistent across midnight.
+    today, after = date.today(), None
+    if cursor:
+        try:
+            today, key, contact_id = decode_birthdays_cursor(cursor)
+        except ValueError as error_message:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail=str(error_message)
+            )
+        after = (key, contact_id)
+    contacts = await repository_contacts.read_contacts_with_birthdays_in_n_days(
+        n, offset, limit, user, session, today, after, fields
+    )
+    headers = {}
+    if len(contacts) == limit:
+        last = contacts[-1]
+        headers["X-Next-Cursor"] = encode_cursor(
+            today, birthday_key(last["birthday"]), last["id"]
+        )
+    return ORJSONResponse(contacts, headers=headers)
+
+
+# The body is streamed after the route returns, so the stream opens its own
+# read session instead of using one from a dependency, whose teardown isn't
+# guaranteed to wait for the response.
+async def export_partitions(first_name, last_name, email, q, user):
+    async with read_session(user.id) as session:
+        async for partition in repository_contacts.export_contacts(
+            first_name, last_name, email, q, user, session
+        ):
+            yield partition
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_contacts(
+    format: Literal["ndjson", "csv"] = Query(default="ndjson"),
+    first_name: str = Query(default=None),
+    last_name: str = Query(default=None),
+    email: str = Query(default=None),
+    q: str = Query(default=None, min_length=1, max_length=254),
     user: User = Depends(auth_service.get_current_user),
-    session: AsyncDBSession = Depends(get_session),
 ):
-    return await repository_contacts.read_contacts_with_birthdays_in_n_days(
-        n, offset, limit, user, session
+    partitions = export_partitions(first_name, last_name, email, q, user)
+    if format == "csv":
+        columns = [column.name for column in repository_contacts.EXPORT_COLUMNS]
+        content, media_type = to_csv(partitions, columns), "text/csv"
+    else:
+        content, media_type = to_ndjson(partitions), "application/x-ndjson"
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=contacts.{format}"},
     )
 
 
-@router.get("/{contact_id}", response_model=ContactResponse)
+@router.get(
+    "/{contact_id}",
+    response_model=ContactFieldsResponse,
+    response_class=ORJSONResponse,
+)
 async def read_contact(
     contact_id: UUID4,
+    fields: str = FIELDS_QUERY,
     user: User = Depends(auth_service.get_current_user),
-    session: AsyncDBSession = Depends(get_session),
+    session: AsyncDBSession = Depends(get_read_session),
 ):
-    contact = await repository_contacts.read_contact(contact_id, user, session)
+    fields = parse_fields(fields)
+    contact = await repository_contacts.read_contact(contact_id, user, session, fields)
     if contact is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found"
         )
-    return contact
+    return ORJSONResponse(contact)
 
 
 @router.post("/", response_model=ContactResponse, status_code=status.HTTP_201_CREATED)
@@ -70,6 +229,19 @@ async def create_contact(
     return contact
 
 
+@router.post("/bulk", response_model=ContactBulkResponse)
+async def create_contacts(
+    body: List[ContactModel] = Body(
+        min_length=1, max_length=settings.contacts_bulk_max_items
+    ),
+    user: User = Depends(auth_service.get_current_user),
+    session: AsyncDBSession = Depends(get_session),
+):
+    items = await repository_contacts.create_contacts(body, user, session)
+    created = sum(item["status"] == "created" for item in items)
+    return {"created": created, "conflicts": len(items) - created, "items": items}
+
+
 @router.put("/{contact_id}", response_model=ContactResponse)
 async def update_contact(
     contact_id: UUID4,
@@ -1,11 +1,10 @@
-import cloudinary
-import cloudinary.uploader
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, status
+from fastapi import APIRouter, Depends, UploadFile, File
 
 from src.database.connect_db import AsyncDBSession, get_session
 from src.database.models import User
 from src.repository import users as repository_users
 from src.services.auth import auth_service
+from src.services.avatars import upload_avatar
 from src.conf.config import settings
 from src.schemas.users import UserDb
 
@@ -24,26 +23,7 @@ async def update_avatar(
     current_user: User = Depends(auth_service.get_current_user),
     session: AsyncDBSession = Depends(get_session),
 ):
-    cloudinary.config(
-        cloud_name=settings.cloudinary_cloud_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True,
-    )
     api_name = settings.api_name.replace(" ", "_")
-    try:
-        r = cloudinary.uploader.upload(
-            file.file,
-            public_id=f"{api_name}/{current_user.username}",
-            overwrite=True,
-        )
-        src_url = cloudinary.CloudinaryImage(
-            f"{api_name}/{current_user.username}"
-        ).build_url(width=250, height=250, crop="fill", version=r.get("version"))
-    except Exception as error_message:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Upload image error: {str(error_message)}",
-        )
+    src_url = await upload_avatar(file, f"{api_name}/{current_user.id}")
     user = await repository_users.update_avatar(current_user.email, src_url, session)
     return user
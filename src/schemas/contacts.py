@@ -1,4 +1,5 @@
 from datetime import datetime, date
+from typing import List, Literal
 from pydantic import BaseModel, Field, EmailStr, UUID4
 
 
@@ -19,3 +20,31 @@ class ContactResponse(ContactModel):
 
     class Config:
         from_attributes = True
+
+
+# A contact projected to a fields= sparse fieldset, only the fields that were
+# asked for and the id are present.
+class ContactFieldsResponse(BaseModel):
+    id: UUID4
+    first_name: str | None = None
+    last_name: str | None = None
+    email: EmailStr | None = None
+    phone: str | None = None
+    birthday: date | None = None
+    address: str | None = None
+    created_at: datetime | None = None
+    updated_at: datetime | None = None
+    user_id: UUID4 | None = None
+
+
+class ContactBulkItemResponse(BaseModel):
+    index: int
+    status: Literal["created", "conflict"]
+    id: UUID4 | None = None
+    conflicts: List[Literal["uix_email", "uix_phone"]] = []
+
+
+class ContactBulkResponse(BaseModel):
+    created: int
+    conflicts: int
+    items: List[ContactBulkItemResponse]
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from pydantic import BaseModel
 
 
@@ -9,3 +11,9 @@ class TokenModel(BaseModel):
 
 class TokenPasswordResetConfirmationModel(BaseModel):
     password_reset_confirmation_token: str
+
+
+class SessionResponse(BaseModel):
+    device_id: str
+    created_at: datetime
+    expires_at: datetime
@@ -1,5 +1,8 @@
 from datetime import datetime, timedelta
+import hashlib
+import time
 from typing import Optional
+from uuid import uuid4
 
 from jose import JWTError, jwt
 from fastapi import HTTPException, status, Depends
@@ -9,19 +12,45 @@ from passlib.context import CryptContext
 from src.conf.config import settings
 from src.database.connect_db import AsyncDBSession, get_session
 from src.repository import users as repository_users
+from src.utils.bounded_executor import BoundedExecutor, ExecutorOverloadedError
+from src.utils.ttl_cache import TTLCache
 
 
 class Auth:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    pwd_context = CryptContext(
+        schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.bcrypt_rounds
+    )
+    # bcrypt releases the GIL, so hashing in threads keeps the event loop free
+    # and still runs in parallel.
+    hashing_executor = BoundedExecutor(
+        settings.password_hashing_workers,
+        settings.password_hashing_max_queue,
+        "password-hashing",
+    )
     SECRET_KEY = settings.secret_key
     ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+    token_cache = TTLCache(settings.token_cache_maxsize, 0)
+    token_decodes = 0
+    token_decode_seconds = 0.0
 
-    def verify_password(self, plain_password, hashed_password):
-        return self.pwd_context.verify(plain_password, hashed_password)
+    async def run_hashing(self, func, *args):
+        try:
+            return await self.hashing_executor.run(func, *args)
+        except ExecutorOverloadedError:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many password operations in progress, try again later",
+                headers={"Retry-After": "1"},
+            )
+
+    async def verify_password(self, plain_password, hashed_password):
+        return await self.run_hashing(
+            self.pwd_context.verify, plain_password, hashed_password
+        )
 
-    def get_password_hash(self, password: str):
-        return self.pwd_context.hash(password)
+    async def get_password_hash(self, password: str):
+        return await self.run_hashing(self.pwd_context.hash, password)
 
     # define a function to generate a new access token
     async def create_access_token(
@@ -49,14 +78,24 @@ class Auth:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
             expire = datetime.utcnow() + timedelta(days=7)
+        # jti keeps tokens issued within the same second apart, the session
+        # store keys sessions by the token digest.
         to_encode.update(
-            {"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token"},
+            {
+                "iat": datetime.utcnow(),
+                "exp": expire,
+                "scope": "refresh_token",
+                "jti": uuid4().hex,
+            },
         )
         encoded_refresh_token = jwt.encode(
             to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM
         )
         return encoded_refresh_token
 
+    def get_token_expiry(self, token: str) -> int:
+        return jwt.get_unverified_claims(token)["exp"]
+
     async def create_email_verification_token(self, data: dict):
         to_encode = data.copy()
         expire = datetime.utcnow() + timedelta(days=7)
@@ -102,71 +141,88 @@ class Auth:
         )
         return encoded_password_reset_confirmation_token
 
+    def decode_token(
+        self,
+        token: str,
+        scope: str,
+        credentials_exception: HTTPException,
+        scope_exception: HTTPException | None = None,
+    ) -> str:
+        # Verified payloads are cached by the token digest until the token's
+        # exp, so a token reused across requests is only verified once.
+        key = hashlib.sha256(token.encode()).digest()
+        payload = self.token_cache.get(key)
+        if payload is None:
+            started = time.perf_counter()
+            try:
+                payload = jwt.decode(
+                    token, self.SECRET_KEY, algorithms=[self.ALGORITHM]
+                )
+            except JWTError:
+                raise credentials_exception
+            finally:
+                self.token_decode_seconds += time.perf_counter() - started
+                self.token_decodes += 1
+            ttl = payload.get("exp", 0) - time.time()
+            if ttl > 0:
+                self.token_cache.set(key, payload, ttl)
+        if payload.get("scope") != scope:
+            raise scope_exception or credentials_exception
+        email = payload.get("sub")
+        if email is None:
+            raise credentials_exception
+        return email
+
+    def token_cache_stats(self) -> dict:
+        hits, misses = self.token_cache.hits, self.token_cache.misses
+        average_decode_seconds = self.token_decode_seconds / max(self.token_decodes, 1)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / max(hits + misses, 1),
+            "size": len(self.token_cache),
+            "decode_seconds": self.token_decode_seconds,
+            "average_decode_seconds": average_decode_seconds,
+            "saved_seconds": hits * average_decode_seconds,
+        }
+
     async def decode_refresh_token(self, refresh_token: str):
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
         )
-        try:
-            payload = jwt.decode(
-                refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM]
-            )
-            if payload.get("scope") == "refresh_token":
-                email = payload.get("sub")
-                if email is None:
-                    raise credentials_exception
-                return email
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid scope for token",
-            )
-        except JWTError:
-            raise credentials_exception
+        scope_exception = HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid scope for token",
+        )
+        return self.decode_token(
+            refresh_token, "refresh_token", credentials_exception, scope_exception
+        )
 
     async def decode_email_verification_token(self, token: str):
         credentials_exception = HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail="Invalid token for email verification",
         )
-        try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload.get("scope") == "email_verification_token":
-                email = payload.get("sub")
-                if email is None:
-                    raise credentials_exception
-                return email
-        except JWTError:
-            raise credentials_exception
+        return self.decode_token(
+            token, "email_verification_token", credentials_exception
+        )
 
     async def decode_password_reset_token(self, token: str):
         credentials_exception = HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail="Invalid token for password reset",
         )
-        try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload.get("scope") == "password_reset_token":
-                email = payload.get("sub")
-                if email is None:
-                    raise credentials_exception
-                return email
-        except JWTError:
-            raise credentials_exception
+        return self.decode_token(token, "password_reset_token", credentials_exception)
 
     async def decode_password_reset_confirmation_token(self, token: str):
         credentials_exception = HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail="Invalid token for password reset confirmation",
         )
-        try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload.get("scope") == "password_reset_confirmation_token":
-                email = payload.get("sub")
-                if email is None:
-                    raise credentials_exception
-                return email
-        except JWTError:
-            raise credentials_exception
+        return self.decode_token(
+            token, "password_reset_confirmation_token", credentials_exception
+        )
 
     async def get_current_user(
         self,
@@ -179,17 +235,7 @@ class Auth:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-        try:
-            # Decode JWT
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload.get("scope") == "access_token":
-                email = payload.get("sub")
-                if email is None:
-                    raise credentials_exception
-            else:
-                raise credentials_exception
-        except JWTError:
-            raise credentials_exception
+        email = self.decode_token(token, "access_token", credentials_exception)
         user = await repository_users.get_user_by_email_from_cache(email)
         if user is None:
             user = await repository_users.get_user_by_email(email, session)
@@ -0,0 +1,96 @@
+import io
+
+from fastapi import HTTPException, UploadFile, status
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from src.conf.config import settings
+from src.services.storage import avatar_storage
+from src.utils.bounded_executor import BoundedExecutor, ExecutorOverloadedError
+
+
+AVATAR_SIZE = (250, 250)
+AVATAR_CONTENT_TYPE = "image/jpeg"
+ALLOWED_FORMATS = {"JPEG", "PNG", "WEBP", "GIF"}
+CHUNK_SIZE = 64 * 1024
+
+# Decoding and resizing are CPU-bound, Pillow releases the GIL for most of it.
+avatar_executor = BoundedExecutor(
+    settings.avatar_workers, settings.avatar_max_queue, "avatar-processing"
+)
+
+
+class InvalidImageError(ValueError):
+    pass
+
+
+async def read_upload(file: UploadFile, max_bytes: int) -> bytes:
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"The image is larger than {max_bytes} bytes",
+    )
+    if file.size is not None and file.size > max_bytes:
+        raise too_large
+    chunks, size = [], 0
+    while chunk := await file.read(CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_bytes:
+            raise too_large
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def process_avatar(data: bytes) -> bytes:
+    try:
+        image = Image.open(io.BytesIO(data))
+    except UnidentifiedImageError:
+        raise InvalidImageError("Unsupported image format")
+    except Image.DecompressionBombError:
+        # Pillow refuses headers far above its own pixel limit on open.
+        raise InvalidImageError("The image has too many pixels")
+    if image.format not in ALLOWED_FORMATS:
+        raise InvalidImageError(f"Unsupported image format {image.format}")
+    # The header is checked before decoding, so a small file can't expand into
+    # a huge bitmap.
+    if image.width * image.height > settings.avatar_max_pixels:
+        raise InvalidImageError("The image has too many pixels")
+    # JPEGs are decoded at a reduced scale that is still at least AVATAR_SIZE.
+    image.draft("RGB", AVATAR_SIZE)
+    try:
+        image = ImageOps.exif_transpose(image)
+        image = ImageOps.fit(image, AVATAR_SIZE, Image.Resampling.LANCZOS)
+    except (OSError, SyntaxError) as error_message:
+        raise InvalidImageError(f"Broken image: {error_message}")
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=85, optimize=True)
+    return output.getvalue()
+
+
+async def upload_avatar(file: UploadFile, name: str) -> str:
+    data = await read_upload(file, settings.avatar_max_bytes)
+    try:
+        avatar = await avatar_executor.run(process_avatar, data)
+    except ExecutorOverloadedError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many images are being processed, try again later",
+            headers={"Retry-After": "1"},
+        )
+    except InvalidImageError as error_message:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Upload image error: {str(error_message)}",
+        )
+    try:
+        return await avatar_storage.save(name, avatar, AVATAR_CONTENT_TYPE)
+    except Exception as error_message:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Upload image error: {str(error_message)}",
+        )
@@ -0,0 +1,209 @@
+import asyncio
+from datetime import date, datetime, time as dt_time, timedelta
+import logging
+from typing import Iterable
+from uuid import UUID
+
+from redis.exceptions import RedisError
+from sqlalchemy import select
+
+from src.conf.config import settings
+from src.database.connect_db import AsyncDBSession, redis_db0
+from src.database.models import Contact, User
+from src.services.cache import contacts_cache
+from src.services.metrics import track_background_task
+from src.utils.birthday_window import LEAP_DAY_KEY, birthday_window
+
+
+logger = logging.getLogger(__name__)
+
+DIGEST_DAYS = 31
+
+# Replaces the digest unless the user's contacts changed since the version
+# was read before the query, then the digest is left to the next build. The
+# "-" member with score -1 marks a built digest for a user without birthdays
+# in the window, the slices start at score 0.
+STORE_SCRIPT = """
+if (redis.call("GET", KEYS[2]) or "0") ~= ARGV[1] then
+    return 0
+end
+redis.call("DEL", KEYS[1])
+redis.call("ZADD", KEYS[1], -1, "-")
+for index = 3, #ARGV, 2 do
+    redis.call("ZADD", KEYS[1], ARGV[index], ARGV[index + 1])
+end
+redis.call("EXPIREAT", KEYS[1], ARGV[2])
+return 1
+"""
+
+# Returns false when there is no digest. After a cursor the contacts that
+# share its score are compared by id, the same order as the live query.
+SLICE_SCRIPT = """
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    return false
+end
+local limit = tonumber(ARGV[3])
+if ARGV[4] == "" then
+    return redis.call("ZRANGEBYSCORE", KEYS[1], 0, ARGV[1], "LIMIT", ARGV[2], limit)
+end
+local result = {}
+for _, member in ipairs(redis.call("ZRANGEBYSCORE", KEYS[1], ARGV[4], ARGV[4])) do
+    if member > ARGV[5] and #result < limit then
+        table.insert(result, member)
+    end
+end
+if #result < limit then
+    local rest = redis.call(
+        "ZRANGEBYSCORE", KEYS[1], "(" .. ARGV[4], ARGV[1], "LIMIT", 0, limit - #result
+    )
+    for _, member in ipairs(rest) do
+        table.insert(result, member)
+    end
+end
+return result
+"""
+
+PATCH_SCRIPT = """
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    return 0
+end
+if ARGV[2] == "" then
+    redis.call("ZREM", KEYS[1], ARGV[1])
+else
+    redis.call("ZADD", KEYS[1], ARGV[2], ARGV[1])
+end
+return 1
+"""
+
+
+# Orders by days until the birthday, then Feb 29 before Mar 1 in non-leap
+# years, like the live query.
+def digest_score(key: int, window: dict[int, int]) -> int | None:
+    if key not in window:
+        return None
+    return window[key] * 2 + (key != LEAP_DAY_KEY)
+
+
+class BirthdayDigests:
+    def __init__(self):
+        self.store_script = redis_db0.register_script(STORE_SCRIPT)
+        self.slice_script = redis_db0.register_script(SLICE_SCRIPT)
+        self.patch_script = redis_db0.register_script(PATCH_SCRIPT)
+
+    def digest_key(self, user_id: UUID, day: date) -> str:
+        return f"birthdays:{user_id}:{day.isoformat()}"
+
+    def expire_at(self, day: date) -> int:
+        return int(datetime.combine(day + timedelta(days=2), dt_time()).timestamp())
+
+    async def read_versions(self, user_ids: list[UUID]) -> list[str]:
+        async with redis_db0.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.get(contacts_cache.version_key(user_id))
+            versions = await pipe.execute()
+        return [version or "0" for version in versions]
+
+    async def build(
+        self, user_ids: list[UUID], session: AsyncDBSession, day: date
+    ) -> None:
+        window = birthday_window(DIGEST_DAYS, day)
+        versions = await self.read_versions(user_ids)
+        stmt = select(Contact.user_id, Contact.id, Contact.birthday_key).filter(
+            Contact.user_id.in_(user_ids), Contact.birthday_key.in_(window)
+        )
+        rows = await session.execute(stmt)
+        members = {user_id: [] for user_id in user_ids}
+        for user_id, contact_id, key in rows.all():
+            members[user_id] += [digest_score(key, window), str(contact_id)]
+        async with redis_db0.pipeline(transaction=False) as pipe:
+            for user_id, version in zip(user_ids, versions):
+                await self.store_script(
+                    keys=[
+                        self.digest_key(user_id, day),
+                        contacts_cache.version_key(user_id),
+                    ],
+                    args=[version, self.expire_at(day), *members[user_id]],
+                    client=pipe,
+                )
+            await pipe.execute()
+
+    async def slice(
+        self,
+        user_id: UUID,
+        day: date,
+        n: int,
+        offset: int,
+        limit: int,
+        after: tuple | None = None,
+    ) -> list[UUID] | None:
+        window = birthday_window(DIGEST_DAYS, day)
+        after_score, after_id = "", ""
+        if after is not None:
+            key, contact_id = after
+            score = digest_score(key, window)
+            if score is None or window[key] >= n:
+                return []
+            after_score, after_id = score, str(contact_id)
+        ids = await self.slice_script(
+            keys=[self.digest_key(user_id, day)],
+            args=[2 * n - 1, offset, limit, after_score, after_id],
+        )
+        if ids is None:
+            return None
+        return [UUID(contact_id) for contact_id in ids]
+
+    async def patch(
+        self, user_id: UUID, changes: Iterable[tuple[UUID, int | None]]
+    ) -> None:
+        # changes are (contact id, birthday key), None for a deleted contact.
+        day = date.today()
+        window = birthday_window(DIGEST_DAYS, day)
+        key = self.digest_key(user_id, day)
+        try:
+            async with redis_db0.pipeline(transaction=False) as pipe:
+                for contact_id, birthday_key in changes:
+                    score = None
+                    if birthday_key is not None:
+                        score = digest_score(birthday_key, window)
+                    await self.patch_script(
+                        keys=[key],
+                        args=[str(contact_id), "" if score is None else score],
+                        client=pipe,
+                    )
+                await pipe.execute()
+        except RedisError as error:
+            logger.warning("Birthday digest patch failed: %s", error)
+            # A digest that missed the change is dropped and rebuilt on read.
+            try:
+                await redis_db0.delete(key)
+            except RedisError:
+                pass
+
+    @track_background_task
+    async def build_all(self, day: date) -> None:
+        batch_size = settings.birthday_digest_batch_size
+        async with AsyncDBSession() as session:
+            users = await session.stream(
+                select(User.id).execution_options(yield_per=batch_size)
+            )
+            async for partition in users.partitions():
+                user_ids = [user_id for (user_id,) in partition]
+                async with AsyncDBSession() as batch_session:
+                    await self.build(user_ids, batch_session, day)
+
+    async def run_daily(self) -> None:
+        while True:
+            day = date.today()
+            try:
+                # One worker builds the day's digests, the others only read.
+                if await redis_db0.set(
+                    f"birthdays:build:{day.isoformat()}", 1, nx=True, ex=86400
+                ):
+                    await self.build_all(day)
+            except Exception as error:
+                logger.warning("Birthday digest build failed: %s", error)
+            tomorrow = datetime.combine(day + timedelta(days=1), dt_time())
+            await asyncio.sleep(max((tomorrow - datetime.now()).total_seconds(), 1))
+
+
+birthday_digests = BirthdayDigests()
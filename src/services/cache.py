@@ -0,0 +1,120 @@
+import hashlib
+import json
+import time
+from typing import Any, List
+from uuid import UUID
+
+import orjson
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.database.connect_db import redis_db0
+
+
+# Reads the user's version counter and the page cached under that version in
+# a single round trip.
+GET_PAGE_SCRIPT = """
+local version = redis.call("GET", KEYS[1]) or "0"
+return {version, redis.call("GET", ARGV[1] .. version .. ":" .. ARGV[2])}
+"""
+
+
+class ContactsCache:
+    def __init__(self):
+        self.get_page_script = redis_db0.register_script(GET_PAGE_SCRIPT)
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "oversized": 0,
+            "invalidations": 0,
+            "errors": 0,
+            "bypassed": 0,
+        }
+        # Users whose version bump failed, with the monotonic time until which
+        # their pages are neither read nor stored by this process.
+        self.bypass = {}
+
+    def version_key(self, user_id: UUID) -> str:
+        return f"contacts:{user_id}:version"
+
+    def page_key(self, kind: str, params: dict) -> str:
+        data = json.dumps(params, default=str, sort_keys=True).encode()
+        return f"{kind}:{hashlib.sha256(data).hexdigest()}"
+
+    async def get(
+        self, user_id: UUID, kind: str, params: dict
+    ) -> tuple[str | None, Any]:
+        if not settings.contacts_cache_enabled:
+            return None, None
+        if self.bypassed(user_id):
+            self.stats["bypassed"] += 1
+            return None, None
+        try:
+            version, page = await self.get_page_script(
+                keys=[self.version_key(user_id)],
+                args=[f"contacts:{user_id}:v", self.page_key(kind, params)],
+            )
+        except RedisError:
+            self.stats["errors"] += 1
+            return None, None
+        if page is None:
+            self.stats["misses"] += 1
+            return version, None
+        self.stats["hits"] += 1
+        return version, orjson.loads(page)
+
+    async def set(
+        self,
+        user_id: UUID,
+        version: str | None,
+        kind: str,
+        params: dict,
+        value: List[dict] | dict,
+        ttl: int,
+    ) -> None:
+        # The page is stored under the version read before the query, so a
+        # write that bumped the version in the meantime makes it unreachable.
+        if version is None:
+            return
+        # The values are the repository's response rows and are stored as
+        # they are, read back they go to the client without validation.
+        page = orjson.dumps(value, option=orjson.OPT_UTC_Z)
+        if len(page) > settings.contacts_cache_max_page_bytes:
+            self.stats["oversized"] += 1
+            return
+        key = f"contacts:{user_id}:v{version}:{self.page_key(kind, params)}"
+        try:
+            await redis_db0.set(key, page, ex=ttl)
+        except RedisError:
+            self.stats["errors"] += 1
+            return
+        self.stats["stores"] += 1
+
+    def bypassed(self, user_id: UUID) -> bool:
+        until = self.bypass.get(user_id)
+        if until is None:
+            return False
+        if until > time.monotonic():
+            return True
+        del self.bypass[user_id]
+        return False
+
+    async def invalidate(self, user_id: UUID) -> None:
+        # The write is committed already, so a failed bump is retried once and
+        # then the user's pages are bypassed here until every page stored under
+        # the old version has expired. Other processes keep serving them for
+        # at most the same TTLs, the retry makes that the rare case.
+        for _ in range(2):
+            try:
+                await redis_db0.incr(self.version_key(user_id))
+            except RedisError:
+                self.stats["errors"] += 1
+                continue
+            self.stats["invalidations"] += 1
+            return
+        ttl = max(settings.contacts_cache_ttl, settings.contacts_cache_birthdays_ttl)
+        self.bypass[user_id] = time.monotonic() + ttl
+
+
+contacts_cache = ContactsCache()
@@ -0,0 +1,205 @@
+from src.database.connect_db import engine, replica_engines
+from src.database.pool_metrics import CHECKOUT_WAIT_BUCKETS
+from src.repository import users as repository_users
+from src.services.auth import auth_service
+from src.services.cache import contacts_cache
+from src.services.health import health_monitor
+from src.services.metrics import registry
+
+
+@registry.collector
+def collect_db_pools():
+    pools = [("primary", engine)] + [
+        (f"replica{index}", replica_engine)
+        for index, replica_engine in enumerate(replica_engines)
+    ]
+    stats = [
+        (name, pool_engine.sync_engine.pool.stats()) for name, pool_engine in pools
+    ]
+    families = []
+    for key, kind, help in (
+        ("size", "gauge", "Configured pool size"),
+        ("in_use", "gauge", "Connections checked out"),
+        ("idle", "gauge", "Connections idle in the pool"),
+        ("overflow", "gauge", "Connections open beyond the pool size"),
+        ("checkouts", "counter", "Connection checkouts"),
+        ("timeouts", "counter", "Checkouts that timed out"),
+        ("connects", "counter", "New connections opened"),
+        ("overflow_connects", "counter", "Connections opened beyond the pool size"),
+    ):
+        name = f"db_pool_{key}"
+        suffix = "_total" if kind == "counter" else ""
+        families.append(
+            (
+                name,
+                kind,
+                help,
+                [(name + suffix, {"engine": pool}, item[key]) for pool, item in stats],
+            )
+        )
+    wait_samples = []
+    for pool, item in stats:
+        for bucket in CHECKOUT_WAIT_BUCKETS:
+            wait_samples.append(
+                (
+                    "db_pool_checkout_wait_seconds_bucket",
+                    {"engine": pool, "le": bucket},
+                    item["checkout_wait_buckets"][bucket],
+                )
+            )
+        wait_samples += [
+            (
+                "db_pool_checkout_wait_seconds_bucket",
+                {"engine": pool, "le": "+Inf"},
+                item["checkouts"],
+            ),
+            (
+                "db_pool_checkout_wait_seconds_sum",
+                {"engine": pool},
+                item["checkout_wait_seconds"],
+            ),
+            (
+                "db_pool_checkout_wait_seconds_count",
+                {"engine": pool},
+                item["checkouts"],
+            ),
+        ]
+    families.append(
+        (
+            "db_pool_checkout_wait_seconds",
+            "histogram",
+            "Time to check a connection out of the pool",
+            wait_samples,
+        )
+    )
+    return families
+
+
+@registry.collector
+def collect_caches():
+    token_cache = auth_service.token_cache_stats()
+    user_l1_cache = repository_users.user_l1_cache
+    return [
+        (
+            "contacts_cache_events",
+            "counter",
+            "Contacts cache events",
+            [
+                ("contacts_cache_events_total", {"event": event}, value)
+                for event, value in contacts_cache.stats.items()
+            ],
+        ),
+        (
+            "cache_lookups",
+            "counter",
+            "In-process cache lookups",
+            [
+                (
+                    "cache_lookups_total",
+                    {"cache": "token", "result": "hit"},
+                    token_cache["hits"],
+                ),
+                (
+                    "cache_lookups_total",
+                    {"cache": "token", "result": "miss"},
+                    token_cache["misses"],
+                ),
+                (
+                    "cache_lookups_total",
+                    {"cache": "user_l1", "result": "hit"},
+                    user_l1_cache.hits,
+                ),
+                (
+                    "cache_lookups_total",
+                    {"cache": "user_l1", "result": "miss"},
+                    user_l1_cache.misses,
+                ),
+            ],
+        ),
+        (
+            "cache_size",
+            "gauge",
+            "In-process cache entries",
+            [
+                ("cache_size", {"cache": "token"}, token_cache["size"]),
+                ("cache_size", {"cache": "user_l1"}, len(user_l1_cache)),
+            ],
+        ),
+        (
+            "jwt_decode_seconds",
+            "counter",
+            "Time spent verifying JWTs",
+            [("jwt_decode_seconds_total", {}, token_cache["decode_seconds"])],
+        ),
+    ]
+
+
+@registry.collector
+def collect_password_hashing():
+    stats = auth_service.hashing_executor.stats()
+    return [
+        (
+            "password_hashing_active",
+            "gauge",
+            "Password hashing calls running",
+            [("password_hashing_active", {}, stats["active"])],
+        ),
+        (
+            "password_hashing_queued",
+            "gauge",
+            "Password hashing calls waiting for a worker",
+            [("password_hashing_queued", {}, stats["queued"])],
+        ),
+        (
+            "password_hashing_calls",
+            "counter",
+            "Password hashing calls",
+            [
+                (
+                    "password_hashing_calls_total",
+                    {"result": "completed"},
+                    stats["completed"],
+                ),
+                (
+                    "password_hashing_calls_total",
+                    {"result": "rejected"},
+                    stats["rejected"],
+                ),
+            ],
+        ),
+        (
+            "password_hashing_wait_seconds",
+            "counter",
+            "Time password hashing calls waited for a worker",
+            [("password_hashing_wait_seconds_total", {}, stats["wait_seconds"])],
+        ),
+    ]
+
+
+@registry.collector
+def collect_health():
+    checks = health_monitor.checks
+    return [
+        (
+            "health_check_up",
+            "gauge",
+            "Whether the last background probe succeeded",
+            [
+                ("health_check_up", {"check": name}, int(check["ok"]))
+                for name, check in checks.items()
+            ],
+        ),
+        (
+            "health_check_latency_seconds",
+            "gauge",
+            "Latency of the last background probe",
+            [
+                (
+                    "health_check_latency_seconds",
+                    {"check": name},
+                    check["latency_ms"] / 1000,
+                )
+                for name, check in checks.items()
+            ],
+        ),
+    ]
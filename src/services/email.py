@@ -1,63 +1,349 @@
+import asyncio
+from email.message import EmailMessage
+from email.utils import formataddr
+import json
+import logging
 from pathlib import Path
+import random
+import time
+from uuid import uuid4
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+import aiosmtplib
+from jinja2 import Environment, FileSystemLoader, select_autoescape
 from pydantic import EmailStr
+from redis.exceptions import RedisError
 
 from src.conf.config import settings
+from src.database.connect_db import redis_db0
 from src.services.auth import auth_service
+from src.services.metrics import registry, track_background_task
 
 
-conf = ConnectionConfig(
-    MAIL_SERVER=settings.mail_server,
-    MAIL_PORT=settings.mail_port,
-    MAIL_USERNAME=settings.mail_username,
-    MAIL_PASSWORD=settings.mail_password,
-    MAIL_FROM=settings.mail_from,
-    MAIL_FROM_NAME=settings.mail_from_name,
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / "templates",
+logger = logging.getLogger(__name__)
+
+OUTBOX_KEY = "email:outbox"
+RETRY_KEY = "email:retry"
+DEAD_KEY = "email:dead"
+DEAD_MAX_LENGTH = 1000
+# Each worker has email:worker:<id>:heartbeat and email:worker:<id>:processing
+# keys and is a member of WORKERS_KEY.
+WORKERS_KEY = "email:workers"
+WORKER_PREFIX = "email:worker:"
+
+# The templates are compiled once, rendering a message is then just a call.
+templates_env = Environment(
+    loader=FileSystemLoader(Path(__file__).parent / "templates"),
+    autoescape=select_autoescape(["html"]),
 )
+TEMPLATES = {
+    name: templates_env.get_template(name)
+    for name in ("verification_email.html", "password_reset_email.html")
+}
 
+email_deliveries = registry.counter(
+    "email_deliveries", "Outbox messages by delivery result", ("template", "result")
+)
 
-async def send_email_for_verification(email: EmailStr, username: str, host: str):
-    try:
-        token = await auth_service.create_email_verification_token({"sub": email})
-        message = MessageSchema(
-            subject="Confirm your email",
-            recipients=[email],
-            template_body={
-                "host": host,
-                "username": username,
-                "token": token,
-            },
-            subtype=MessageType.html,
+# Moves the retries that are due back to the outbox.
+PROMOTE_RETRIES_SCRIPT = """
+local due = redis.call("ZRANGEBYSCORE", KEYS[1], "-inf", ARGV[1], "LIMIT", 0, ARGV[2])
+if #due > 0 then
+    redis.call("ZREM", KEYS[1], unpack(due))
+    redis.call("RPUSH", KEYS[2], unpack(due))
+end
+return #due
+"""
+
+# Moves up to ARGV[1] more messages from the outbox to the worker's processing
+# list, where they stay until they are sent, rescheduled or dead.
+TAKE_BATCH_SCRIPT = """
+local jobs = {}
+for _ = 1, tonumber(ARGV[1]) do
+    local job = redis.call("LMOVE", KEYS[1], KEYS[2], "LEFT", "RIGHT")
+    if not job then
+        break
+    end
+    jobs[#jobs + 1] = job
+end
+return jobs
+"""
+
+# Moves a processing list back to the front of the outbox, in its order.
+REQUEUE_SCRIPT = """
+local moved = 0
+while redis.call("LMOVE", KEYS[1], KEYS[2], "RIGHT", "LEFT") do
+    moved = moved + 1
+end
+return moved
+"""
+
+# Requeues the processing lists of the workers whose heartbeat expired.
+RECOVER_SCRIPT = """
+local moved = 0
+for _, worker in ipairs(redis.call("SMEMBERS", KEYS[1])) do
+    if redis.call("EXISTS", ARGV[1] .. worker .. ":heartbeat") == 0 then
+        local processing = ARGV[1] .. worker .. ":processing"
+        while redis.call("LMOVE", processing, KEYS[2], "RIGHT", "LEFT") do
+            moved = moved + 1
+        end
+        redis.call("SREM", KEYS[1], worker)
+    end
+end
+return moved
+"""
+
+
+def build_message(job: dict) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = formataddr((settings.mail_from_name, settings.mail_from))
+    message["To"] = job["recipient"]
+    message["Subject"] = job["subject"]
+    message.set_content(
+        TEMPLATES[job["template"]].render(**job["body"]), subtype="html"
+    )
+    return message
+
+
+class SMTPPool:
+    def __init__(self, size: int):
+        self.size = size
+        self.idle: asyncio.Queue[aiosmtplib.SMTP] = asyncio.Queue()
+        self.created = 0
+
+    def create_client(self) -> aiosmtplib.SMTP:
+        return aiosmtplib.SMTP(
+            hostname=settings.mail_server,
+            port=settings.mail_port,
+            username=settings.mail_username if settings.mail_use_credentials else None,
+            password=settings.mail_password if settings.mail_use_credentials else None,
+            use_tls=settings.mail_ssl_tls,
+            start_tls=settings.mail_starttls,
+            validate_certs=settings.mail_validate_certs,
+            timeout=settings.mail_timeout,
         )
 
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="verification_email.html")
-    except ConnectionErrors:
-        pass
+    async def acquire(self) -> aiosmtplib.SMTP:
+        if self.idle.empty() and self.created < self.size:
+            self.created += 1
+            return self.create_client()
+        return await self.idle.get()
 
+    def release(self, client: aiosmtplib.SMTP) -> None:
+        self.idle.put_nowait(client)
 
-async def send_email_for_password_reset(email: EmailStr, username: str, host: str):
-    try:
-        token = await auth_service.create_password_reset_token({"sub": email})
-        message = MessageSchema(
-            subject="Password reset",
-            recipients=[email],
-            template_body={
-                "host": host,
-                "username": username,
-                "token": token,
-            },
-            subtype=MessageType.html,
+    async def send(self, message: EmailMessage) -> None:
+        client = await self.acquire()
+        try:
+            # Servers drop idle connections, a dropped one is reopened once.
+            for attempt in range(2):
+                if not client.is_connected:
+                    await client.connect()
+                try:
+                    await client.send_message(message)
+                    return
+                except aiosmtplib.SMTPServerDisconnected:
+                    client.close()
+                    if attempt:
+                        raise
+        except Exception:
+            if client.is_connected:
+                client.close()
+            raise
+        finally:
+            self.release(client)
+
+    async def close(self) -> None:
+        while not self.idle.empty():
+            client = self.idle.get_nowait()
+            if client.is_connected:
+                try:
+                    await client.quit()
+                except aiosmtplib.SMTPException:
+                    client.close()
+        self.created = 0
+
+
+class EmailOutbox:
+    def __init__(self):
+        self.pool = SMTPPool(settings.mail_pool_size)
+        self.worker_id = uuid4().hex
+        self.heartbeat_key = f"{WORKER_PREFIX}{self.worker_id}:heartbeat"
+        self.processing_key = f"{WORKER_PREFIX}{self.worker_id}:processing"
+        # Set when a job couldn't be taken off the processing list, it goes
+        # back to the outbox before the next batch.
+        self.unacked = False
+        self.promote_retries_script = redis_db0.register_script(PROMOTE_RETRIES_SCRIPT)
+        self.take_batch_script = redis_db0.register_script(TAKE_BATCH_SCRIPT)
+        self.requeue_script = redis_db0.register_script(REQUEUE_SCRIPT)
+        self.recover_script = redis_db0.register_script(RECOVER_SCRIPT)
+
+    def heartbeat_ttl(self) -> int:
+        # The heartbeat is refreshed by every acknowledged job, it outlives a
+        # send that reconnects once. A worker stuck for longer has its jobs
+        # requeued, a message may then be sent twice but never lost.
+        return int(settings.mail_timeout * 4) + 1
+
+    async def enqueue(
+        self, template: str, subject: str, recipient: str, body: dict
+    ) -> None:
+        job = {
+            "template": template,
+            "subject": subject,
+            "recipient": recipient,
+            "body": body,
+            "attempts": 0,
+        }
+        try:
+            await redis_db0.rpush(OUTBOX_KEY, json.dumps(job))
+        except RedisError as error:
+            # Without the queue the message is sent right away rather than lost.
+            logger.warning("Email outbox is unavailable, sending directly: %s", error)
+            await self.deliver(job)
+
+    async def prepare(self) -> None:
+        # Announces the worker, moves the due retries to the outbox and gives
+        # back the jobs of the workers that stopped, in one round trip.
+        async with redis_db0.pipeline(transaction=False) as pipe:
+            pipe.set(self.heartbeat_key, 1, ex=self.heartbeat_ttl())
+            pipe.sadd(WORKERS_KEY, self.worker_id)
+            await self.promote_retries_script(
+                keys=[RETRY_KEY, OUTBOX_KEY],
+                args=[time.time(), settings.mail_batch_size],
+                client=pipe,
+            )
+            await self.recover_script(
+                keys=[WORKERS_KEY, OUTBOX_KEY], args=[WORKER_PREFIX], client=pipe
+            )
+            if self.unacked:
+                await self.requeue_script(
+                    keys=[self.processing_key, OUTBOX_KEY], client=pipe
+                )
+            await pipe.execute()
+        self.unacked = False
+
+    async def pop_batch(self) -> list[str]:
+        # The jobs are moved, not popped, so a worker that dies mid-batch
+        # leaves them in its processing list for the others to recover.
+        job = await redis_db0.blmove(
+            OUTBOX_KEY, self.processing_key, 1, "LEFT", "RIGHT"
+        )
+        if job is None:
+            return []
+        rest = await self.take_batch_script(
+            keys=[OUTBOX_KEY, self.processing_key],
+            args=[settings.mail_batch_size - 1],
         )
+        return [job, *rest]
+
+    async def deliver(self, job: dict) -> bool:
+        try:
+            await self.pool.send(build_message(job))
+        except (aiosmtplib.SMTPException, OSError, asyncio.TimeoutError) as error:
+            logger.warning(
+                "Sending %s to %s failed: %s", job["template"], job["recipient"], error
+            )
+            return False
+        email_deliveries.inc((job["template"], "sent"))
+        return True
+
+    async def ack(self, raw: str, job: dict | None, delivered: bool) -> None:
+        # Takes the job off the processing list, together with its retry or
+        # dead letter when it wasn't delivered. A job that can't be processed
+        # at all is None and goes to the dead letters as it was queued.
+        async with redis_db0.pipeline(transaction=True) as pipe:
+            if job is None:
+                email_deliveries.inc(("unknown", "dead"))
+                pipe.lpush(DEAD_KEY, raw)
+                pipe.ltrim(DEAD_KEY, 0, DEAD_MAX_LENGTH - 1)
+            elif not delivered:
+                self.reschedule(job, pipe)
+            pipe.lrem(self.processing_key, 1, raw)
+            pipe.set(self.heartbeat_key, 1, ex=self.heartbeat_ttl())
+            await pipe.execute()
+
+    def reschedule(self, job: dict, pipe) -> None:
+        job = {**job, "attempts": job["attempts"] + 1}
+        if job["attempts"] >= settings.mail_max_attempts:
+            email_deliveries.inc((job["template"], "dead"))
+            pipe.lpush(DEAD_KEY, json.dumps(job))
+            pipe.ltrim(DEAD_KEY, 0, DEAD_MAX_LENGTH - 1)
+            return
+        email_deliveries.inc((job["template"], "retried"))
+        delay = min(
+            settings.mail_retry_base_seconds * 2 ** (job["attempts"] - 1),
+            settings.mail_retry_max_seconds,
+        )
+        due = time.time() + delay * random.uniform(0.8, 1.2)
+        pipe.zadd(RETRY_KEY, {json.dumps(job): due})
+
+    async def process(self, raw: str) -> None:
+        try:
+            job = json.loads(raw)
+            delivered = await self.deliver(job)
+        except Exception:
+            # A malformed job or an unknown template would fail the same way
+            # on every attempt, so it isn't retried.
+            logger.exception("Email job can't be processed: %.200s", raw)
+            job, delivered = None, False
+        try:
+            await self.ack(raw, job, delivered)
+        except RedisError as error:
+            # One failed ack doesn't stop the rest of the batch.
+            self.unacked = True
+            logger.warning("Acknowledging an email job failed: %s", error)
+
+    @track_background_task
+    async def process_batch(self, jobs: list[str]) -> None:
+        # Up to mail_pool_size messages are in flight at once, one per
+        # connection.
+        await asyncio.gather(*(self.process(raw) for raw in jobs))
 
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="password_reset_email.html")
-    except ConnectionErrors:
-        pass
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.prepare()
+                jobs = await self.pop_batch()
+                if not jobs:
+                    continue
+                try:
+                    await self.process_batch(jobs)
+                except asyncio.CancelledError:
+                    # Stopped mid-batch, the jobs go back to the front of the
+                    # outbox, a message may be sent twice but never lost.
+                    await self.requeue_script(keys=[self.processing_key, OUTBOX_KEY])
+                    raise
+            except RedisError as error:
+                logger.warning("Email outbox worker: %s", error)
+                self.unacked = True
+                await asyncio.sleep(settings.mail_retry_base_seconds)
+            except Exception:
+                # Keeps the worker alive, the batch goes back to the outbox.
+                logger.exception("Email outbox worker failed")
+                self.unacked = True
+                await asyncio.sleep(settings.mail_retry_base_seconds)
+
+    async def close(self) -> None:
+        await self.pool.close()
+
+
+email_outbox = EmailOutbox()
+
+
+async def send_email_for_verification(email: EmailStr, username: str, host: str):
+    token = await auth_service.create_email_verification_token({"sub": email})
+    await email_outbox.enqueue(
+        "verification_email.html",
+        "Confirm your email",
+        email,
+        {"host": str(host), "username": username, "token": token},
+    )
+
+
+async def send_email_for_password_reset(email: EmailStr, username: str, host: str):
+    token = await auth_service.create_password_reset_token({"sub": email})
+    await email_outbox.enqueue(
+        "password_reset_email.html",
+        "Password reset",
+        email,
+        {"host": str(host), "username": username, "token": token},
+    )
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.conf.config import settings
+from src.database.connect_db import (
+    engine,
+    get_pool_stats,
+    mark_replica_healthy,
+    mark_replica_unhealthy,
+    redis_db0,
+    redis_db1,
+    replica_engines,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+async def probe_database(database_engine: AsyncEngine) -> None:
+    async with database_engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+
+
+async def probe_pool() -> None:
+    stats = get_pool_stats()
+    capacity = stats["size"] + max(stats["max_overflow"], 0)
+    saturation = stats["in_use"] / capacity if capacity else 0
+    if saturation >= settings.health_pool_saturation:
+        raise RuntimeError(
+            f"{stats['in_use']} of {capacity} connections in use, "
+            f"{stats['timeouts']} checkout timeouts"
+        )
+
+
+class HealthMonitor:
+    def __init__(self):
+        # name -> (probe, required for readiness)
+        self.probes: dict[str, tuple[Callable[[], Awaitable], bool]] = {
+            "postgres": (lambda: probe_database(engine), True),
+            "redis_db0": (redis_db0.ping, True),
+            "redis_db1": (redis_db1.ping, True),
+            # A saturated pool still serves requests, just slower.
+            "db_pool": (probe_pool, False),
+        }
+        for index, replica_engine in enumerate(replica_engines):
+            # Replicas are not required, reads fall back to the primary.
+            self.probes[f"replica{index}"] = (
+                lambda replica_engine=replica_engine: probe_database(replica_engine),
+                False,
+            )
+        self.checks: dict[str, dict] = {}
+        self.checked_at: float | None = None
+
+    async def run_probe(self, name: str) -> dict:
+        probe, required = self.probes[name]
+        started = time.perf_counter()
+        error = None
+        try:
+            await asyncio.wait_for(probe(), settings.health_probe_timeout)
+        except asyncio.TimeoutError:
+            error = "timeout"
+        except Exception as error_message:
+            error = str(error_message) or type(error_message).__name__
+        return {
+            "ok": error is None,
+            "required": required,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 3),
+            "error": error,
+        }
+
+    async def probe(self) -> None:
+        names = list(self.probes)
+        results = await asyncio.gather(*(self.run_probe(name) for name in names))
+        self.checks = dict(zip(names, results))
+        self.checked_at = time.time()
+        for index in range(len(replica_engines)):
+            if self.checks[f"replica{index}"]["ok"]:
+                mark_replica_healthy(index)
+            else:
+                mark_replica_unhealthy(index)
+        for name, check in self.checks.items():
+            if not check["ok"]:
+                logger.warning("Health check %s failed: %s", name, check["error"])
+
+    async def run(self) -> None:
+        while True:
+            await self.probe()
+            await asyncio.sleep(settings.health_probe_interval)
+
+    def is_stale(self) -> bool:
+        # Probes stop updating when the loop is wedged or the task died.
+        return (
+            self.checked_at is None
+            or time.time() - self.checked_at
+            > settings.health_probe_interval * 3 + settings.health_probe_timeout
+        )
+
+    def liveness(self) -> tuple[bool, dict]:
+        if self.checked_at is None:
+            return True, {"status": "starting", "checked_at": None}
+        alive = not self.is_stale()
+        return alive, {
+            "status": "ok" if alive else "stale",
+            "checked_at": self.checked_at,
+        }
+
+    def readiness(self) -> tuple[bool, dict]:
+        ready = not self.is_stale() and all(
+            check["ok"] for check in self.checks.values() if check["required"]
+        )
+        if self.checked_at is None:
+            status = "starting"
+        elif ready:
+            degraded = any(not check["ok"] for check in self.checks.values())
+            status = "degraded" if degraded else "ok"
+        else:
+            status = "unavailable"
+        return ready, {
+            "status": status,
+            "checked_at": self.checked_at,
+            "checks": self.checks,
+        }
+
+
+health_monitor = HealthMonitor()
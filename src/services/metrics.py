@@ -0,0 +1,344 @@
+from contextvars import ContextVar
+import functools
+import logging
+import time
+from typing import Callable, Iterable
+
+from fastapi import HTTPException, Request, Response, status
+import redis.asyncio as redis
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.conf.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[tuple[str, dict, float]]:
+        for labels, value in self.values.items():
+            yield self.name + "_total", dict(zip(self.labelnames, labels)), value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple = (),
+        buckets: tuple = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [per-bucket counts, sum, count]
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, value: float, labels: tuple = ()) -> None:
+        item = self.values.get(labels)
+        if item is None:
+            item = self.values[labels] = [[0] * len(self.buckets), 0.0, 0]
+        for index, bucket in enumerate(self.buckets):
+            if value <= bucket:
+                item[0][index] += 1
+                break
+        item[1] += value
+        item[2] += 1
+
+    def samples(self) -> Iterable[tuple[str, dict, float]]:
+        for labels, (counts, total, count) in self.values.items():
+            labels = dict(zip(self.labelnames, labels))
+            cumulative = 0
+            for bucket, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield self.name + "_bucket", {**labels, "le": bucket}, cumulative
+            yield self.name + "_bucket", {**labels, "le": "+Inf"}, count
+            yield self.name + "_sum", labels, total
+            yield self.name + "_count", labels, count
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors: list[Callable] = []
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple = (),
+        buckets: tuple = LATENCY_BUCKETS,
+    ) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, func: Callable) -> Callable:
+        # A collector returns (name, kind, help, samples) families, computed at
+        # scrape time from the stats the other components already keep.
+        self.collectors.append(func)
+        return func
+
+    def render(self) -> str:
+        families = [
+            (metric.name, metric.kind, metric.help, metric.samples())
+            for metric in self.metrics
+        ]
+        for collector in self.collectors:
+            families.extend(collector())
+        lines = []
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                lines.append(
+                    f"{sample_name}{format_labels(labels)} {format_value(value)}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "http_requests", "HTTP requests by route and status", ("method", "route", "status")
+)
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route")
+)
+db_queries_per_request = registry.histogram(
+    "db_queries_per_request", "SQL statements per request", ("route",), COUNT_BUCKETS
+)
+db_time_per_request = registry.histogram(
+    "db_time_per_request_seconds", "Time spent in SQL per request", ("route",)
+)
+db_query_duration = registry.histogram(
+    "db_query_duration_seconds", "SQL statement latency", ("engine",)
+)
+redis_command_duration = registry.histogram(
+    "redis_command_duration_seconds", "Redis command latency", ("db", "command")
+)
+rate_limiter_rejections = registry.counter(
+    "rate_limiter_rejections", "Requests rejected by the rate limiter", ("route",)
+)
+background_task_duration = registry.histogram(
+    "background_task_duration_seconds", "Background task duration", ("task", "status")
+)
+
+
+# Times every command sent through execute_command, which covers plain
+# commands and scripts but not pipelines and pub/sub.
+class InstrumentedRedis(redis.Redis):
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            redis_command_duration.observe(
+                time.perf_counter() - started,
+                (self.connection_pool.connection_kwargs.get("db", 0), args[0]),
+            )
+
+
+class RequestStats:
+    __slots__ = ("queries", "query_seconds", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        # statement text -> executions, the text is already parameterized so
+        # the same query with other values counts as a repeat
+        self.statements: dict[str, int] = {}
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.queries += 1
+        self.query_seconds += elapsed
+        self.statements[statement] = self.statements.get(statement, 0) + 1
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        return [
+            (statement, count)
+            for statement, count in self.statements.items()
+            if count >= threshold
+        ]
+
+
+request_stats: ContextVar[RequestStats | None] = ContextVar(
+    "request_stats", default=None
+)
+
+
+def route_label(scope: dict) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "other"
+
+
+def shorten(statement: str, limit: int = 500) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + "..."
+
+
+# Values never reach the log, only their types, since they carry emails,
+# phone numbers and password hashes.
+def redact_parameters(parameters, executemany: bool = False):
+    if executemany:
+        return f"<{len(parameters)} parameter sets>"
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+# Pure ASGI middleware, cheaper per request than BaseHTTPMiddleware.
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        status_code, finished = 500, None
+
+        async def send_wrapper(message):
+            nonlocal status_code, finished
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if settings.query_debug_header:
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (
+                            b"x-db-queries",
+                            "{}; time_ms={:.1f}".format(
+                                stats.queries, stats.query_seconds * 1000
+                            ).encode(),
+                        ),
+                    ]
+            elif not message.get("more_body", False):
+                finished = time.perf_counter()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Background tasks run after the body is sent, they are not a
+            # part of the request latency.
+            finished = finished or time.perf_counter()
+            request_stats.reset(token)
+            route = route_label(scope)
+            method = scope["method"]
+            http_requests.inc((method, route, status_code))
+            http_request_duration.observe(finished - started, (method, route))
+            db_queries_per_request.observe(stats.queries, (route,))
+            db_time_per_request.observe(stats.query_seconds, (route,))
+            for statement, count in stats.repeated(settings.query_repeat_threshold):
+                logger.warning(
+                    "Repeated query, possible N+1: %s %s ran %d times: %s",
+                    method,
+                    route,
+                    count,
+                    shorten(statement),
+                )
+
+
+def instrument_engine(engine: AsyncEngine, name: str) -> None:
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        db_query_duration.observe(elapsed, (name,))
+        stats = request_stats.get()
+        if stats is not None:
+            stats.record(statement, elapsed)
+        if elapsed * 1000 >= settings.slow_query_ms:
+            logger.warning(
+                "Slow query on %s, %.1f ms: %s parameters=%s",
+                name,
+                elapsed * 1000,
+                shorten(statement),
+                redact_parameters(parameters, executemany),
+            )
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):
+        if context.connection is not None:
+            started = context.connection.info.get("query_started")
+            if started:
+                started.pop()
+
+
+async def rate_limit_callback(request: Request, response: Response, pexpire: int):
+    rate_limiter_rejections.inc((route_label(request.scope),))
+    raise HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too Many Requests",
+        headers={"Retry-After": str(-(-pexpire // 1000))},
+    )
+
+
+def track_background_task(func: Callable) -> Callable:
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        task_status = "error"
+        try:
+            result = await func(*args, **kwargs)
+            task_status = "ok"
+            return result
+        finally:
+            background_task_duration.observe(
+                time.perf_counter() - started, (func.__name__, task_status)
+            )
+
+    return wrapper
@@ -0,0 +1,198 @@
+import asyncio
+from collections import OrderedDict
+import logging
+import time
+
+from fastapi import Request, Response
+from fastapi.security.utils import get_authorization_scheme_param
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.database.connect_db import redis_db0
+from src.services.auth import auth_service
+from src.services.metrics import rate_limit_callback
+
+
+logger = logging.getLogger(__name__)
+
+# Token costs of the expensive routes, the rest cost 1.
+ROUTE_COSTS = {
+    "/api/auth/signup": 5,
+    "/api/auth/login": 5,
+    "/api/auth/reset_password_confirmation/{token}": 5,
+    "/api/contacts/bulk": 10,
+    "/api/contacts/export": 10,
+    "/api/users/avatar": 5,
+}
+
+# Refills the global bucket of each key, takes the tokens the worker spent
+# since the last sync and returns the tokens left, in one round trip for all
+# the keys. The result can go below zero when workers overspend between syncs.
+SYNC_SCRIPT = """
+local now = tonumber(ARGV[1])
+local result = {}
+for index, key in ipairs(KEYS) do
+    local offset = 1 + (index - 1) * 3
+    local spent = tonumber(ARGV[offset + 1])
+    local capacity = tonumber(ARGV[offset + 2])
+    local rate = tonumber(ARGV[offset + 3])
+    local bucket = redis.call("HMGET", key, "tokens", "updated")
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(now - updated, 0) * rate) - spent
+    redis.call("HSET", key, "tokens", tostring(tokens), "updated", tostring(now))
+    redis.call("PEXPIRE", key, math.ceil(capacity / rate * 2000))
+    result[index] = tostring(tokens)
+end
+return result
+"""
+
+
+class TokenBucket:
+    __slots__ = ("capacity", "rate", "tokens", "updated", "spent")
+
+    def __init__(self, capacity: float, rate: float, now: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = now
+        # tokens taken since the last sync with Redis
+        self.spent = 0
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, cost: int, now: float) -> float:
+        # A route costing more than the capacity would never fit, it takes
+        # the whole bucket instead.
+        cost = min(cost, self.capacity)
+        self.refill(now)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            self.spent += cost
+            return 0
+        return (cost - self.tokens) / self.rate
+
+
+class LocalRateLimiter:
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        times: int,
+        seconds: int,
+        prefix: str = "rate_limiter",
+        sync_interval: float = 0.5,
+        max_buckets: int = 100000,
+    ):
+        self.redis = redis_client
+        self.capacity = times
+        self.rate = times / seconds
+        self.prefix = prefix
+        self.sync_interval = sync_interval
+        self.max_buckets = max_buckets
+        # Least recently used first, the sync sweep drops the full buckets and
+        # max_buckets bounds the rest between two syncs.
+        self.buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+        self.sync_script = self.redis.register_script(SYNC_SCRIPT)
+
+    async def __call__(self, request: Request, response: Response):
+        route = request.scope.get("route")
+        path = getattr(route, "path", request.url.path)
+        key = f"{self.prefix}:{identify(request)}:{path}"
+        now = time.time()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(self.capacity, self.rate, now)
+            while len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        retry_after = bucket.take(ROUTE_COSTS.get(path, 1), now)
+        if retry_after:
+            return await rate_limit_callback(
+                request, response, int(retry_after * 1000) + 1
+            )
+
+    async def sync(self) -> None:
+        now = time.time()
+        keys = [key for key, bucket in self.buckets.items() if bucket.spent]
+        if keys:
+            args = [now]
+            spent = []
+            for key in keys:
+                bucket = self.buckets[key]
+                spent.append(bucket.spent)
+                args += [bucket.spent, bucket.capacity, bucket.rate]
+                bucket.spent = 0
+            try:
+                tokens = await self.sync_script(keys=keys, args=args)
+            except RedisError as error:
+                # Keep limiting locally and send the spending next time.
+                for key, amount in zip(keys, spent):
+                    if key in self.buckets:
+                        self.buckets[key].spent += amount
+                logger.warning("Rate limiter sync failed: %s", error)
+                return
+            for key, value in zip(keys, tokens):
+                bucket = self.buckets.get(key)
+                if bucket is not None:
+                    # Requests served while the script ran are not in the
+                    # global count yet, take them off the returned tokens.
+                    bucket.refill(now)
+                    bucket.tokens = min(bucket.capacity, float(value) - bucket.spent)
+        # A full bucket says nothing the next request can't rebuild.
+        for key, bucket in list(self.buckets.items()):
+            if (
+                not bucket.spent
+                and now - bucket.updated >= bucket.capacity / bucket.rate
+            ):
+                del self.buckets[key]
+
+    async def run_sync(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            await self.sync()
+
+    async def close(self) -> None:
+        await self.sync()
+
+
+# The client address, X-Forwarded-For is only believed when the request comes
+# from a trusted proxy. The proxies append to the header, so the client is the
+# rightmost address that isn't one of them, the ones before it are whatever
+# the client sent.
+def client_address(request: Request) -> str:
+    host = request.client.host if request.client else "unknown"
+    trusted = settings.rate_limiter_trusted_proxies
+    if host not in trusted:
+        return host
+    forwarded = request.headers.get("X-Forwarded-For", "")
+    for address in reversed([address.strip() for address in forwarded.split(",")]):
+        if address and address not in trusted:
+            return address
+    return host
+
+
+# Keys by the user of a valid access token so users behind one address don't
+# share a limit, and by the client address otherwise.
+def identify(request: Request) -> str:
+    scheme, token = get_authorization_scheme_param(request.headers.get("Authorization"))
+    if scheme.lower() == "bearer" and token:
+        try:
+            return "user:" + auth_service.decode_token(
+                token, "access_token", ValueError()
+            )
+        except ValueError:
+            pass
+    return "ip:" + client_address(request)
+
+
+rate_limiter = LocalRateLimiter(
+    redis_db0,
+    settings.rate_limiter_times,
+    settings.rate_limiter_seconds,
+    sync_interval=settings.rate_limiter_sync_interval,
+    max_buckets=settings.rate_limiter_max_buckets,
+)
@@ -0,0 +1,185 @@
+import hashlib
+import time
+
+from fastapi import HTTPException, status
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.database.connect_db import redis_db0
+
+
+SESSION_PREFIX = "session:"
+USER_SESSIONS_PREFIX = "user_sessions:"
+
+# A session is a hash under session:<token digest> that expires with the
+# refresh token, user_sessions:<email> indexes the digests by expiry.
+STORE_SESSION_LUA = """
+local function store_session(index_key, digest, email, device_id, created_at, expires_at, now, max_sessions)
+    redis.call("ZREMRANGEBYSCORE", index_key, "-inf", now)
+    for _, member in ipairs(redis.call("ZRANGE", index_key, 0, -1)) do
+        if redis.call("HGET", "session:" .. member, "device_id") == device_id then
+            redis.call("DEL", "session:" .. member)
+            redis.call("ZREM", index_key, member)
+        end
+    end
+    local session_key = "session:" .. digest
+    redis.call(
+        "HSET", session_key, "email", email, "device_id", device_id,
+        "created_at", created_at, "expires_at", expires_at
+    )
+    redis.call("EXPIREAT", session_key, expires_at)
+    redis.call("ZADD", index_key, expires_at, digest)
+    local excess = redis.call("ZCARD", index_key) - max_sessions
+    if excess > 0 then
+        for _, member in ipairs(redis.call("ZRANGE", index_key, 0, excess - 1)) do
+            redis.call("DEL", "session:" .. member)
+        end
+        redis.call("ZREMRANGEBYRANK", index_key, 0, excess - 1)
+    end
+    local latest = redis.call("ZRANGE", index_key, -1, -1, "WITHSCORES")
+    redis.call("EXPIREAT", index_key, latest[2])
+end
+"""
+
+CREATE_SCRIPT = (
+    STORE_SESSION_LUA
+    + """
+store_session(KEYS[1], ARGV[1], ARGV[2], ARGV[3], ARGV[4], ARGV[5], ARGV[6], tonumber(ARGV[7]))
+return 1
+"""
+)
+
+# Consumes the old refresh token and stores the new one for the same device,
+# returns false when the old token has no session.
+ROTATE_SCRIPT = (
+    STORE_SESSION_LUA
+    + """
+local old_key = "session:" .. ARGV[1]
+local session = redis.call("HMGET", old_key, "email", "device_id")
+if session[1] ~= ARGV[3] then
+    return false
+end
+redis.call("DEL", old_key)
+redis.call("ZREM", KEYS[1], ARGV[1])
+store_session(KEYS[1], ARGV[2], ARGV[3], session[2], ARGV[4], ARGV[5], ARGV[6], tonumber(ARGV[7]))
+return session[2]
+"""
+)
+
+REVOKE_SCRIPT = """
+local email = redis.call("HGET", "session:" .. ARGV[1], "email")
+if not email then
+    return 0
+end
+redis.call("DEL", "session:" .. ARGV[1])
+redis.call("ZREM", "user_sessions:" .. email, ARGV[1])
+return 1
+"""
+
+REVOKE_ALL_SCRIPT = """
+local members = redis.call("ZRANGE", KEYS[1], 0, -1)
+for _, member in ipairs(members) do
+    redis.call("DEL", "session:" .. member)
+end
+redis.call("DEL", KEYS[1])
+return #members
+"""
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def unavailable() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Session store is unavailable",
+        headers={"Retry-After": "1"},
+    )
+
+
+class SessionStore:
+    def __init__(self):
+        self.create_script = redis_db0.register_script(CREATE_SCRIPT)
+        self.rotate_script = redis_db0.register_script(ROTATE_SCRIPT)
+        self.revoke_script = redis_db0.register_script(REVOKE_SCRIPT)
+        self.revoke_all_script = redis_db0.register_script(REVOKE_ALL_SCRIPT)
+
+    def index_key(self, email: str) -> str:
+        return USER_SESSIONS_PREFIX + email
+
+    async def create(
+        self, email: str, token: str, device_id: str, expires_at: int
+    ) -> None:
+        now = int(time.time())
+        try:
+            await self.create_script(
+                keys=[self.index_key(email)],
+                args=[
+                    token_digest(token),
+                    email,
+                    device_id,
+                    now,
+                    expires_at,
+                    now,
+                    settings.max_sessions_per_user,
+                ],
+            )
+        except RedisError:
+            raise unavailable()
+
+    async def rotate(
+        self, email: str, old_token: str, new_token: str, expires_at: int
+    ) -> str | None:
+        now = int(time.time())
+        try:
+            return await self.rotate_script(
+                keys=[self.index_key(email)],
+                args=[
+                    token_digest(old_token),
+                    token_digest(new_token),
+                    email,
+                    now,
+                    expires_at,
+                    now,
+                    settings.max_sessions_per_user,
+                ],
+            )
+        except RedisError:
+            raise unavailable()
+
+    async def revoke(self, token: str) -> bool:
+        try:
+            return bool(await self.revoke_script(args=[token_digest(token)]))
+        except RedisError:
+            raise unavailable()
+
+    async def revoke_all(self, email: str) -> int:
+        try:
+            return await self.revoke_all_script(keys=[self.index_key(email)])
+        except RedisError:
+            raise unavailable()
+
+    async def list(self, email: str) -> list[dict]:
+        try:
+            digests = await redis_db0.zrangebyscore(
+                self.index_key(email), int(time.time()), "+inf"
+            )
+            async with redis_db0.pipeline(transaction=False) as pipe:
+                for digest in digests:
+                    pipe.hgetall(SESSION_PREFIX + digest)
+                sessions = await pipe.execute()
+        except RedisError:
+            raise unavailable()
+        return [
+            {
+                "device_id": session["device_id"],
+                "created_at": int(session["created_at"]),
+                "expires_at": int(session["expires_at"]),
+            }
+            for session in sessions
+            if session
+        ]
+
+
+session_store = SessionStore()
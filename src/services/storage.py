@@ -0,0 +1,67 @@
+from abc import ABC, abstractmethod
+import asyncio
+import hashlib
+from pathlib import Path
+
+import cloudinary
+import cloudinary.uploader
+
+from src.conf.config import settings
+
+
+class AvatarStorage(ABC):
+    # Stores the image under name, replacing the previous one, and returns its
+    # public URL.
+    @abstractmethod
+    async def save(self, name: str, data: bytes, content_type: str) -> str:
+        ...
+
+
+class LocalAvatarStorage(AvatarStorage):
+    def __init__(self, directory: Path, base_url: str):
+        self.directory = directory
+        self.base_url = base_url.rstrip("/")
+
+    def write(self, path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_suffix(path.suffix + ".tmp")
+        temporary.write_bytes(data)
+        temporary.replace(path)
+
+    async def save(self, name: str, data: bytes, content_type: str) -> str:
+        filename = f"{name}.{content_type.split('/')[-1]}"
+        await asyncio.to_thread(self.write, self.directory / filename, data)
+        # The content hash changes the URL on every new avatar, so browsers
+        # and proxies never serve the old one.
+        version = hashlib.sha256(data).hexdigest()[:12]
+        return f"{self.base_url}/{filename}?v={version}"
+
+
+class CloudinaryAvatarStorage(AvatarStorage):
+    def __init__(self):
+        cloudinary.config(
+            cloud_name=settings.cloudinary_cloud_name,
+            api_key=settings.cloudinary_api_key,
+            api_secret=settings.cloudinary_api_secret,
+            secure=True,
+        )
+
+    async def save(self, name: str, data: bytes, content_type: str) -> str:
+        # The Cloudinary SDK is blocking, the upload runs in a thread.
+        result = await asyncio.to_thread(
+            cloudinary.uploader.upload, data, public_id=name, overwrite=True
+        )
+        return result["secure_url"]
+
+
+def create_avatar_storage() -> AvatarStorage:
+    if settings.avatar_storage == "local":
+        return LocalAvatarStorage(
+            Path(settings.avatar_local_dir),
+            settings.avatar_local_base_url
+            or f"http://{settings.api_host}:{settings.api_port}/static/avatars",
+        )
+    return CloudinaryAvatarStorage()
+
+
+avatar_storage = create_avatar_storage()
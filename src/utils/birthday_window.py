@@ -0,0 +1,22 @@
+from datetime import date, timedelta
+
+from src.utils.is_leap_year import is_leap_year
+
+
+LEAP_DAY_KEY = 229
+
+
+def birthday_key(day: date) -> int:
+    return day.month * 100 + day.day
+
+
+def birthday_window(n: int, today: date) -> dict[int, int]:
+    # Maps the birthday key (MMDD) to the number of days until that birthday.
+    # In a non-leap year the birthday on Feb 29 is celebrated on Mar 1.
+    window = {}
+    for delta_days in range(n):
+        day = today + timedelta(days=delta_days)
+        window[birthday_key(day)] = delta_days
+        if day.month == 3 and day.day == 1 and not is_leap_year(day.year):
+            window[LEAP_DAY_KEY] = delta_days
+    return window
@@ -0,0 +1,66 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from typing import Any, Callable
+
+
+class ExecutorOverloadedError(Exception):
+    pass
+
+
+# Thread pool for CPU-bound calls from async code, with a cap on the number of
+# calls waiting for a free worker.
+class BoundedExecutor:
+    def __init__(self, max_workers: int, max_queue: int, thread_name_prefix: str):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=thread_name_prefix
+        )
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    async def run(self, func: Callable, *args) -> Any:
+        if self.pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise ExecutorOverloadedError("Executor queue is full")
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor, self.call, time.perf_counter(), func, args
+            )
+        finally:
+            self.pending -= 1
+
+    def call(self, submitted: float, func: Callable, args: tuple) -> Any:
+        started = time.perf_counter()
+        with self.lock:
+            self.active += 1
+            self.wait_seconds += started - submitted
+        try:
+            return func(*args)
+        finally:
+            with self.lock:
+                self.active -= 1
+                self.completed += 1
+                self.run_seconds += time.perf_counter() - started
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "active": self.active,
+                "queued": max(self.pending - self.active, 0),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "wait_seconds": self.wait_seconds,
+                "run_seconds": self.run_seconds,
+            }
@@ -0,0 +1,46 @@
+import base64
+import json
+from datetime import date, datetime
+from uuid import UUID
+
+
+def encode_cursor(*values) -> str:
+    data = json.dumps(values, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(data)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def decode_contacts_cursor(cursor: str, sort: str) -> tuple:
+    values = decode_cursor(cursor)
+    try:
+        cursor_sort, sort_value, contact_id = values
+        if cursor_sort != sort:
+            raise ValueError("The cursor was issued for another sort")
+        if sort == "created_at":
+            sort_value = datetime.fromisoformat(sort_value)
+        elif not isinstance(sort_value, str):
+            raise ValueError("Invalid cursor")
+        return sort_value, UUID(contact_id)
+    except (TypeError, AttributeError):
+        raise ValueError("Invalid cursor")
+
+
+def decode_birthdays_cursor(cursor: str) -> tuple:
+    values = decode_cursor(cursor)
+    try:
+        today, key, contact_id = values
+        if not isinstance(key, int):
+            raise ValueError("Invalid cursor")
+        return date.fromisoformat(today), key, UUID(contact_id)
+    except (TypeError, AttributeError):
+        raise ValueError("Invalid cursor")
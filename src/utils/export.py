@@ -0,0 +1,31 @@
+import csv
+import io
+from typing import AsyncIterator, List
+
+import orjson
+from sqlalchemy import Row
+
+
+# Serialized with the same options as ORJSONResponse, so datetimes are ISO 8601
+# with Z like in the other responses.
+async def to_ndjson(
+    partitions: AsyncIterator[List[Row]],
+) -> AsyncIterator[bytes]:
+    option = orjson.OPT_UTC_Z | orjson.OPT_APPEND_NEWLINE
+    async for partition in partitions:
+        yield b"".join(orjson.dumps(row._asdict(), option=option) for row in partition)
+
+
+async def to_csv(
+    partitions: AsyncIterator[List[Row]], columns: List[str]
+) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for partition in partitions:
+        writer.writerows(partition)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
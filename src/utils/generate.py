@@ -0,0 +1,269 @@
+import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import csv
+from datetime import date, datetime, time, timedelta, timezone
+import io
+import os
+import random
+import time as clock
+from typing import Callable
+import uuid
+
+import asyncpg
+import faker
+from passlib.context import CryptContext
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+from src.conf.config import settings
+from src.database.models import PG_TRGM_INSTALLED, Contact, User, is_trgm_index
+
+
+# Generates users and contacts for capacity testing and loads them straight
+# into Postgres with COPY. Faker runs in worker processes, each on its own
+# chunk of users with a seed derived from --seed and the chunk index, so the
+# same arguments always produce the same data set:
+#
+#   python -m src.utils.generate --users 5000 --per-user pareto:1.2:20:20000
+#
+# Users are named gen<seed>-<index> with the password from --password, their
+# emails are confirmed.
+
+CONTACT_COLUMNS = [
+    "id",
+    "first_name",
+    "last_name",
+    "email",
+    "phone",
+    "birthday",
+    "address",
+    "created_at",
+    "updated_at",
+    "user_id",
+]
+USER_COLUMNS = [
+    "id",
+    "username",
+    "email",
+    "password",
+    "is_email_confirmed",
+    "is_password_valid",
+    "created_at",
+    "updated_at",
+]
+
+
+def parse_per_user(value: str) -> Callable[[random.Random], int]:
+    # fixed:N, uniform:MIN:MAX or pareto:ALPHA:MIN:MAX, the long tail of the
+    # pareto distribution gives a few users most of the contacts.
+    name, *params = value.split(":")
+    try:
+        if name == "fixed":
+            (count,) = map(int, params)
+            return lambda rng: count
+        if name == "uniform":
+            low, high = map(int, params)
+            return lambda rng: rng.randint(low, high)
+        if name == "pareto":
+            alpha, low, high = float(params[0]), int(params[1]), int(params[2])
+            return lambda rng: min(int(low * rng.paretovariate(alpha)), high)
+    except ValueError:
+        pass
+    raise argparse.ArgumentTypeError(f"Invalid contacts per user {value}")
+
+
+def random_birthday(
+    rng: random.Random, today: date, min_age: int, max_age: int, upcoming: float
+) -> date:
+    if rng.random() < upcoming:
+        # An extra share of contacts with birthdays in the longest
+        # birthdays_in_n_days window, on top of the uniform spread.
+        day = today + timedelta(days=rng.randrange(31))
+        age = rng.randint(min_age, max_age)
+        try:
+            return day.replace(year=day.year - age)
+        except ValueError:
+            return day.replace(year=day.year - age, day=28)
+    start = today.replace(month=1, day=1).replace(year=today.year - max_age)
+    return start + timedelta(days=rng.randrange((max_age - min_age) * 365))
+
+
+def generate_contacts(
+    chunk_seed: int,
+    users: list[tuple[uuid.UUID, int]],
+    today: date,
+    min_age: int,
+    max_age: int,
+    upcoming: float,
+) -> tuple[bytes, int]:
+    # Runs in a worker process and returns the chunk as COPY CSV data.
+    rng = random.Random(chunk_seed)
+    fake = faker.Faker("uk_UA")
+    fake.seed_instance(chunk_seed)
+    now = datetime.combine(today, time(), timezone.utc)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    rows = 0
+    for user_id, count in users:
+        # email and phone are unique per user, the email carries the index.
+        fake.unique.clear()
+        for index in range(count):
+            created_at = now - timedelta(seconds=rng.randrange(365 * 86400))
+            local, domain = fake.email().split("@")
+            writer.writerow(
+                [
+                    uuid.UUID(int=rng.getrandbits(128), version=4),
+                    fake.first_name(),
+                    fake.last_name(),
+                    f"{local}.{index}@{domain}",
+                    fake.unique.phone_number(),
+                    random_birthday(rng, today, min_age, max_age, upcoming),
+                    fake.address().replace("\n", ", ")[:254],
+                    created_at.isoformat(),
+                    created_at.isoformat(),
+                    user_id,
+                ]
+            )
+            rows += 1
+    return buffer.getvalue().encode(), rows
+
+
+def generate_users(
+    rng: random.Random, args: argparse.Namespace, per_user: Callable, hashed: str
+) -> tuple[bytes, list[tuple[uuid.UUID, int]]]:
+    now = datetime.combine(args.today, time(), timezone.utc).isoformat()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    users = []
+    for index in range(args.users):
+        user_id = uuid.UUID(int=rng.getrandbits(128), version=4)
+        username = f"gen{args.seed}-{index}"
+        writer.writerow(
+            [user_id, username, f"{username}@example.com", hashed, True, True, now, now]
+        )
+        users.append((user_id, per_user(rng)))
+    return buffer.getvalue().encode(), users
+
+
+def split_chunks(
+    users: list[tuple[uuid.UUID, int]], chunk_size: int
+) -> list[list[tuple[uuid.UUID, int]]]:
+    # A user's contacts stay in one chunk, so that uniqueness holds per user.
+    chunks, chunk, size = [], [], 0
+    for user in users:
+        chunk.append(user)
+        size += user[1]
+        if size >= chunk_size:
+            chunks.append(chunk)
+            chunk, size = [], 0
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+async def copy(pool: asyncpg.Pool, table: str, columns: list, data: bytes) -> None:
+    async with pool.acquire() as connection:
+        await connection.copy_to_table(
+            table, source=io.BytesIO(data), columns=columns, format="csv"
+        )
+
+
+async def load(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    # One hash for all the users, bcrypt would dominate the run otherwise.
+    hashed = CryptContext(
+        schemes=["bcrypt"], bcrypt__rounds=settings.bcrypt_rounds
+    ).hash(args.password)
+    users_data, users = generate_users(rng, args, args.per_user, hashed)
+    chunks = split_chunks(users, args.chunk_size)
+    total = sum(count for _, count in users)
+    print(f"{len(users)} users, {total} contacts in {len(chunks)} chunks")
+
+    dsn = settings.sqlalchemy_database_url_async.replace("+asyncpg", "")
+    pool = await asyncpg.create_pool(dsn, min_size=1, max_size=args.connections)
+    indexes = sorted(Contact.__table__.indexes, key=lambda index: index.name)
+    started = clock.perf_counter()
+    try:
+        await copy(pool, User.__tablename__, USER_COLUMNS, users_data)
+        if args.defer_indexes:
+            # Building the trigram indexes once after the load is much faster
+            # than updating them on every row.
+            async with pool.acquire() as connection:
+                for index in indexes:
+                    await connection.execute(f"DROP INDEX IF EXISTS {index.name}")
+
+        loop = asyncio.get_running_loop()
+        loaded = 0
+        semaphore = asyncio.Semaphore(args.workers * 2)
+
+        async def generate_and_copy(chunk_index: int, chunk: list) -> None:
+            nonlocal loaded
+            async with semaphore:
+                data, rows = await loop.run_in_executor(
+                    executor,
+                    generate_contacts,
+                    args.seed * 1_000_003 + chunk_index,
+                    chunk,
+                    args.today,
+                    args.min_age,
+                    args.max_age,
+                    args.upcoming,
+                )
+                await copy(pool, Contact.__tablename__, CONTACT_COLUMNS, data)
+            loaded += rows
+            elapsed = clock.perf_counter() - started
+            print(f"{loaded}/{total} contacts, {loaded / elapsed:.0f} rows/s")
+
+        with ProcessPoolExecutor(args.workers) as executor:
+            await asyncio.gather(
+                *(
+                    generate_and_copy(chunk_index, chunk)
+                    for chunk_index, chunk in enumerate(chunks)
+                )
+            )
+    finally:
+        if args.defer_indexes:
+            async with pool.acquire() as connection:
+                has_pg_trgm = await connection.fetchval(str(PG_TRGM_INSTALLED))
+                for index in indexes:
+                    if is_trgm_index(index) and not has_pg_trgm:
+                        print(f"Skipping {index.name}, pg_trgm is not installed")
+                        continue
+                    print(f"Creating {index.name}")
+                    await connection.execute(
+                        str(
+                            CreateIndex(index, if_not_exists=True).compile(
+                                dialect=postgresql.dialect()
+                            )
+                        )
+                    )
+        async with pool.acquire() as connection:
+            await connection.execute(f"ANALYZE {User.__tablename__}")
+            await connection.execute(f"ANALYZE {Contact.__tablename__}")
+        await pool.close()
+    print(f"Done in {clock.perf_counter() - started:.1f} s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument(
+        "--per-user", type=parse_per_user, default=parse_per_user("uniform:0:1000")
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--today", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--min-age", type=int, default=1)
+    parser.add_argument("--max-age", type=int, default=90)
+    parser.add_argument("--upcoming", type=float, default=0.0)
+    parser.add_argument("--password", default="generated-password")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--chunk-size", type=int, default=20000)
+    parser.add_argument("--defer-indexes", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(load(args))
+
+
+if __name__ == "__main__":
+    main()
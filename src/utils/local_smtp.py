@@ -0,0 +1,103 @@
+import argparse
+import asyncio
+from email import message_from_bytes, policy
+
+
+# A minimal SMTP server for local runs and tests, set MAIL_SERVER=localhost,
+# MAIL_PORT=1025, MAIL_SSL_TLS=false and MAIL_STARTTLS=false to use it.
+# It accepts any credentials and keeps the received messages in memory.
+
+
+class LocalSMTPServer:
+    def __init__(self, host: str = "localhost", port: int = 1025, echo: bool = False):
+        self.host = host
+        self.port = port
+        self.echo = echo
+        self.messages = []
+        self.connections = 0
+        self.server: asyncio.AbstractServer | None = None
+
+    async def start(self) -> None:
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.connections += 1
+
+        async def reply(line: str) -> None:
+            writer.write(line.encode() + b"\r\n")
+            await writer.drain()
+
+        await reply("220 localhost ESMTP")
+        sender, recipients = None, []
+        try:
+            while line := await reader.readline():
+                command = line.decode().strip()
+                verb = command[:4].upper()
+                if verb == "EHLO":
+                    await reply("250-localhost")
+                    await reply("250-AUTH PLAIN LOGIN")
+                    await reply("250 8BITMIME")
+                elif verb == "HELO":
+                    await reply("250 localhost")
+                elif verb == "AUTH":
+                    if command.upper().startswith("AUTH LOGIN"):
+                        for prompt in ("VXNlcm5hbWU6", "UGFzc3dvcmQ6"):
+                            await reply(f"334 {prompt}")
+                            await reader.readline()
+                    await reply("235 Authentication successful")
+                elif verb == "MAIL":
+                    sender, recipients = command[10:], []
+                    await reply("250 OK")
+                elif verb == "RCPT":
+                    recipients.append(command[8:])
+                    await reply("250 OK")
+                elif verb == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    lines = []
+                    while (data := await reader.readline()) not in (b".\r\n", b""):
+                        lines.append(data[1:] if data.startswith(b"..") else data)
+                    self.received(sender, recipients, b"".join(lines))
+                    await reply("250 OK")
+                elif verb == "RSET":
+                    sender, recipients = None, []
+                    await reply("250 OK")
+                elif verb == "NOOP":
+                    await reply("250 OK")
+                elif verb == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def received(self, sender: str, recipients: list, data: bytes) -> None:
+        message = message_from_bytes(data, policy=policy.default)
+        self.messages.append(message)
+        if self.echo:
+            print(f"From {sender} to {', '.join(recipients)}: {message['Subject']}")
+            print(message.get_content())
+
+
+async def serve(host: str, port: int) -> None:
+    server = LocalSMTPServer(host, port, echo=True)
+    await server.start()
+    print(f"Listening on {host}:{server.port}")
+    await server.server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=1025)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port))
@@ -0,0 +1,12 @@
+from typing import Any
+
+from fastapi.responses import JSONResponse
+import orjson
+
+
+# Renders the repository rows as they are, returning it from a route skips
+# the response_model validation. UTC datetimes end in Z, the same output as
+# pydantic's.
+class ORJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
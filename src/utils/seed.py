@@ -20,6 +20,8 @@ ACCESS_TOKEN = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJzdWIiOiJtdGhrdnZAZ21haWw
 
 NUMBER_OF_CONTACTS = 1000
 
+BATCH_SIZE = 1000
+
 fake_data = faker.Faker("uk_UA")
 
 
@@ -35,21 +37,33 @@ async def get_fake_contacts():
         }
 
 
+async def post_batch(session: aiohttp.ClientSession, headers: dict, batch: list):
+    try:
+        response = await session.post(
+            f"http://{settings.api_host}:{settings.api_port}/api/contacts/bulk",
+            headers=headers,
+            data=json.dumps(batch),
+        )
+        result = await response.json()
+        print(f"Created: {result.get('created')}, conflicts: {result.get('conflicts')}")
+    except aiohttp.ClientOSError as error_message:
+        print(f"Connection error: {str(error_message)}")
+
+
 async def send_data_to_api() -> None:
     headers = {
         "content-type": "application/json",
         "Authorization": f"Bearer {ACCESS_TOKEN}",
     }
     session = aiohttp.ClientSession()
+    batch = []
     async for data in get_fake_contacts():
-        try:
-            await session.post(
-                f"http://{settings.api_host}:{settings.api_port}/api/contacts",
-                headers=headers,
-                data=json.dumps(data),
-            )
-        except aiohttp.ClientOSError as error_message:
-            print(f"Connection error: {str(error_message)}")
+        batch.append(data)
+        if len(batch) == BATCH_SIZE:
+            await post_batch(session, headers, batch)
+            batch = []
+    if batch:
+        await post_batch(session, headers, batch)
     await session.close()
     print("Done")
 
@@ -0,0 +1,78 @@
+import io
+import struct
+import zlib
+
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+import pytest
+
+from src.conf.config import settings
+from src.services.avatars import (
+    AVATAR_SIZE,
+    InvalidImageError,
+    process_avatar,
+    read_upload,
+)
+from src.services.storage import LocalAvatarStorage
+
+
+def encode(image: Image.Image, format: str) -> bytes:
+    output = io.BytesIO()
+    image.save(output, format)
+    return output.getvalue()
+
+
+def test_avatar_is_a_cropped_jpeg():
+    data = encode(Image.new("RGB", (800, 400), (200, 10, 10)), "PNG")
+    avatar = Image.open(io.BytesIO(process_avatar(data)))
+    assert (avatar.format, avatar.size, avatar.mode) == ("JPEG", AVATAR_SIZE, "RGB")
+
+
+def test_transparency_is_flattened_on_white():
+    data = encode(Image.new("RGBA", (300, 300), (0, 0, 0, 0)), "PNG")
+    avatar = Image.open(io.BytesIO(process_avatar(data)))
+    assert all(channel > 245 for channel in avatar.getpixel((125, 125)))
+
+
+def test_unsupported_and_broken_images_are_rejected():
+    with pytest.raises(InvalidImageError):
+        process_avatar(b"not an image")
+    with pytest.raises(InvalidImageError, match="BMP"):
+        process_avatar(encode(Image.new("RGB", (10, 10)), "BMP"))
+    with pytest.raises(InvalidImageError, match="Broken image"):
+        process_avatar(encode(Image.new("RGB", (300, 300)), "PNG")[:200])
+
+
+def test_the_pixel_limit_is_checked_before_decoding(monkeypatch):
+    monkeypatch.setattr(settings, "avatar_max_pixels", 100 * 100)
+    with pytest.raises(InvalidImageError, match="too many pixels"):
+        process_avatar(encode(Image.new("RGB", (101, 100)), "PNG"))
+
+
+def test_a_forged_decompression_bomb_header_is_rejected():
+    # A tiny PNG whose header claims 20000x20000 pixels.
+    data = bytearray(encode(Image.new("RGB", (1, 1)), "PNG"))
+    header = struct.pack(">II", 20000, 20000) + bytes(data[24:29])
+    data[16:29] = header
+    data[29:33] = struct.pack(">I", zlib.crc32(b"IHDR" + header))
+    with pytest.raises(InvalidImageError, match="too many pixels"):
+        process_avatar(bytes(data))
+
+
+async def test_upload_larger_than_the_limit_is_rejected():
+    file = UploadFile(io.BytesIO(b"x" * 100))
+    with pytest.raises(HTTPException) as error:
+        await read_upload(file, 99)
+    assert error.value.status_code == 413
+    await file.seek(0)
+    assert await read_upload(file, 100) == b"x" * 100
+
+
+async def test_local_storage_versions_the_url(tmp_path):
+    storage = LocalAvatarStorage(tmp_path / "avatars", "http://localhost/static/")
+    first = await storage.save("user", b"first", "image/jpeg")
+    second = await storage.save("user", b"second", "image/jpeg")
+    assert first.startswith("http://localhost/static/user.jpeg?v=")
+    assert first != second
+    assert (tmp_path / "avatars" / "user.jpeg").read_bytes() == b"second"
+    assert [path.name for path in (tmp_path / "avatars").iterdir()] == ["user.jpeg"]
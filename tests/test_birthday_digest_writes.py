@@ -0,0 +1,56 @@
+from datetime import date, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from uuid import uuid4
+
+from src.repository import contacts as repository_contacts
+
+
+PARAMS = {"n": 7, "offset": 0, "limit": 10}
+
+
+async def test_the_version_is_bumped_around_the_digest_patch(monkeypatch):
+    calls = AsyncMock()
+    monkeypatch.setattr(
+        repository_contacts.contacts_cache, "invalidate", calls.invalidate
+    )
+    monkeypatch.setattr(repository_contacts.birthday_digests, "patch", calls.patch)
+    monkeypatch.setattr(repository_contacts, "mark_user_write", calls.mark_user_write)
+    user_id, changes = uuid4(), [(uuid4(), 101)]
+    await repository_contacts.contacts_changed(user_id, changes)
+    assert [call[0] for call in calls.mock_calls] == [
+        "invalidate",
+        "patch",
+        "mark_user_write",
+        "invalidate",
+    ]
+
+
+async def test_a_page_read_before_the_patch_is_not_served(contacts_cache, monkeypatch):
+    monkeypatch.setattr(repository_contacts, "mark_user_write", AsyncMock())
+    user_id = uuid4()
+
+    async def patch_while_a_reader_caches_the_old_digest(user_id, changes):
+        version, _ = await contacts_cache.get(user_id, "birthdays", PARAMS)
+        await contacts_cache.set(user_id, version, "birthdays", PARAMS, [], 600)
+
+    monkeypatch.setattr(
+        repository_contacts.birthday_digests,
+        "patch",
+        patch_while_a_reader_caches_the_old_digest,
+    )
+    await repository_contacts.contacts_changed(user_id, [(uuid4(), 101)])
+    _, page = await contacts_cache.get(user_id, "birthdays", PARAMS)
+    assert page is None
+
+
+async def test_a_cursor_from_an_earlier_day_skips_the_digest(monkeypatch):
+    slice = AsyncMock()
+    monkeypatch.setattr(repository_contacts.birthday_digests, "slice", slice)
+    user = SimpleNamespace(id=uuid4())
+    yesterday = date.today() - timedelta(days=1)
+    contacts = await repository_contacts.read_contacts_from_birthday_digest(
+        7, 0, 10, user, None, yesterday
+    )
+    assert contacts is None
+    slice.assert_not_awaited()
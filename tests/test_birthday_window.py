@@ -0,0 +1,34 @@
+from datetime import date
+
+from src.utils.birthday_window import LEAP_DAY_KEY, birthday_key, birthday_window
+
+
+def test_birthday_key():
+    assert birthday_key(date(1990, 1, 5)) == 105
+    assert birthday_key(date(1992, 2, 29)) == LEAP_DAY_KEY
+    assert birthday_key(date(1990, 12, 31)) == 1231
+
+
+def test_window_counts_days_from_today():
+    window = birthday_window(3, date(2026, 10, 18))
+    assert window == {1018: 0, 1019: 1, 1020: 2}
+
+
+def test_window_wraps_around_the_new_year():
+    window = birthday_window(3, date(2026, 12, 31))
+    assert window == {1231: 0, 101: 1, 102: 2}
+
+
+def test_leap_day_is_celebrated_on_march_1_in_a_non_leap_year():
+    window = birthday_window(3, date(2027, 2, 27))
+    assert window == {227: 0, 228: 1, 301: 2, LEAP_DAY_KEY: 2}
+
+
+def test_leap_day_is_its_own_day_in_a_leap_year():
+    window = birthday_window(3, date(2028, 2, 28))
+    assert window == {228: 0, LEAP_DAY_KEY: 1, 301: 2}
+
+
+def test_leap_day_is_outside_a_window_that_ends_on_february_28():
+    window = birthday_window(2, date(2027, 2, 27))
+    assert LEAP_DAY_KEY not in window
@@ -0,0 +1,47 @@
+import asyncio
+import threading
+
+from fastapi import HTTPException
+import pytest
+
+from src.services.auth import Auth
+from src.utils.bounded_executor import BoundedExecutor, ExecutorOverloadedError
+
+
+async def test_runs_the_call_in_a_worker_thread():
+    executor = BoundedExecutor(2, 2, "test")
+    name = await executor.run(lambda: threading.current_thread().name)
+    assert name.startswith("test")
+    stats = executor.stats()
+    assert (stats["completed"], stats["active"], stats["queued"]) == (1, 0, 0)
+    executor.executor.shutdown()
+
+
+async def test_rejects_calls_beyond_the_queue():
+    executor = BoundedExecutor(1, 1, "test")
+    release = threading.Event()
+    running = [asyncio.create_task(executor.run(release.wait)) for _ in range(2)]
+    await asyncio.sleep(0)
+    with pytest.raises(ExecutorOverloadedError):
+        await executor.run(release.wait)
+    assert executor.stats()["rejected"] == 1
+    release.set()
+    assert await asyncio.gather(*running) == [True, True]
+    assert executor.pending == 0
+    executor.executor.shutdown()
+
+
+async def test_overload_is_a_503_with_retry_after(monkeypatch):
+    auth = Auth()
+    executor = BoundedExecutor(1, 0, "test")
+    monkeypatch.setattr(auth, "hashing_executor", executor)
+    release = threading.Event()
+    running = asyncio.create_task(auth.run_hashing(release.wait))
+    await asyncio.sleep(0)
+    with pytest.raises(HTTPException) as error:
+        await auth.get_password_hash("secret")
+    assert error.value.status_code == 503
+    assert error.value.headers == {"Retry-After": "1"}
+    release.set()
+    await running
+    executor.executor.shutdown()
@@ -0,0 +1,74 @@
+from datetime import date
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from uuid import uuid4
+
+from sqlalchemy.sql import Insert
+
+from src.conf.config import settings
+from src.repository import contacts as repository_contacts
+from src.schemas.contacts import ContactModel
+
+
+def existing_contacts(taken: set[str] = frozenset()):
+    # Creates every inserted row except the emails in taken, which behave like
+    # existing contacts.
+    def respond(compiled):
+        if isinstance(compiled.statement, Insert):
+            emails = [
+                value
+                for key, value in compiled.params.items()
+                if key.startswith("email")
+            ]
+            rows = [(uuid4(), email, 101) for email in emails if email not in taken]
+        else:
+            rows = [(email, None) for email in taken]
+        return SimpleNamespace(all=lambda: rows)
+
+    return respond
+
+
+def contact(index: int) -> ContactModel:
+    return ContactModel(
+        first_name="Тарас",
+        last_name="Шевченко",
+        email=f"contact{index}@example.com",
+        phone=f"+380{index:09d}",
+        birthday=date(1990, 1, 1),
+        address="Київ",
+    )
+
+
+async def create(body, session, monkeypatch):
+    monkeypatch.setattr(repository_contacts.contacts_cache, "invalidate", AsyncMock())
+    monkeypatch.setattr(repository_contacts.birthday_digests, "patch", AsyncMock())
+    monkeypatch.setattr(repository_contacts, "mark_user_write", AsyncMock())
+    user = SimpleNamespace(id=uuid4())
+    return await repository_contacts.create_contacts(body, user, session)
+
+
+async def test_batches_stay_under_the_bind_parameter_limit(
+    recording_session, monkeypatch
+):
+    monkeypatch.setattr(settings, "contacts_bulk_batch_size", 10000)
+    session = recording_session(existing_contacts())
+    results = await create(
+        [contact(index) for index in range(6000)], session, monkeypatch
+    )
+    assert all(result["status"] == "created" for result in results)
+    parameters = [len(statement.params) for statement in session.statements]
+    assert len(parameters) == 2
+    assert max(parameters) <= repository_contacts.MAX_BIND_PARAMETERS
+
+
+async def test_reports_duplicates_and_existing_contacts(recording_session, monkeypatch):
+    body = [contact(0), contact(1), contact(0)]
+    session = recording_session(existing_contacts({"contact1@example.com"}))
+    results = await create(body, session, monkeypatch)
+    assert results[0]["status"] == "created"
+    assert results[1] == {"index": 1, "status": "conflict", "conflicts": ["uix_email"]}
+    assert results[2] == {
+        "index": 2,
+        "status": "conflict",
+        "conflicts": ["uix_email", "uix_phone"],
+    }
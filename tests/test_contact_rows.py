@@ -0,0 +1,60 @@
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from uuid import uuid4
+
+from src.repository import contacts as repository_contacts
+from src.routes import contacts as routes_contacts
+from src.utils.cursor import decode_birthdays_cursor
+from src.utils.responses import ORJSONResponse
+
+
+def database_row() -> dict:
+    now = datetime(2023, 11, 20, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    return {
+        "first_name": "Леся",
+        "last_name": "Українка",
+        "email": "lesia@example.com",
+        "phone": "+380000000001",
+        "birthday": date(1871, 2, 25),
+        "address": "Київ",
+        "id": uuid4(),
+        "created_at": now,
+        "updated_at": now,
+        "user_id": uuid4(),
+    }
+
+
+async def test_cached_rows_match_the_database_rows(contacts_cache):
+    user_id, rows = uuid4(), [database_row(), {**database_row(), "birthday": None}]
+    version, _ = await repository_contacts.get_cached(user_id, "list", {})
+    await contacts_cache.set(user_id, version, "list", {}, rows, 60)
+    _, cached = await repository_contacts.get_cached(user_id, "list", {})
+    assert cached == rows
+    assert ORJSONResponse(cached).body == ORJSONResponse(rows).body
+
+
+async def test_a_cached_contact_matches_the_database_row(contacts_cache):
+    user_id, row = uuid4(), {"id": uuid4(), "email": "lesia@example.com"}
+    await contacts_cache.set(user_id, "0", "contact", {"id": 1}, row, 60)
+    assert await repository_contacts.get_cached(user_id, "contact", {"id": 1}) == (
+        "0",
+        row,
+    )
+
+
+async def test_birthdays_cursor_from_a_cached_page(contacts_cache, monkeypatch):
+    user = SimpleNamespace(id=uuid4())
+    row = database_row()
+    await contacts_cache.set(user.id, "0", "birthdays", {}, [row], 60)
+    _, page = await repository_contacts.get_cached(user.id, "birthdays", {})
+    monkeypatch.setattr(
+        repository_contacts,
+        "read_contacts_with_birthdays_in_n_days",
+        AsyncMock(return_value=page),
+    )
+    response = await routes_contacts.read_contacts_with_birthdays_in_n_days(
+        n=7, offset=0, limit=1, cursor=None, fields=None, user=user, session=None
+    )
+    _, key, contact_id = decode_birthdays_cursor(response.headers["X-Next-Cursor"])
+    assert (key, contact_id) == (225, row["id"])
@@ -0,0 +1,57 @@
+from unittest.mock import AsyncMock
+from uuid import uuid4
+
+from redis.exceptions import ConnectionError
+
+
+PARAMS = {"offset": 0, "limit": 10}
+PAGE = [{"id": "1", "first_name": "Тарас"}]
+
+
+async def test_a_write_makes_the_pages_unreachable(contacts_cache):
+    user_id = uuid4()
+    version, page = await contacts_cache.get(user_id, "list", PARAMS)
+    assert (version, page) == ("0", None)
+    await contacts_cache.set(user_id, version, "list", PARAMS, PAGE, 60)
+    assert await contacts_cache.get(user_id, "list", PARAMS) == ("0", PAGE)
+
+    await contacts_cache.invalidate(user_id)
+    assert await contacts_cache.get(user_id, "list", PARAMS) == ("1", None)
+    assert contacts_cache.stats["invalidations"] == 1
+
+
+async def test_a_page_read_before_a_write_is_stored_under_the_old_version(
+    contacts_cache,
+):
+    user_id = uuid4()
+    version, _ = await contacts_cache.get(user_id, "list", PARAMS)
+    # The write commits and bumps the version while the query runs.
+    await contacts_cache.invalidate(user_id)
+    await contacts_cache.set(user_id, version, "list", PARAMS, PAGE, 60)
+    assert await contacts_cache.get(user_id, "list", PARAMS) == ("1", None)
+
+
+async def test_a_failed_bump_is_retried(contacts_cache, redis, monkeypatch):
+    incr = AsyncMock(side_effect=[ConnectionError(), 1])
+    monkeypatch.setattr(redis, "incr", incr)
+    user_id = uuid4()
+    await contacts_cache.invalidate(user_id)
+    assert incr.await_count == 2
+    assert not contacts_cache.bypassed(user_id)
+    assert contacts_cache.stats["invalidations"] == 1
+
+
+async def test_the_user_is_bypassed_when_the_bump_keeps_failing(
+    contacts_cache, redis, monkeypatch
+):
+    user_id = uuid4()
+    await contacts_cache.set(user_id, "0", "list", PARAMS, PAGE, 60)
+    monkeypatch.setattr(redis, "incr", AsyncMock(side_effect=ConnectionError()))
+    await contacts_cache.invalidate(user_id)
+    assert await contacts_cache.get(user_id, "list", PARAMS) == (None, None)
+    assert contacts_cache.stats["bypassed"] == 1
+
+    # Once the pages stored under the old version have expired.
+    contacts_cache.bypass[user_id] = 0.0
+    assert await contacts_cache.get(user_id, "list", PARAMS) == ("0", PAGE)
+    assert user_id not in contacts_cache.bypass
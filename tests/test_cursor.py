@@ -0,0 +1,66 @@
+from datetime import date, datetime, timezone
+from uuid import uuid4
+
+import pytest
+
+from src.utils.cursor import (
+    decode_birthdays_cursor,
+    decode_contacts_cursor,
+    decode_cursor,
+    encode_cursor,
+)
+
+
+def test_cursor_is_url_safe_without_padding():
+    cursor = encode_cursor("last_name", "Шевченко", uuid4())
+    assert "=" not in cursor
+    assert "+" not in cursor and "/" not in cursor
+
+
+def test_contacts_cursor_round_trip():
+    contact_id = uuid4()
+    cursor = encode_cursor("last_name", "Шевченко", contact_id)
+    assert decode_contacts_cursor(cursor, "last_name") == ("Шевченко", contact_id)
+
+
+def test_contacts_cursor_parses_created_at():
+    contact_id = uuid4()
+    created_at = datetime(2026, 10, 18, 12, 30, 1, 500, tzinfo=timezone.utc)
+    cursor = encode_cursor("created_at", created_at, contact_id)
+    assert decode_contacts_cursor(cursor, "created_at") == (created_at, contact_id)
+
+
+def test_contacts_cursor_rejects_another_sort():
+    cursor = encode_cursor("last_name", "Шевченко", uuid4())
+    with pytest.raises(ValueError, match="another sort"):
+        decode_contacts_cursor(cursor, "first_name")
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not base64!",
+        encode_cursor("last_name", "Шевченко"),
+        encode_cursor("last_name", 1, str(uuid4())),
+        encode_cursor("last_name", "Шевченко", "not a uuid"),
+    ],
+)
+def test_contacts_cursor_rejects_malformed_cursors(cursor):
+    with pytest.raises(ValueError):
+        decode_contacts_cursor(cursor, "last_name")
+
+
+def test_decode_cursor_requires_a_list():
+    with pytest.raises(ValueError):
+        decode_cursor("eyJhIjoxfQ")  # {"a":1}
+
+
+def test_birthdays_cursor_round_trip():
+    contact_id = uuid4()
+    cursor = encode_cursor(date(2026, 10, 18), 1020, contact_id)
+    assert decode_birthdays_cursor(cursor) == (date(2026, 10, 18), 1020, contact_id)
+
+
+def test_birthdays_cursor_rejects_a_non_integer_key():
+    with pytest.raises(ValueError):
+        decode_birthdays_cursor(encode_cursor(date(2026, 10, 18), "1020", uuid4()))
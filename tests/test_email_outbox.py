@@ -0,0 +1,136 @@
+import json
+import socket
+import time
+
+import pytest
+from redis.exceptions import ConnectionError
+
+from src.conf.config import settings
+from src.services import email
+from src.utils.local_smtp import LocalSMTPServer
+
+
+@pytest.fixture
+async def smtp_server(monkeypatch):
+    server = LocalSMTPServer(port=0)
+    await server.start()
+    monkeypatch.setattr(settings, "mail_server", "localhost")
+    monkeypatch.setattr(settings, "mail_port", server.port)
+    monkeypatch.setattr(settings, "mail_ssl_tls", False)
+    monkeypatch.setattr(settings, "mail_starttls", False)
+    monkeypatch.setattr(settings, "mail_use_credentials", False)
+    monkeypatch.setattr(settings, "mail_timeout", 5)
+    yield server
+    await server.stop()
+
+
+@pytest.fixture
+async def outbox(redis, smtp_server, monkeypatch):
+    monkeypatch.setattr(email, "redis_db0", redis)
+    outbox = email.EmailOutbox()
+    yield outbox
+    await outbox.close()
+
+
+async def enqueue(outbox: email.EmailOutbox, recipient: str) -> None:
+    await outbox.enqueue(
+        "verification_email.html",
+        "Confirm your email",
+        recipient,
+        {"host": "http://localhost/", "username": "taras", "token": "token"},
+    )
+
+
+async def run_once(outbox: email.EmailOutbox) -> None:
+    await outbox.prepare()
+    await outbox.process_batch(await outbox.pop_batch())
+
+
+def closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+async def test_queued_messages_are_delivered(outbox, smtp_server, redis):
+    await enqueue(outbox, "one@example.com")
+    await enqueue(outbox, "two@example.com")
+    await run_once(outbox)
+    assert [message["To"] for message in smtp_server.messages] == [
+        "one@example.com",
+        "two@example.com",
+    ]
+    assert smtp_server.connections <= settings.mail_pool_size
+    assert await redis.llen(email.OUTBOX_KEY) == 0
+    assert await redis.llen(outbox.processing_key) == 0
+
+
+async def test_failed_delivery_is_retried_with_backoff(outbox, redis, monkeypatch):
+    monkeypatch.setattr(settings, "mail_port", closed_port())
+    monkeypatch.setattr(settings, "mail_retry_base_seconds", 10)
+    await enqueue(outbox, "one@example.com")
+    await run_once(outbox)
+    [(raw, due)] = await redis.zrange(email.RETRY_KEY, 0, -1, withscores=True)
+    assert json.loads(raw)["attempts"] == 1
+    assert 8 <= due - time.time() <= 12
+    assert await redis.llen(outbox.processing_key) == 0
+
+
+async def test_last_attempt_goes_to_the_dead_letters(outbox, redis, monkeypatch):
+    monkeypatch.setattr(settings, "mail_port", closed_port())
+    monkeypatch.setattr(settings, "mail_max_attempts", 1)
+    await enqueue(outbox, "one@example.com")
+    await run_once(outbox)
+    [raw] = await redis.lrange(email.DEAD_KEY, 0, -1)
+    assert json.loads(raw)["recipient"] == "one@example.com"
+    assert await redis.zcard(email.RETRY_KEY) == 0
+
+
+async def test_a_failed_ack_does_not_stop_the_batch(outbox, smtp_server, monkeypatch):
+    await enqueue(outbox, "one@example.com")
+    await enqueue(outbox, "two@example.com")
+    ack = outbox.ack
+
+    async def failing_ack(raw, job, delivered):
+        if job["recipient"] == "one@example.com":
+            raise ConnectionError()
+        await ack(raw, job, delivered)
+
+    monkeypatch.setattr(outbox, "ack", failing_ack)
+    await run_once(outbox)
+    assert len(smtp_server.messages) == 2
+    assert outbox.unacked
+    # The unacknowledged job is sent again rather than lost.
+    await run_once(outbox)
+    assert smtp_server.messages[-1]["To"] == "one@example.com"
+
+
+async def test_an_unknown_template_goes_to_the_dead_letters(outbox, redis):
+    await outbox.enqueue("missing.html", "Subject", "one@example.com", {})
+    await enqueue(outbox, "two@example.com")
+    await run_once(outbox)
+    [raw] = await redis.lrange(email.DEAD_KEY, 0, -1)
+    assert json.loads(raw)["template"] == "missing.html"
+    assert await redis.llen(outbox.processing_key) == 0
+    assert await redis.zcard(email.RETRY_KEY) == 0
+
+
+async def test_a_malformed_job_does_not_stop_the_batch(outbox, smtp_server, redis):
+    await redis.rpush(email.OUTBOX_KEY, "{not json")
+    await enqueue(outbox, "one@example.com")
+    await run_once(outbox)
+    assert [message["To"] for message in smtp_server.messages] == ["one@example.com"]
+    assert await redis.lrange(email.DEAD_KEY, 0, -1) == ["{not json"]
+    assert await redis.llen(outbox.processing_key) == 0
+
+
+async def test_jobs_of_a_stopped_worker_are_requeued(outbox, smtp_server, redis):
+    stopped = email.EmailOutbox()
+    await enqueue(outbox, "one@example.com")
+    await stopped.prepare()
+    assert await stopped.pop_batch()
+    await redis.delete(stopped.heartbeat_key)
+
+    await run_once(outbox)
+    assert [message["To"] for message in smtp_server.messages] == ["one@example.com"]
+    assert await redis.smembers(email.WORKERS_KEY) == {outbox.worker_id}
@@ -0,0 +1,97 @@
+from contextlib import asynccontextmanager
+import csv
+from datetime import date, datetime, timezone
+import io
+import json
+from types import SimpleNamespace
+from uuid import uuid4
+
+from sqlalchemy.engine.result import result_tuple
+
+from src.repository import contacts as repository_contacts
+from src.routes import contacts as contacts_routes
+from src.utils.export import to_csv, to_ndjson
+
+
+COLUMNS = ["id", "first_name", "birthday", "address"]
+make_row = result_tuple(COLUMNS)
+
+
+async def partitions(*rows_per_partition):
+    for rows in rows_per_partition:
+        yield [make_row(row) for row in rows]
+
+
+async def aiter_of(*partitions):
+    for partition in partitions:
+        yield partition
+
+
+async def collect(chunks) -> str:
+    return "".join([chunk async for chunk in chunks])
+
+
+async def test_ndjson_writes_one_object_per_line():
+    contact_id = uuid4()
+    rows = [(contact_id, "Леся", date(1871, 2, 25), None)]
+    output = b"".join([chunk async for chunk in to_ndjson(partitions(rows, []))])
+    assert output.endswith(b"\n")
+    assert "Леся".encode() in output
+    assert json.loads(output) == {
+        "id": str(contact_id),
+        "first_name": "Леся",
+        "birthday": "1871-02-25",
+        "address": None,
+    }
+
+
+async def test_ndjson_datetimes_are_iso_8601_like_the_responses():
+    created_at = datetime(2023, 11, 20, 12, 30, 5, 123456, tzinfo=timezone.utc)
+    row = result_tuple(["id", "created_at"])((uuid4(), created_at))
+    output = b"".join([chunk async for chunk in to_ndjson(aiter_of([row]))])
+    assert json.loads(output)["created_at"] == "2023-11-20T12:30:05.123456Z"
+
+
+async def test_csv_writes_the_header_once_and_every_partition():
+    first = [(uuid4(), "Леся", date(1871, 2, 25), "Новоград-Волинський, 1")]
+    second = [(uuid4(), "Іван", date(1856, 8, 27), "Нагуєвичі")]
+    chunks = [chunk async for chunk in to_csv(partitions(first, second), COLUMNS)]
+    assert len(chunks) == 2
+    rows = list(csv.reader(io.StringIO("".join(chunks))))
+    assert rows[0] == COLUMNS
+    assert [row[1] for row in rows[1:]] == ["Леся", "Іван"]
+    assert rows[1][3] == "Новоград-Волинський, 1"
+
+
+async def test_csv_of_no_contacts_is_the_header():
+    output = await collect(to_csv(partitions(), COLUMNS))
+    assert output == "id,first_name,birthday,address\r\n"
+
+
+async def test_export_reads_in_a_session_opened_by_the_stream(monkeypatch):
+    events = []
+
+    @asynccontextmanager
+    async def read_session(user_id):
+        events.append("open")
+        yield "session"
+        events.append("close")
+
+    async def export_contacts(first_name, last_name, email, q, user, session):
+        events.append(session)
+        yield [make_row((uuid4(), "Леся", date(1871, 2, 25), None))]
+
+    monkeypatch.setattr(contacts_routes, "read_session", read_session)
+    monkeypatch.setattr(repository_contacts, "export_contacts", export_contacts)
+    response = await contacts_routes.export_contacts(
+        format="csv",
+        first_name=None,
+        last_name=None,
+        email=None,
+        q=None,
+        user=SimpleNamespace(id=uuid4()),
+    )
+    assert events == []
+    output = await collect(response.body_iterator)
+    assert events == ["open", "session", "close"]
+    assert "Леся" in output
@@ -0,0 +1,62 @@
+import argparse
+import csv
+from datetime import date
+import io
+import random
+import uuid
+
+import pytest
+
+from src.utils.generate import (
+    generate_contacts,
+    parse_per_user,
+    random_birthday,
+    split_chunks,
+)
+
+
+def test_per_user_distributions():
+    rng = random.Random(1)
+    assert parse_per_user("fixed:7")(rng) == 7
+    assert all(3 <= parse_per_user("uniform:3:5")(rng) <= 5 for _ in range(100))
+    pareto = parse_per_user("pareto:1.2:20:500")
+    assert all(20 <= pareto(rng) <= 500 for _ in range(1000))
+
+
+@pytest.mark.parametrize("value", ["fixed", "uniform:1", "pareto:x:1:2", "zipf:1"])
+def test_invalid_per_user(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_per_user(value)
+
+
+def test_chunks_keep_a_users_contacts_together():
+    users = [(uuid.uuid4(), count) for count in (5, 10, 3, 20, 1)]
+    chunks = split_chunks(users, 12)
+    assert [[count for _, count in chunk] for chunk in chunks] == [
+        [5, 10],
+        [3, 20],
+        [1],
+    ]
+    assert [user for chunk in chunks for user in chunk] == users
+
+
+def test_contacts_are_deterministic_and_unique_per_user():
+    users = [(uuid.UUID(int=1), 30), (uuid.UUID(int=2), 30)]
+    today = date(2023, 11, 20)
+    data, rows = generate_contacts(7, users, today, 18, 60, 0.2)
+    assert rows == 60
+    assert generate_contacts(7, users, today, 18, 60, 0.2) == (data, rows)
+    assert generate_contacts(8, users, today, 18, 60, 0.2)[0] != data
+    contacts = list(csv.reader(io.StringIO(data.decode())))
+    for user_id, _ in users:
+        own = [row for row in contacts if row[9] == str(user_id)]
+        assert len({row[3] for row in own}) == len({row[4] for row in own}) == 30
+
+
+def test_upcoming_birthdays_fall_in_the_window():
+    rng = random.Random(3)
+    today = date(2024, 2, 20)
+    for _ in range(200):
+        birthday = random_birthday(rng, today, 1, 90, upcoming=1.0)
+        upcoming = birthday.replace(year=today.year) if birthday.day != 29 else None
+        assert upcoming is None or 0 <= (upcoming - today).days <= 30
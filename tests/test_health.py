@@ -0,0 +1,70 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from src.conf.config import settings
+from src.services import health
+from src.services.health import HealthMonitor
+
+
+@pytest.fixture
+def monitor(monkeypatch):
+    monkeypatch.setattr(settings, "health_probe_timeout", 0.05)
+    monitor = HealthMonitor()
+
+    async def hang():
+        await asyncio.sleep(1)
+
+    monitor.probes = {
+        "postgres": (AsyncMock(), True),
+        "redis": (AsyncMock(), True),
+        "replica": (hang, False),
+    }
+    return monitor
+
+
+def test_starting_before_the_first_probe(monitor):
+    assert monitor.liveness() == (True, {"status": "starting", "checked_at": None})
+    ready, result = monitor.readiness()
+    assert not ready and result["status"] == "starting"
+
+
+async def test_an_optional_probe_only_degrades(monitor):
+    await monitor.probe()
+    ready, result = monitor.readiness()
+    assert ready and result["status"] == "degraded"
+    assert result["checks"]["replica"]["error"] == "timeout"
+    assert monitor.liveness()[0]
+
+
+async def test_a_required_probe_fails_readiness(monitor):
+    monitor.probes["redis"][0].side_effect = ConnectionError("refused")
+    await monitor.probe()
+    ready, result = monitor.readiness()
+    assert not ready and result["status"] == "unavailable"
+    assert result["checks"]["redis"]["error"] == "refused"
+
+
+async def test_stale_checks_fail_liveness(monitor):
+    await monitor.probe()
+    monitor.checked_at -= settings.health_probe_interval * 3 + 1
+    assert monitor.liveness() == (
+        False,
+        {"status": "stale", "checked_at": monitor.checked_at},
+    )
+    assert not monitor.readiness()[0]
+
+
+def test_pool_saturation_is_not_required_for_readiness():
+    assert HealthMonitor().probes["db_pool"] == (health.probe_pool, False)
+
+
+async def test_pool_saturation(monkeypatch):
+    stats = {"size": 5, "max_overflow": 5, "in_use": 9, "timeouts": 2}
+    monkeypatch.setattr(health, "get_pool_stats", lambda: stats)
+    monkeypatch.setattr(settings, "health_pool_saturation", 0.9)
+    with pytest.raises(RuntimeError, match="9 of 10 connections in use"):
+        await health.probe_pool()
+    stats["in_use"] = 8
+    await health.probe_pool()
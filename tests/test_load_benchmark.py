@@ -0,0 +1,37 @@
+import asyncio
+import itertools
+import random
+
+import aiohttp
+
+from benchmarks import load
+
+
+def test_failures_count_as_errors_without_latency():
+    summary = load.summarize(
+        [0.010, 0.020, 0.030], {200: 2, 500: 1}, {"timeout": 2}, elapsed=1.0
+    )
+    assert (summary["requests"], summary["errors"], summary["rps"]) == (5, 3, 5.0)
+    assert (summary["p50_ms"], summary["p99_ms"]) == (20.0, 30.0)
+    assert summary["failures"] == {"timeout": 2}
+
+
+def test_an_endpoint_without_responses_has_no_latency():
+    summary = load.summarize([], {}, {"ClientConnectorError": 1}, elapsed=1.0)
+    assert (summary["requests"], summary["errors"], summary["p95_ms"]) == (1, 1, None)
+
+
+async def test_timeouts_and_client_errors_are_recorded(monkeypatch):
+    errors = iter([asyncio.TimeoutError(), aiohttp.ServerDisconnectedError()])
+
+    async def failing(client, recorder, user, rng):
+        raise next(errors)
+
+    monkeypatch.setitem(load.OPERATIONS, "me", failing)
+    # Two rounds before the deadline.
+    clock = itertools.chain([0, 0], itertools.repeat(2))
+    monkeypatch.setattr(load.time, "perf_counter", lambda: next(clock))
+    recorder = load.Recorder()
+    await load.worker(None, recorder, [None], {"me": 1}, random.Random(1), 1)
+    assert recorder.failures == {"me": {"timeout": 1, "ServerDisconnectedError": 1}}
+    assert recorder.latencies == {}
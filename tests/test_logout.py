@@ -0,0 +1,53 @@
+from types import SimpleNamespace
+
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+import pytest
+
+from src.conf.config import settings
+from src.repository import users as repository_users
+from src.routes import auth as auth_routes
+from src.services import sessions
+from src.services.auth import auth_service
+
+
+EMAIL = "user@example.com"
+
+
+@pytest.fixture
+def legacy_user(redis, monkeypatch):
+    monkeypatch.setattr(sessions, "redis_db0", redis)
+    monkeypatch.setattr(auth_routes, "session_store", sessions.SessionStore())
+    monkeypatch.setattr(settings, "refresh_token_legacy_fallback", True)
+    user = SimpleNamespace(email=EMAIL, refresh_token=None)
+
+    async def get_user_by_email(email, session):
+        return user if email == EMAIL else None
+
+    async def update_token(user, token, session):
+        user.refresh_token = token
+
+    monkeypatch.setattr(repository_users, "get_user_by_email", get_user_by_email)
+    monkeypatch.setattr(repository_users, "update_token", update_token)
+    return user
+
+
+def bearer(token: str) -> HTTPAuthorizationCredentials:
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+async def test_a_legacy_session_cannot_refresh_after_logout(legacy_user):
+    token = await auth_service.create_refresh_token(data={"sub": EMAIL})
+    legacy_user.refresh_token = token
+    await auth_routes.logout(bearer(token), session=None)
+    assert legacy_user.refresh_token is None
+    with pytest.raises(HTTPException) as error:
+        await auth_routes.refresh_token(bearer(token), session=None)
+    assert error.value.status_code == 401
+
+
+async def test_logout_keeps_a_newer_legacy_token(legacy_user):
+    token = await auth_service.create_refresh_token(data={"sub": EMAIL})
+    legacy_user.refresh_token = "newer-token"
+    await auth_routes.logout(bearer(token), session=None)
+    assert legacy_user.refresh_token == "newer-token"
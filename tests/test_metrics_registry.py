@@ -0,0 +1,52 @@
+from src.services.metrics import Registry, format_labels, format_value
+
+
+def test_render_counters_and_histograms():
+    registry = Registry()
+    requests = registry.counter("requests", "Requests", ("route",))
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    requests.inc(("/contacts",))
+    requests.inc(("/contacts",), 2)
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5.0)
+    assert registry.render() == (
+        "# HELP requests Requests\n"
+        "# TYPE requests counter\n"
+        'requests_total{route="/contacts"} 3\n'
+        "# HELP latency_seconds Latency\n"
+        "# TYPE latency_seconds histogram\n"
+        'latency_seconds_bucket{le="0.1"} 1\n'
+        'latency_seconds_bucket{le="1.0"} 2\n'
+        'latency_seconds_bucket{le="+Inf"} 3\n'
+        "latency_seconds_sum 5.55\n"
+        "latency_seconds_count 3\n"
+    )
+
+
+def test_collectors_are_called_at_render_time():
+    registry = Registry()
+    queued = []
+
+    @registry.collector
+    def collect_queue():
+        return [
+            ("queue_size", "gauge", "Queued jobs", [("queue_size", {}, len(queued))])
+        ]
+
+    queued.append(1)
+    assert "queue_size 1\n" in registry.render()
+    queued.append(2)
+    assert "queue_size 2\n" in registry.render()
+
+
+def test_label_values_are_escaped():
+    labels = {"path": 'a"b\\c\nd'}
+    assert format_labels(labels) == '{path="a\\"b\\\\c\\nd"}'
+    assert format_labels({}) == ""
+
+
+def test_value_formatting():
+    assert format_value(float("inf")) == "+Inf"
+    assert format_value(2) == "2"
+    assert format_value(0.25) == "0.25"
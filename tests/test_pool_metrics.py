@@ -0,0 +1,43 @@
+import sqlite3
+
+from sqlalchemy import exc
+from sqlalchemy.util import greenlet_spawn
+import pytest
+
+from src.database.pool_metrics import InstrumentedAsyncQueuePool
+
+
+def make_pool() -> InstrumentedAsyncQueuePool:
+    return InstrumentedAsyncQueuePool(
+        lambda: sqlite3.connect(":memory:", check_same_thread=False),
+        pool_size=1,
+        max_overflow=1,
+        timeout=0.01,
+    )
+
+
+def exhaust(pool: InstrumentedAsyncQueuePool) -> None:
+    connections = [pool.connect(), pool.connect()]
+    with pytest.raises(exc.TimeoutError):
+        pool.connect()
+    for connection in connections:
+        connection.close()
+    # Reuses the pooled connection, the overflow one was closed on checkin.
+    pool.connect().close()
+
+
+async def test_pool_events_are_counted():
+    pool = make_pool()
+    await greenlet_spawn(exhaust, pool)
+    stats = pool.stats()
+    assert (stats["connects"], stats["overflow_connects"]) == (2, 1)
+    assert (stats["checkouts"], stats["timeouts"]) == (3, 1)
+    assert stats["checkout_wait_buckets"][30.0] == 3
+    assert (stats["max_overflow"], stats["in_use"], stats["idle"]) == (1, 0, 1)
+
+
+async def test_a_recreated_pool_keeps_the_settings():
+    pool = make_pool().recreate()
+    assert pool.max_overflow == 1
+    await greenlet_spawn(lambda: pool.connect().close())
+    assert pool.stats()["connects"] == 1
@@ -0,0 +1,57 @@
+import logging
+
+from src.conf.config import settings
+from src.services.metrics import (
+    MetricsMiddleware,
+    RequestStats,
+    redact_parameters,
+    request_stats,
+    shorten,
+)
+
+
+def test_repeated_statements():
+    stats = RequestStats()
+    for _ in range(3):
+        stats.record("SELECT * FROM contacts WHERE id = $1", 0.001)
+    stats.record("SELECT * FROM users WHERE id = $1", 0.002)
+    assert stats.queries == 4
+    assert stats.repeated(3) == [("SELECT * FROM contacts WHERE id = $1", 3)]
+    assert stats.repeated(4) == []
+
+
+def test_parameter_values_are_redacted():
+    assert redact_parameters({"email": "a@example.com", "n": 1}) == {
+        "email": "str",
+        "n": "int",
+    }
+    assert redact_parameters(("a@example.com", None)) == ["str", "NoneType"]
+    assert redact_parameters([{"a": 1}] * 3, executemany=True) == "<3 parameter sets>"
+
+
+def test_shorten_collapses_whitespace():
+    assert shorten("SELECT\n    1") == "SELECT 1"
+    assert shorten("x" * 10, limit=4) == "xxxx..."
+
+
+async def test_middleware_reports_repeated_queries(monkeypatch, caplog):
+    monkeypatch.setattr(settings, "query_repeat_threshold", 2)
+    monkeypatch.setattr(settings, "query_debug_header", True)
+
+    async def app(scope, receive, send):
+        for _ in range(2):
+            request_stats.get().record("SELECT 1", 0.0005)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/"}
+    with caplog.at_level(logging.WARNING, logger="src.services.metrics"):
+        await MetricsMiddleware(app)(scope, None, send)
+    assert (b"x-db-queries", b"2; time_ms=1.0") in messages[0]["headers"]
+    assert "possible N+1: GET other ran 2 times: SELECT 1" in caplog.text
+    assert request_stats.get() is None
@@ -0,0 +1,91 @@
+from unittest.mock import AsyncMock, Mock
+
+from fastapi import Request
+import pytest
+
+from main import app
+from src.conf.config import settings
+from src.services import rate_limiter as rate_limiter_module
+from src.services.rate_limiter import LocalRateLimiter, TokenBucket, client_address
+
+
+def test_bucket_refills_at_its_rate():
+    bucket = TokenBucket(capacity=10, rate=2, now=0)
+    assert bucket.take(10, now=0) == 0
+    assert bucket.take(1, now=0) == 0.5
+    assert bucket.take(1, now=0.5) == 0
+    assert bucket.spent == 11
+    bucket.refill(now=100)
+    assert bucket.tokens == 10
+
+
+def test_cost_above_capacity_takes_the_whole_bucket():
+    bucket = TokenBucket(capacity=5, rate=1, now=0)
+    assert bucket.take(10, now=0) == 0
+    assert bucket.take(10, now=1) == 4
+    assert bucket.take(10, now=5) == 0
+
+
+def make_request(client: str, forwarded: str | None = None) -> Request:
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/api/contacts",
+            "headers": headers,
+            "client": (client, 50000),
+        }
+    )
+
+
+def test_forwarded_for_from_an_untrusted_client_is_ignored(monkeypatch):
+    monkeypatch.setattr(settings, "rate_limiter_trusted_proxies", [])
+    request = make_request("203.0.113.7", "198.51.100.1")
+    assert client_address(request) == "203.0.113.7"
+
+
+def test_client_behind_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(settings, "rate_limiter_trusted_proxies", ["10.0.0.1"])
+    # The client made up the first address, the proxy appended the real one.
+    request = make_request("10.0.0.1", "198.51.100.1, 203.0.113.7")
+    assert client_address(request) == "203.0.113.7"
+    assert client_address(make_request("10.0.0.1")) == "10.0.0.1"
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    monkeypatch.setattr(rate_limiter_module, "rate_limit_callback", AsyncMock())
+    return LocalRateLimiter(Mock(), times=2, seconds=60, max_buckets=2)
+
+
+async def test_buckets_are_bounded(limiter, monkeypatch):
+    monkeypatch.setattr(settings, "rate_limiter_trusted_proxies", [])
+    for client in ("192.0.2.1", "192.0.2.2", "192.0.2.1", "192.0.2.3"):
+        await limiter(make_request(client), Mock())
+    assert [key.split(":")[2] for key in limiter.buckets] == [
+        "192.0.2.1",
+        "192.0.2.3",
+    ]
+    rate_limiter_module.rate_limit_callback.assert_not_awaited()
+
+
+async def test_requests_over_the_limit_are_rejected(limiter, monkeypatch):
+    monkeypatch.setattr(settings, "rate_limiter_trusted_proxies", [])
+    for _ in range(3):
+        await limiter(make_request("192.0.2.1"), Mock())
+    rate_limiter_module.rate_limit_callback.assert_awaited_once()
+
+
+def test_route_costs_name_existing_routes():
+    paths = {route.path for route in app.routes}
+    assert set(rate_limiter_module.ROUTE_COSTS) <= paths
+
+
+def test_routes_that_hash_passwords_are_weighted():
+    for path in (
+        "/api/auth/signup",
+        "/api/auth/login",
+        "/api/auth/reset_password_confirmation/{token}",
+    ):
+        assert rate_limiter_module.ROUTE_COSTS[path] > 1
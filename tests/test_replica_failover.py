@@ -0,0 +1,52 @@
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.exc import DBAPIError, ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database import connect_db
+
+
+@pytest.fixture
+def primary(monkeypatch):
+    primary = Mock(spec=AsyncSession)
+    primary.execute = AsyncMock(return_value="primary result")
+    monkeypatch.setattr(connect_db, "AsyncDBSession", lambda: primary)
+    monkeypatch.setattr(connect_db, "replica_unhealthy_until", [0.0])
+    return primary
+
+
+def replica_failing_with(monkeypatch, error: Exception) -> connect_db.ReplicaSession:
+    execute = AsyncMock(side_effect=error)
+    monkeypatch.setattr(AsyncSession, "execute", execute)
+    return connect_db.ReplicaSession()
+
+
+STMT = select(text("1"))
+
+
+async def test_a_lost_replica_connection_is_retried_on_the_primary(
+    primary, monkeypatch
+):
+    disconnect = DBAPIError(
+        "SELECT 1", None, OSError("connection lost"), connection_invalidated=True
+    )
+    session = replica_failing_with(monkeypatch, disconnect)
+    assert await session.execute(STMT) == "primary result"
+    assert connect_db.replica_unhealthy_until[0] > 0
+    # The rest of the request stays on the primary.
+    assert await session.execute(STMT) == "primary result"
+    assert primary.execute.await_count == 2
+    assert AsyncSession.execute.await_count == 1
+    await session.close()
+    primary.close.assert_awaited_once()
+
+
+async def test_other_errors_are_not_retried(primary, monkeypatch):
+    error = ProgrammingError("SELECT 1", None, Exception("syntax error"))
+    session = replica_failing_with(monkeypatch, error)
+    with pytest.raises(ProgrammingError):
+        await session.execute(STMT)
+    primary.execute.assert_not_awaited()
+    assert connect_db.replica_unhealthy_until == [0.0]
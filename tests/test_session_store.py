@@ -0,0 +1,81 @@
+import time
+from unittest.mock import AsyncMock
+
+from fastapi import HTTPException
+import pytest
+from redis.exceptions import ConnectionError
+
+from src.conf.config import settings
+from src.services import sessions
+
+
+@pytest.fixture
+def store(redis, monkeypatch):
+    monkeypatch.setattr(sessions, "redis_db0", redis)
+    return sessions.SessionStore()
+
+
+EMAIL = "user@example.com"
+
+
+def expires_in(seconds: int) -> int:
+    return int(time.time()) + seconds
+
+
+async def test_create_and_list(store, redis):
+    await store.create(EMAIL, "token-1", "phone", expires_in(60))
+    await store.create(EMAIL, "token-2", "laptop", expires_in(120))
+    assert [session["device_id"] for session in await store.list(EMAIL)] == [
+        "phone",
+        "laptop",
+    ]
+    digest = sessions.token_digest("token-1")
+    assert await redis.ttl(sessions.SESSION_PREFIX + digest) > 0
+
+
+async def test_a_device_has_one_session(store):
+    await store.create(EMAIL, "token-1", "phone", expires_in(60))
+    await store.create(EMAIL, "token-2", "phone", expires_in(60))
+    assert len(await store.list(EMAIL)) == 1
+    assert not await store.revoke("token-1")
+
+
+async def test_oldest_sessions_are_dropped_over_the_limit(store, monkeypatch):
+    monkeypatch.setattr(settings, "max_sessions_per_user", 2)
+    for index in range(3):
+        await store.create(
+            EMAIL, f"token-{index}", f"device-{index}", expires_in(60 + index)
+        )
+    sessions_left = await store.list(EMAIL)
+    assert [session["device_id"] for session in sessions_left] == [
+        "device-1",
+        "device-2",
+    ]
+
+
+async def test_rotate_consumes_the_old_token(store):
+    await store.create(EMAIL, "token-1", "phone", expires_in(60))
+    assert await store.rotate(EMAIL, "token-1", "token-2", expires_in(60)) == "phone"
+    # A reused refresh token finds no session.
+    assert await store.rotate(EMAIL, "token-1", "token-3", expires_in(60)) is None
+    assert (
+        await store.rotate("other@example.com", "token-2", "x", expires_in(60)) is None
+    )
+    assert [session["device_id"] for session in await store.list(EMAIL)] == ["phone"]
+
+
+async def test_revoke_and_revoke_all(store):
+    await store.create(EMAIL, "token-1", "phone", expires_in(60))
+    await store.create(EMAIL, "token-2", "laptop", expires_in(60))
+    assert await store.revoke("token-1")
+    assert await store.revoke_all(EMAIL) == 1
+    assert await store.list(EMAIL) == []
+
+
+async def test_redis_errors_are_a_503(store, redis, monkeypatch):
+    monkeypatch.setattr(
+        store, "revoke_script", AsyncMock(side_effect=ConnectionError())
+    )
+    with pytest.raises(HTTPException) as error:
+        await store.revoke("token-1")
+    assert error.value.status_code == 503
@@ -0,0 +1,85 @@
+from datetime import date
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from uuid import uuid4
+
+import pytest
+
+from src.repository import contacts as repository_contacts
+from src.repository import users as repository_users
+from src.schemas.contacts import ContactModel
+
+
+def returning(row):
+    return lambda compiled: SimpleNamespace(scalar=lambda: row)
+
+
+@pytest.fixture
+def side_effects(monkeypatch):
+    mocks = SimpleNamespace(
+        invalidate=AsyncMock(),
+        patch=AsyncMock(),
+        mark_user_write=AsyncMock(),
+        set_user_in_cache=AsyncMock(),
+    )
+    monkeypatch.setattr(
+        repository_contacts.contacts_cache, "invalidate", mocks.invalidate
+    )
+    monkeypatch.setattr(repository_contacts.birthday_digests, "patch", mocks.patch)
+    monkeypatch.setattr(repository_contacts, "mark_user_write", mocks.mark_user_write)
+    monkeypatch.setattr(repository_users, "set_user_in_cache", mocks.set_user_in_cache)
+    return mocks
+
+
+BODY = ContactModel(
+    first_name="Леся",
+    last_name="Українка",
+    email="lesia@example.com",
+    phone="+380000000001",
+    birthday=date(1871, 2, 25),
+    address="Київ",
+)
+
+
+async def test_update_contact_is_one_update_returning(side_effects, recording_session):
+    user = SimpleNamespace(id=uuid4())
+    contact = SimpleNamespace(id=uuid4(), birthday_key=225)
+    session = recording_session(returning(contact))
+    assert (
+        await repository_contacts.update_contact(uuid4(), BODY, user, session)
+        is contact
+    )
+    [statement] = map(str, session.statements)
+    assert statement.startswith("UPDATE contacts SET")
+    assert "contacts.user_id = " in statement and "RETURNING" in statement
+    assert session.commits == 1
+    side_effects.patch.assert_awaited_once_with(user.id, [(contact.id, 225)])
+
+
+async def test_delete_contact_is_one_delete_returning(side_effects, recording_session):
+    user = SimpleNamespace(id=uuid4())
+    contact = SimpleNamespace(id=uuid4(), birthday_key=225)
+    session = recording_session(returning(contact))
+    await repository_contacts.delete_contact(contact.id, user, session)
+    [statement] = map(str, session.statements)
+    assert statement.startswith("DELETE FROM contacts")
+    assert "RETURNING" in statement
+    side_effects.patch.assert_awaited_once_with(user.id, [(contact.id, None)])
+
+
+async def test_missing_contact_leaves_the_caches_alone(side_effects, recording_session):
+    session = recording_session(returning(None))
+    user = SimpleNamespace(id=uuid4())
+    assert await repository_contacts.delete_contact(uuid4(), user, session) is None
+    side_effects.invalidate.assert_not_awaited()
+    side_effects.patch.assert_not_awaited()
+
+
+async def test_update_user_is_one_update_returning(side_effects, recording_session):
+    user = SimpleNamespace(email="user@example.com")
+    session = recording_session(returning(user))
+    await repository_users.confirm_email(user.email, session)
+    [statement] = map(str, session.statements)
+    assert statement.startswith("UPDATE users SET")
+    assert "is_email_confirmed=" in statement and "RETURNING" in statement
+    side_effects.set_user_in_cache.assert_awaited_once_with(user)
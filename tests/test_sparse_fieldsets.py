@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+from uuid import uuid4
+
+from fastapi import HTTPException
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine.result import result_tuple
+
+from src.repository import contacts as repository_contacts
+from src.routes.contacts import parse_fields
+
+
+def test_fields_are_projected_in_the_response_order():
+    assert parse_fields(None) is None
+    assert parse_fields(" email,first_name ") == ("first_name", "email", "id")
+    assert parse_fields("email", "created_at") == ("email", "id", "created_at")
+
+
+@pytest.mark.parametrize("fields", ["", ",", " , ", "email,nickname"])
+def test_empty_and_unknown_fieldsets_are_rejected(fields):
+    with pytest.raises(HTTPException) as error:
+        parse_fields(fields)
+    assert error.value.status_code == 400
+
+
+def test_only_the_requested_columns_are_selected():
+    columns = repository_contacts.response_columns(("email", "id"))
+    assert [column.key for column in columns] == ["email", "id"]
+    sql = str(select(*columns).compile(dialect=postgresql.dialect()))
+    assert sql == "SELECT contacts.email, contacts.id \nFROM contacts"
+
+
+CONTACT_ID = uuid4()
+
+
+def contact_rows(compiled):
+    names = [column.key for column in compiled.statement.selected_columns]
+    make_row = result_tuple(names)
+    values = {"id": CONTACT_ID, "email": "lesia@example.com", "phone": "+380"}
+    return [make_row([values[name] for name in names])]
+
+
+async def test_each_fieldset_is_cached_separately(contacts_cache, recording_session):
+    user, session = SimpleNamespace(id=uuid4()), recording_session(contact_rows)
+
+    async def read(fields):
+        return await repository_contacts.read_contacts(
+            0, 10, None, None, None, user, session, fields=fields
+        )
+
+    emails = await read(("email", "id"))
+    phones = await read(("phone", "id"))
+    assert emails == [{"email": "lesia@example.com", "id": CONTACT_ID}]
+    assert phones == [{"phone": "+380", "id": CONTACT_ID}]
+    assert await read(("email", "id")) == emails
+    assert len(session.statements) == 2
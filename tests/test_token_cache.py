@@ -0,0 +1,53 @@
+import time
+
+from fastapi import HTTPException
+from jose import jwt
+import pytest
+
+from src.services.auth import Auth
+from src.utils.ttl_cache import TTLCache
+
+
+@pytest.fixture
+def auth():
+    auth = Auth()
+    auth.token_cache = TTLCache(10, 0)
+    auth.token_decodes = 0
+    auth.token_decode_seconds = 0.0
+    return auth
+
+
+def token(auth: Auth, scope: str = "access_token", expires_in: int = 60) -> str:
+    payload = {"sub": "user@example.com", "scope": scope}
+    payload["exp"] = int(time.time()) + expires_in
+    return jwt.encode(payload, auth.SECRET_KEY, algorithm=auth.ALGORITHM)
+
+
+CREDENTIALS = HTTPException(status_code=401, detail="credentials")
+SCOPE = HTTPException(status_code=401, detail="scope")
+
+
+def test_a_reused_token_is_verified_once(auth):
+    access_token = token(auth)
+    for _ in range(3):
+        email = auth.decode_token(access_token, "access_token", CREDENTIALS)
+        assert email == "user@example.com"
+    assert auth.token_decodes == 1
+    stats = auth.token_cache_stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (2, 1, 1)
+
+
+def test_the_scope_is_checked_on_a_cache_hit(auth):
+    refresh_token = token(auth, "refresh_token")
+    auth.decode_token(refresh_token, "refresh_token", CREDENTIALS)
+    with pytest.raises(HTTPException) as error:
+        auth.decode_token(refresh_token, "access_token", CREDENTIALS, SCOPE)
+    assert error.value is SCOPE
+
+
+def test_expired_and_invalid_tokens_are_not_cached(auth):
+    for invalid in (token(auth, expires_in=-1), token(auth) + "x"):
+        with pytest.raises(HTTPException) as error:
+            auth.decode_token(invalid, "access_token", CREDENTIALS)
+        assert error.value is CREDENTIALS
+    assert len(auth.token_cache) == 0
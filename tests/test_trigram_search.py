@@ -0,0 +1,63 @@
+from unittest.mock import Mock
+
+from sqlalchemy import create_mock_engine, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Connection
+
+from src.database.models import Base, Contact, is_pg_trgm_installed, is_trgm_index
+from src.repository import contacts as repository_contacts
+
+
+def compile(stmt) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect()))
+
+
+def connection(has_pg_trgm: bool) -> Mock:
+    bind = Mock(spec=Connection)
+    bind.execute.return_value.scalar.return_value = has_pg_trgm
+    return bind
+
+
+def test_trgm_indexes_are_marked():
+    names = {index.name for index in Contact.__table__.indexes if is_trgm_index(index)}
+    assert names == {
+        "ix_contacts_first_name_trgm",
+        "ix_contacts_last_name_trgm",
+        "ix_contacts_email_trgm",
+        "ix_contacts_search_text_trgm",
+    }
+
+
+def test_trgm_indexes_follow_the_extension():
+    assert is_pg_trgm_installed(None, None, connection(True)) is True
+    assert is_pg_trgm_installed(None, None, connection(False)) is False
+
+
+def test_ddl_script_includes_the_trgm_indexes():
+    statements = []
+    engine = create_mock_engine(
+        "postgresql://",
+        lambda sql, *args, **kwargs: statements.append(
+            str(sql.compile(dialect=engine.dialect))
+        ),
+    )
+    Base.metadata.create_all(engine, checkfirst=False)
+    assert any("gin_trgm_ops" in statement for statement in statements)
+
+
+async def test_search_uses_trigrams_when_available(monkeypatch):
+    monkeypatch.setattr(repository_contacts, "pg_trgm_available", True)
+    stmt = await repository_contacts.filter_contacts(
+        select(Contact.id), None, None, None, "Шевч", None
+    )
+    sql = compile(stmt)
+    assert "%>" in sql and "word_similarity" in sql
+
+
+async def test_search_falls_back_to_substring_match(monkeypatch):
+    monkeypatch.setattr(repository_contacts, "pg_trgm_available", False)
+    stmt = await repository_contacts.filter_contacts(
+        select(Contact.id), None, None, None, "Шевч", None
+    )
+    sql = compile(stmt)
+    assert "%>" not in sql and "strpos" in sql
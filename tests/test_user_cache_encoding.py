@@ -0,0 +1,62 @@
+from dataclasses import FrozenInstanceError, fields
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import orjson
+import pytest
+
+from src.database.models import User
+from src.repository.users import (
+    USER_CACHE_FIELDS,
+    USER_CACHE_VERSION,
+    CachedUser,
+    decode_user,
+    encode_user,
+)
+from src.schemas.users import UserDb
+
+
+def make_user() -> User:
+    now = datetime(2023, 11, 20, 12, 30, tzinfo=timezone.utc)
+    return User(
+        id=uuid4(),
+        username="taras",
+        email="taras@example.com",
+        password="hashed",
+        created_at=now,
+        updated_at=now,
+        avatar="https://example.com/avatar.png",
+        is_email_confirmed=True,
+        is_password_valid=True,
+    )
+
+
+def test_round_trip():
+    user = make_user()
+    decoded = decode_user(encode_user(user))
+    for field in USER_CACHE_FIELDS:
+        assert getattr(decoded, field) == getattr(user, field)
+
+
+def test_other_versions_are_ignored():
+    data = orjson.loads(encode_user(make_user()))
+    data[0] = USER_CACHE_VERSION + 1
+    assert decode_user(orjson.dumps(data)) is None
+
+
+def test_cached_user_has_the_cached_fields():
+    assert tuple(field.name for field in fields(CachedUser)) == USER_CACHE_FIELDS
+
+
+def test_decoded_user_validates_as_a_response():
+    user = make_user()
+    decoded = decode_user(encode_user(user))
+    assert UserDb.model_validate(decoded) == UserDb.model_validate(user)
+
+
+def test_fields_that_are_not_cached_raise():
+    decoded = decode_user(encode_user(make_user()))
+    with pytest.raises(AttributeError):
+        decoded.password
+    with pytest.raises(FrozenInstanceError):
+        decoded.email = "other@example.com"
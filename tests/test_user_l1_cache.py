@@ -0,0 +1,90 @@
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import fakeredis
+import pytest
+
+from src.database.models import User
+from src.repository import users as repository_users
+from src.utils.ttl_cache import TTLCache
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_expired_entry_is_dropped():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1, ttl=0)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_zero_maxsize_disables_the_cache():
+    cache = TTLCache(maxsize=0, ttl=60)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+@pytest.fixture
+async def redis_db1(monkeypatch):
+    client = fakeredis.FakeAsyncRedis()
+    monkeypatch.setattr(repository_users, "redis_db1", client)
+    monkeypatch.setattr(repository_users, "user_l1_cache", TTLCache(10, 60))
+    yield client
+    await client.flushall()
+    await client.close()
+
+
+def make_user() -> User:
+    now = datetime(2023, 11, 20, tzinfo=timezone.utc)
+    return User(
+        id=uuid4(),
+        username="lesia",
+        email="lesia@example.com",
+        created_at=now,
+        updated_at=now,
+        is_email_confirmed=True,
+        is_password_valid=True,
+    )
+
+
+async def test_a_redis_hit_fills_the_l1(redis_db1):
+    user = make_user()
+    await repository_users.set_user_in_cache(user)
+    cached = await repository_users.get_user_by_email_from_cache(user.email)
+    assert cached.id == user.id
+    assert repository_users.user_l1_cache.get(user.email) is cached
+    assert await repository_users.get_user_by_email_from_cache(user.email) is cached
+
+
+async def test_a_write_evicts_the_l1_entry(redis_db1):
+    user = make_user()
+    repository_users.user_l1_cache.set(user.email, user)
+    user.username = "lesia-ukrainka"
+    await repository_users.set_user_in_cache(user)
+    assert repository_users.user_l1_cache.get(user.email) is None
+    cached = await repository_users.get_user_by_email_from_cache(user.email)
+    assert cached.username == "lesia-ukrainka"
+
+
+async def test_an_invalidation_during_the_read_skips_the_l1(redis_db1, monkeypatch):
+    user = make_user()
+    await repository_users.set_user_in_cache(user)
+    get = redis_db1.get
+
+    async def get_and_invalidate(key):
+        value = await get(key)
+        repository_users.invalidate_user_in_l1_cache(user.email)
+        return value
+
+    monkeypatch.setattr(redis_db1, "get", get_and_invalidate)
+    assert await repository_users.get_user_by_email_from_cache(user.email)
+    assert repository_users.user_l1_cache.get(user.email) is None